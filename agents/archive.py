@@ -0,0 +1,127 @@
+"""Hot/cold archival of closed matches, donations and requests.
+
+`archive_closed` copies closed rows older than the cutoff into the
+`*_archive` tables and deletes them from the hot tables. It works in chunks
+of ARCHIVE_BATCH_SIZE ids, one short transaction each, so no lock is held
+for long. Order matters:
+
+1. delivered/cancelled matches;
+2. closed donations and requests that no hot match still points at.
+
+`get` reads a row by id from the hot table and falls back to its archive,
+so historical lookups keep working after a row has moved. Run from cron:
+
+    python -m agents.archive            # rows closed > ARCHIVE_AFTER_DAYS ago
+    python -m agents.archive --days 30
+"""
+import argparse
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict
+from sqlalchemy import select, insert, delete, literal
+from config import Config
+from models import SessionLocal, FoodDonation, FoodRequest, Match, ARCHIVES
+
+CLOSED = {
+    Match: ("delivered", "cancelled"),
+    FoodDonation: ("delivered", "cancelled", "expired"),
+    FoodRequest: ("fulfilled", "cancelled", "expired"),
+}
+
+
+@dataclass
+class ArchiveReport:
+    moved: Dict[str, int] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    def to_dict(self):
+        return {"moved": self.moved, "seconds": round(self.seconds, 3)}
+
+
+def _candidates(model, cutoff, after_id, limit):
+    stmt = (select(model.id)
+            .where(model.status.in_(CLOSED[model]), model.created_at < cutoff, model.id > after_id)
+            .order_by(model.id).limit(limit))
+    # a donation/request stays hot while any hot match still references it
+    if model is FoodDonation:
+        stmt = stmt.where(~select(Match.id).where(Match.donation_id==FoodDonation.id).exists())
+    elif model is FoodRequest:
+        stmt = stmt.where(~select(Match.id).where(Match.request_id==FoodRequest.id).exists())
+    return stmt
+
+
+def _move(db, model, ids, now):
+    archive = ARCHIVES[model]
+    columns = [c.name for c in model.__table__.columns]
+    db.execute(insert(archive.__table__).from_select(
+        columns + ["archived_at"],
+        select(*(model.__table__.c[c] for c in columns), literal(now).label("archived_at"))
+            .where(model.id.in_(ids)),
+    ))
+    db.execute(delete(model).where(model.id.in_(ids)))
+
+
+def archive_model(session_factory, model, cutoff, batch_size=None, pause_s=None) -> int:
+    """Move closed `model` rows created before `cutoff`, one chunk per transaction."""
+    batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+    pause_s = Config.ARCHIVE_PAUSE_S if pause_s is None else pause_s
+    moved, after_id = 0, 0
+    while True:
+        with session_factory() as db:
+            ids = list(db.scalars(_candidates(model, cutoff, after_id, batch_size).with_for_update()))
+            if not ids:
+                return moved
+            _move(db, model, ids, datetime.now())
+            db.commit()
+        moved += len(ids)
+        after_id = ids[-1]
+        if len(ids) < batch_size:
+            return moved
+        if pause_s:
+            time.sleep(pause_s)     # let OLTP writes through between chunks
+
+
+def archive_closed(session_factory=SessionLocal, older_than_days=None, batch_size=None,
+                   pause_s=None, now=None) -> ArchiveReport:
+    days = Config.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = (now or datetime.now()) - timedelta(days=days)
+    report = ArchiveReport()
+    t = time.perf_counter()
+    # matches first: their donations/requests become archivable once they are gone
+    for model in (Match, FoodDonation, FoodRequest):
+        report.moved[model.__tablename__] = archive_model(
+            session_factory, model, cutoff, batch_size, pause_s)
+    report.seconds = time.perf_counter() - t
+    return report
+
+
+def get(db, model, row_id):
+    """The hot row, or its archived copy; None if neither exists.
+
+    Archived rows are read-only snapshots with the same attributes as the
+    hot model (no relationships).
+    """
+    row = db.get(model, row_id)
+    if row is None:
+        row = db.get(ARCHIVES[model], row_id)
+    return row
+
+
+def is_archived(row):
+    return type(row) in ARCHIVES.values()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move closed rows into the archive tables.")
+    parser.add_argument("--days", type=float, default=Config.ARCHIVE_AFTER_DAYS,
+                        help="archive rows created more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=Config.ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+    report = archive_closed(older_than_days=args.days, batch_size=args.batch_size)
+    print(", ".join(f"{n} {table}" for table, n in report.moved.items())
+          + f" archived in {report.seconds:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
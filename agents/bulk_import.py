@@ -0,0 +1,231 @@
+"""Streaming bulk import of donations and requests from partner feeds.
+
+Files are read row by row (CSV with a header line, or JSON Lines), validated
+in chunks and written with one multi-row INSERT per chunk, so memory stays
+bounded by the chunk size no matter how large the file is. Rows with lat/lon
+must fall inside their taluk's boundary; rows without are geocoded from
+their pincode.
+
+    python -m agents.bulk_import donations feed.csv
+    python -m agents.bulk_import requests feed.jsonl --batch-size 5000
+"""
+import argparse
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+from sqlalchemy import insert, select
+from agents.data_ingestion import DataIngestionAgent
+from models import engine, User, FoodDonation, FoodRequest
+
+MAX_REPORTED_ERRORS = 1000
+
+@dataclass
+class ImportReport:
+    inserted: int = 0
+    rejected: int = 0
+    # (line number, reason); capped at MAX_REPORTED_ERRORS entries
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+    def reject(self, line, reason):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, reason))
+
+    def to_dict(self):
+        return {"inserted": self.inserted, "rejected": self.rejected,
+                "errors": [{"line": n, "reason": r} for n, r in self.errors]}
+
+
+def iter_rows(stream, fmt) -> Iterator[Tuple[int, Dict]]:
+    """Yield (line number, row dict) from a text stream without reading it all."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "jsonl":
+        for n, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = {"_error": f"invalid JSON: {e}"}
+            if not isinstance(row, dict):
+                row = {"_error": f"expected a JSON object, got {type(row).__name__}"}
+            yield n, row
+    else:
+        raise ValueError(f"unsupported format: {fmt}")
+
+
+def _text(row, key, required=False):
+    """Stripped string value of `key`; JSON feeds may carry numbers or null."""
+    value = row.get(key)
+    text = "" if value is None else str(value).strip()
+    if required and not text:
+        raise KeyError(key)
+    return text
+
+
+def _flag(value, default=True):
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("true", "1", "yes", "y", "veg")
+
+
+def _when(value):
+    when = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).strip())
+    # the app stores naive local times and compares them with datetime.now();
+    # an offset would be dropped on write, so convert instead
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)
+    return when
+
+
+# kind -> (model, owner column, owner role)
+KINDS = {
+    "donations": (FoodDonation, "donor_email", "donor"),
+    "requests": (FoodRequest, "recipient_email", "recipient"),
+}
+
+
+class BulkImporter:
+
+    def __init__(self, ingestion_agent=None, bind=engine, batch_size=1000):
+        self.agent = ingestion_agent or DataIngestionAgent()
+        self.bind = bind
+        self.batch_size = batch_size
+
+    def _build(self, kind, row, now):
+        """Row dict -> column values for the target table; raises on bad input."""
+        taluk = _text(row, "taluk")
+        pincode = _text(row, "pincode")
+        lat, lon = row.get("lat"), row.get("lon")
+        if lat in (None, "") or lon in (None, ""):
+            lat, lon = self.agent.locate(pincode)
+        common = dict(
+            address=_text(row, "address") or f"{taluk}, Belagavi",
+            pincode=pincode, lat=float(lat), lon=float(lon),
+            status="open", created_at=now,
+        )
+        if kind == "donations":
+            values = dict(
+                donor_email=_text(row, "donor_email", required=True).lower(),
+                title=_text(row, "title", required=True),
+                description=_text(row, "description"),
+                is_veg=_flag(row.get("is_veg")),
+                quantity_meals=int(row["quantity_meals"]),
+                ready_by=_when(row["ready_by"]),
+                expire_by=_when(row["expire_by"]),
+            )
+            if values["quantity_meals"] <= 0:
+                raise ValueError("quantity_meals must be positive")
+            if values["expire_by"] <= values["ready_by"]:
+                raise ValueError("expire_by must be after ready_by")
+        else:
+            values = dict(
+                recipient_email=_text(row, "recipient_email", required=True).lower(),
+                need_meals=int(row["need_meals"]),
+                prefers_veg=_flag(row.get("prefers_veg")),
+                earliest=_when(row["earliest"]),
+                latest=_when(row["latest"]),
+            )
+            if values["need_meals"] <= 0:
+                raise ValueError("need_meals must be positive")
+            if values["latest"] <= values["earliest"]:
+                raise ValueError("latest must be after earliest")
+        values.update(common)
+        return values
+
+    def _import_chunk(self, kind, chunk, report):
+        model, owner_col, role = KINDS[kind]
+        now = datetime.utcnow()
+
+        results = self.agent.validate_many(
+            {"district": _text(row, "district") or "Belagavi",
+             "taluk": _text(row, "taluk"),
+             "pincode": _text(row, "pincode"),
+             "lat": row.get("lat"), "lon": row.get("lon")}
+            for _, row in chunk
+        )
+
+        candidates = []
+        for (line, row), res in zip(chunk, results):
+            if "_error" in row:
+                report.reject(line, row["_error"])
+                continue
+            if not res.ok:
+                report.reject(line, res.reason)
+                continue
+            try:
+                candidates.append((line, self._build(kind, row, now)))
+            except KeyError as e:
+                report.reject(line, f"missing field {e}")
+            except (ValueError, TypeError, AttributeError) as e:
+                report.reject(line, str(e))
+            except Exception as e:
+                # one malformed row must not abort the rest of the feed
+                report.reject(line, f"invalid row: {e}")
+
+        if not candidates:
+            return
+        with self.bind.begin() as conn:
+            emails = {values[owner_col] for _, values in candidates}
+            owners = set(conn.execute(
+                select(User.email).where(User.email.in_(emails), User.role==role)
+            ).scalars())
+            rows = []
+            for line, values in candidates:
+                if values[owner_col] in owners:
+                    rows.append(values)
+                else:
+                    report.reject(line, f"{values[owner_col]} is not a registered {role}")
+            if rows:
+                conn.execute(insert(model.__table__), rows)
+                report.inserted += len(rows)
+
+    def run(self, kind, rows: Iterable[Tuple[int, Dict]]) -> ImportReport:
+        if kind not in KINDS:
+            raise ValueError(f"unknown import kind: {kind}")
+        report = ImportReport()
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                return report
+            self._import_chunk(kind, chunk, report)
+
+    def run_stream(self, kind, stream, fmt) -> ImportReport:
+        return self.run(kind, iter_rows(stream, fmt))
+
+
+def format_for(filename):
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError("expected a .csv or .jsonl file")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import donations or requests.")
+    parser.add_argument("kind", choices=sorted(KINDS))
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with io.open(args.path, encoding="utf-8", newline="") as f:
+        report = BulkImporter(batch_size=args.batch_size).run_stream(args.kind, f, format_for(args.path))
+    print(f"inserted {report.inserted}, rejected {report.rejected}")
+    for line, reason in report.errors:
+        print(f"  line {line}: {reason}")
+
+
+if __name__ == "__main__":
+    main()
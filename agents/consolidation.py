@@ -0,0 +1,196 @@
+"""Many-to-one consolidation: split and merge meals across donations and requests.
+
+A plain match pairs one whole donation with one request. `ConsolidationAgent`
+instead allocates meals along match lines, so three 40-meal donations can fill
+a 120-meal request and an 80-meal donation can feed two 40-meal requests.
+
+Each pass is a min-cost max-flow over
+
+    source -> donation (remaining meals) -> request -> sink (remaining need)
+
+where a donation/request edge exists only for feasible pairs: within
+`radius_km`, veg-compatible (a veg-preferring request never gets non-veg
+food), and with the donation ready before the request's window closes and
+good until it opens. The flow delivers as many meals as possible; among
+those plans it prefers short trips and food that expires soon.
+"""
+import heapq
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Sequence
+from sqlalchemy import update, select
+from agents.matching import urgency
+from agents.spatial import GridIndex
+from agents.utils import haversine
+from config import Config
+from metrics import timed
+from models import FoodDonation, FoodRequest, Match
+
+# cost units per km and for food with no urgency; integers keep the solver exact
+KM_COST = 100
+FRESH_COST = 200
+
+
+@dataclass
+class Allocation:
+    donation: object
+    request: object
+    meals: int
+    dist_km: float
+
+
+class _FlowGraph:
+    """Residual graph; edge e's reverse is e ^ 1."""
+
+    def __init__(self, n):
+        self.adj = [[] for _ in range(n)]
+        self.to, self.cap, self.cost = [], [], []
+
+    def add(self, u, v, cap, cost):
+        e = len(self.to)
+        self.to += [v, u]
+        self.cap += [cap, 0]
+        self.cost += [cost, -cost]
+        self.adj[u].append(e)
+        self.adj[v].append(e + 1)
+        return e
+
+    def min_cost_max_flow(self, s, t):
+        """Successive shortest paths, Dijkstra on reduced costs (all costs start >= 0)."""
+        n = len(self.adj)
+        pot = [0] * n
+        flow = 0
+        while True:
+            dist = [None] * n
+            prev = [-1] * n
+            dist[s] = 0
+            heap = [(0, s)]
+            while heap:
+                du, u = heapq.heappop(heap)
+                if du > dist[u]:
+                    continue
+                for e in self.adj[u]:
+                    if not self.cap[e]:
+                        continue
+                    v = self.to[e]
+                    nd = du + self.cost[e] + pot[u] - pot[v]
+                    if dist[v] is None or nd < dist[v]:
+                        dist[v] = nd
+                        prev[v] = e
+                        heapq.heappush(heap, (nd, v))
+            if dist[t] is None:
+                return flow
+            for v in range(n):
+                if dist[v] is not None:
+                    pot[v] += dist[v]
+            push, v = None, t
+            while v != s:
+                e = prev[v]
+                push = self.cap[e] if push is None else min(push, self.cap[e])
+                v = self.to[e ^ 1]
+            v = t
+            while v != s:
+                e = prev[v]
+                self.cap[e] -= push
+                self.cap[e ^ 1] += push
+                v = self.to[e ^ 1]
+            flow += push
+
+
+class ConsolidationAgent:
+    """Plans meal allocations between open donations and open requests."""
+
+    def __init__(self, radius_km: float = Config.MATCH_RADIUS_KM):
+        self.radius_km = radius_km
+
+    def feasible(self, d, r, now) -> bool:
+        if r.prefers_veg and not d.is_veg:
+            return False
+        return (d.ready_by <= r.latest and d.expire_by >= r.earliest
+                and d.expire_by > now and r.latest > now)
+
+    @timed("consolidation.plan")
+    def plan(self, donations: Sequence, requests: Sequence, now=None) -> List[Allocation]:
+        """Allocations delivering the most meals, then the cheapest such plan.
+
+        Rows are FoodDonation/FoodRequest objects (or anything with the same
+        fields plus `remaining_meals`); only their unallocated meals are used.
+        """
+        now = now or datetime.now()
+        donations = [d for d in donations if d.remaining_meals > 0]
+        requests = [r for r in requests if r.remaining_meals > 0]
+        if not donations or not requests:
+            return []
+        index = GridIndex(cell_km=self.radius_km)
+        for j, r in enumerate(requests):
+            index.insert(j, r.lat, r.lon)
+
+        n_d = len(donations)
+        source, sink = n_d + len(requests), n_d + len(requests) + 1
+        graph = _FlowGraph(sink + 1)
+        for i, d in enumerate(donations):
+            graph.add(source, i, d.remaining_meals, 0)
+        for j, r in enumerate(requests):
+            graph.add(n_d + j, sink, r.remaining_meals, 0)
+        lines = []      # (edge, donation, request, dist_km)
+        for i, d in enumerate(donations):
+            fresh = round((1.0 - urgency(d.expire_by, now)) * FRESH_COST)
+            for j in index.query(d.lat, d.lon, self.radius_km):
+                r = requests[j]
+                if not self.feasible(d, r, now):
+                    continue
+                km = haversine(d.lat, d.lon, r.lat, r.lon)
+                edge = graph.add(i, n_d + j, min(d.remaining_meals, r.remaining_meals),
+                                 round(km * KM_COST) + fresh)
+                lines.append((edge, d, r, km))
+        if not lines:
+            return []
+
+        graph.min_cost_max_flow(source, sink)
+        # flow on a line is the capacity its reverse edge picked up
+        return [Allocation(d, r, graph.cap[edge ^ 1], km)
+                for edge, d, r, km in lines if graph.cap[edge ^ 1]]
+
+
+CLOSED_LINES = ("delivered", "cancelled")
+
+
+def release_line(m):
+    """Give a cancelled line's meals back to its donation and request.
+
+    Matched rows that get meals back are reopened. Returns the reopened
+    (donations, requests) so the caller can hand them back to the matchers.
+    Lines made before allocations were recorded (meals is None) hold none.
+    """
+    reopened = ([], [])
+    for row, out in ((m.donation, reopened[0]), (m.request, reopened[1])):
+        row.allocated_meals = max(0, (row.allocated_meals or 0) - (m.meals or 0))
+        if row.status == "matched" and row.remaining_meals > 0:
+            row.status = "open"
+            out.append(row)
+    return reopened
+
+
+def _settle(db, model, fk, ids, status):
+    if not ids:
+        return
+    lines = select(Match.id).where(fk == model.id)
+    db.execute(update(model)
+               .where(model.id.in_(list(ids)), model.status == "matched",
+                      ~lines.where(Match.status.notin_(CLOSED_LINES)).exists(),
+                      lines.where(Match.status == "delivered").exists())
+               .values(status=status)
+               .execution_options(synchronize_session="fetch"))
+
+
+def settle_delivered(db, donation_ids, request_ids):
+    """Close matched donations/requests once none of their lines is still moving.
+
+    Call after any line moves to delivered or cancelled (flush first). A split
+    donation is delivered once every line carrying it is delivered or
+    cancelled and at least one was delivered; likewise a merged request is
+    fulfilled. Open rows still have meals to give or receive and are left
+    alone.
+    """
+    _settle(db, FoodDonation, Match.donation_id, donation_ids, "delivered")
+    _settle(db, FoodRequest, Match.request_id, request_ids, "fulfilled")
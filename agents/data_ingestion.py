@@ -1,5 +1,12 @@
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from agents.gazetteer import get_gazetteer, TALUKS
+from agents.geofence import get_geofence
+from config import Config
+
+def _has_coords(address):
+    return address.get("lat") not in (None, "") and address.get("lon") not in (None, "")
 
 @dataclass
 class IngestionResult:
@@ -7,9 +14,9 @@ class IngestionResult:
     reason: str = ""
 
 class DataIngestionAgent:
-    """Validates user/donation/request address for Belagavi District."""
+    """Validates and geocodes user/donation/request addresses for Belagavi District."""
 
-    def __init__(self):
+    def __init__(self, strict_taluk: bool = Config.GEOFENCE_STRICT_TALUK):
         # ✅ Allowed taluks inside Belagavi District
         self.allowed_taluks = {
             "belagavi",
@@ -23,9 +30,29 @@ class DataIngestionAgent:
             "raibag",
             "hukkeri",
         }
+        # ✅ Offline pincode table, loaded once per process
+        self.gazetteer = get_gazetteer()
+        # coordinates near a border may land in the wrong approximate taluk,
+        # so by default only district containment is enforced
+        self.strict_taluk = strict_taluk
+
+    @property
+    def geofence(self):
+        # taluk polygons, built on the first coordinate check
+        return get_geofence()
+
+    def _check_location(self, lat, lon, taluk) -> Optional[IngestionResult]:
+        """A failed result if (lat, lon) lies outside Belagavi district (or, when
+        `strict_taluk` is set, outside `taluk`)."""
+        found = self.geofence.locate(lat, lon)
+        if found is None:
+            return IngestionResult(False, "Location is outside Belagavi district.")
+        if self.strict_taluk and found != taluk:
+            return IngestionResult(False, f"Location is in {found.title()} taluk, not {taluk.title()}.")
+        return None
 
     def validate_user_address(self, address: Dict) -> IngestionResult:
-        # Expected keys: district, taluk, pincode
+        # Expected keys: district, taluk, pincode; optional lat, lon
         district = (address.get("district") or "").strip().lower()
         taluk = (address.get("taluk") or "").strip().lower()
         pincode = (address.get("pincode") or "").strip()
@@ -38,8 +65,69 @@ class DataIngestionAgent:
         if taluk not in self.allowed_taluks:
             return IngestionResult(False, "Only taluks within Belagavi district are allowed.")
 
-        # ✅ Belagavi pincodes start with 59
-        if not pincode.startswith("59"):
-            return IngestionResult(False, "Enter a valid Belagavi pincode (starts with 59).")
+        # ✅ Pincode must be a known Belagavi pincode in that taluk
+        place = self.gazetteer.lookup(pincode)
+        if place is None:
+            return IngestionResult(False, "Enter a valid Belagavi district pincode.")
+        if place.taluk != taluk:
+            return IngestionResult(False, f"Pincode {pincode} is in {place.taluk.title()} taluk, not {taluk.title()}.")
+
+        # ✅ Coordinates, when given, must fall inside the district (and taluk, if strict)
+        if _has_coords(address):
+            try:
+                lat, lon = float(address["lat"]), float(address["lon"])
+            except (TypeError, ValueError):
+                return IngestionResult(False, "Latitude and longitude must be numbers.")
+            failed = self._check_location(lat, lon, taluk)
+            if failed:
+                return failed
 
         return IngestionResult(True, "ok")
+
+    def validate_many(self, addresses: Iterable[Dict]) -> List[IngestionResult]:
+        """Batch form of validate_user_address, one result per address.
+
+        Pincodes are resolved with a single vectorized gazetteer lookup, and
+        any coordinates with a single batch geofence lookup.
+        """
+        addresses = list(addresses)
+        codes, _, _ = self.gazetteer.lookup_many([a.get("pincode") or "" for a in addresses])
+        lats = np.full(len(addresses), np.nan)
+        lons = np.full(len(addresses), np.nan)
+        with_coords = np.zeros(len(addresses), dtype=bool)
+        for n, a in enumerate(addresses):
+            if _has_coords(a):
+                with_coords[n] = True
+                try:
+                    lats[n], lons[n] = float(a["lat"]), float(a["lon"])
+                except (TypeError, ValueError):
+                    pass    # NaN: reported below
+        located = self.geofence.locate_many(lats, lons) if with_coords.any() else None
+        results = []
+        for n, (a, code) in enumerate(zip(addresses, codes)):
+            district = (a.get("district") or "").strip().lower()
+            taluk = (a.get("taluk") or "").strip().lower()
+            if district != "belagavi":
+                results.append(IngestionResult(False, "Only Belagavi district is supported."))
+            elif taluk not in self.allowed_taluks:
+                results.append(IngestionResult(False, "Only taluks within Belagavi district are allowed."))
+            elif not code:
+                results.append(IngestionResult(False, "Enter a valid Belagavi district pincode."))
+            elif TALUKS[code - 1] != taluk:
+                results.append(IngestionResult(False, f"Pincode {a.get('pincode')} is in {TALUKS[code - 1].title()} taluk, not {taluk.title()}."))
+            elif with_coords[n] and np.isnan(lats[n] + lons[n]):
+                results.append(IngestionResult(False, "Latitude and longitude must be numbers."))
+            elif with_coords[n] and not located[n]:
+                results.append(IngestionResult(False, "Location is outside Belagavi district."))
+            elif with_coords[n] and self.strict_taluk and TALUKS[located[n] - 1] != taluk:
+                results.append(IngestionResult(False, f"Location is in {TALUKS[located[n] - 1].title()} taluk, not {taluk.title()}."))
+            else:
+                results.append(IngestionResult(True, "ok"))
+        return results
+
+    def locate(self, pincode) -> Tuple[float, float]:
+        """(lat, lon) for a pincode; falls back to Belagavi city for unknown ones."""
+        place = self.gazetteer.lookup(pincode)
+        if place is None:
+            return self.gazetteer.centroids["belagavi"]
+        return place.lat, place.lon
@@ -0,0 +1,104 @@
+"""Expiry tracking for perishable donations and time-boxed requests.
+
+`ExpiryQueue` is a min-heap of open rows keyed on their deadline
+(`FoodDonation.expire_by`, `FoodRequest.latest`), so the next thing to go
+stale is always at the top. `sweep_expired` moves every open row past its
+deadline to "expired" with one UPDATE per table. The matching scheduler owns a
+queue, wakes up at its next deadline and sweeps; without the scheduler run
+
+    python -m agents.expiry
+"""
+import heapq
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import update
+from models import SessionLocal, FoodDonation, FoodRequest
+
+
+class ExpiryQueue:
+    """Min-heap of (deadline, kind, id) with lazy deletion.
+
+    `kind` is "d" for donations and "r" for requests. Removing or re-pushing
+    a row only updates `_live`; stale heap entries are skipped when they
+    surface.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, str, int]] = []
+        self._live: Dict[Tuple[str, int], datetime] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._live)
+
+    def push(self, kind, row_id, deadline):
+        with self._lock:
+            self._live[(kind, row_id)] = deadline
+            heapq.heappush(self._heap, (deadline, kind, row_id))
+            # don't let dead entries pile up when rows churn
+            if len(self._heap) > 2 * len(self._live) + 64:
+                self._compact()
+
+    def discard(self, kind, row_id):
+        with self._lock:
+            self._live.pop((kind, row_id), None)
+
+    def _prune(self):
+        while self._heap:
+            deadline, kind, row_id = self._heap[0]
+            if self._live.get((kind, row_id)) == deadline:
+                return
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        self._heap = [(t, k, i) for (k, i), t in self._live.items()]
+        heapq.heapify(self._heap)
+
+    def next_deadline(self) -> Optional[datetime]:
+        with self._lock:
+            self._prune()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now) -> List[Tuple[str, int]]:
+        """Remove and return every (kind, id) whose deadline is at or before `now`."""
+        due = []
+        with self._lock:
+            while True:
+                self._prune()
+                if not self._heap or self._heap[0][0] > now:
+                    return due
+                _, kind, row_id = heapq.heappop(self._heap)
+                del self._live[(kind, row_id)]
+                due.append((kind, row_id))
+
+
+def sweep_expired(db, now=None) -> Tuple[int, int]:
+    """Mark open donations past expire_by and open requests past latest as expired.
+
+    One UPDATE per table, served by the (status, expire_by) and
+    (status, latest) indexes. Returns (donations, requests) swept.
+    """
+    now = now or datetime.now()
+    donations = db.execute(
+        update(FoodDonation)
+        .where(FoodDonation.status=="open", FoodDonation.expire_by <= now)
+        .values(status="expired")
+    ).rowcount
+    requests = db.execute(
+        update(FoodRequest)
+        .where(FoodRequest.status=="open", FoodRequest.latest <= now)
+        .values(status="expired")
+    ).rowcount
+    db.commit()
+    return donations, requests
+
+
+def main():
+    with SessionLocal() as db:
+        donations, requests = sweep_expired(db)
+    print(f"expired {donations} donations, {requests} requests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+import numpy as np
+from agents.utils import haversine, haversine_many
+from config import Config
+from metrics import timed
+from models import Vehicle, Match
+
+# matches that occupy space on a vehicle
+ACTIVE_STATUSES = ("assigned", "enroute")
+
+@dataclass
+class VehicleOption:
+    vehicle_id: int
+    name: str
+    detour_km: float      # current position -> pickup -> dropoff
+    spare_meals: int      # left after taking this match
+    pickup_eta: datetime
+    cost: float
+
+class FleetAgent:
+    """Keeps each vehicle's committed load, position (last stop of its route)
+    and busy-until time on the `vehicles` row.
+
+    Every method works inside the caller's session, so the fleet state is
+    committed in the same transaction as the match change that caused it.
+    `is_available` means "has spare capacity".
+    """
+    def __init__(self, speed_kmph: float = Config.VEHICLE_SPEED_KMPH,
+                 service_min: float = Config.STOP_SERVICE_MIN,
+                 spare_weight_km: float = Config.FLEET_SPARE_WEIGHT_KM):
+        self.speed_kmph = speed_kmph
+        self.service_min = service_min
+        # a fully loaded vehicle ranks like one this many km further away
+        self.spare_weight_km = spare_weight_km
+
+    @staticmethod
+    def position(v):
+        if v.pos_lat is None or v.pos_lon is None:
+            return v.base_lat, v.base_lon
+        return v.pos_lat, v.pos_lon
+
+    def _drive(self, km):
+        return timedelta(minutes=km / self.speed_kmph * 60.0 + self.service_min)
+
+    def _append(self, v, m, now):
+        """Put match `m` at the end of vehicle `v`'s route."""
+        d, r = m.donation, m.request
+        lat, lon = self.position(v)
+        to_pickup = haversine(lat, lon, d.lat, d.lon)
+        to_dropoff = haversine(d.lat, d.lon, r.lat, r.lon)
+        start = max(now, v.busy_until or now)
+        v.busy_until = max(start + self._drive(to_pickup), d.ready_by) + self._drive(to_dropoff)
+        v.load_meals = (v.load_meals or 0) + m.load
+        v.pos_lat, v.pos_lon = r.lat, r.lon
+
+    def _set_available(self, v):
+        v.is_available = (v.load_meals or 0) < v.capacity_meals
+
+    def fits(self, v, m) -> bool:
+        return (v.load_meals or 0) + m.load <= v.capacity_meals
+
+    def assign(self, db, v, m, now=None):
+        """Commit-ready: put `m` on `v`, moving it off its previous vehicle if any."""
+        now = now or datetime.now()
+        previous = m.vehicle_id
+        if previous == v.id:
+            return
+        m.vehicle_id = v.id
+        if previous:
+            self.refresh(db, [db.get(Vehicle, previous)], now)
+        self._append(v, m, now)
+        self._set_available(v)
+
+    def deliver(self, db, m, now=None):
+        """Commit-ready: release `m`'s load; the vehicle stays at its last stop."""
+        v = m.vehicle
+        if v is None:
+            return
+        v.load_meals = max(0, (v.load_meals or 0) - m.load)
+        if v.load_meals == 0:
+            v.busy_until = None
+        self._set_available(v)
+
+    def refresh(self, db, vehicles, now=None):
+        """Recompute load, position and busy-until from the active matches.
+
+        Used after bulk re-planning. Routes planned by the fleet planner carry
+        their stop order and ETAs; anything else is replayed in match order.
+        """
+        now = now or datetime.now()
+        db.flush()      # the session doesn't autoflush; the query must see pending changes
+        vehicles = [v for v in vehicles if v is not None]
+        by_vehicle = {v.id: [] for v in vehicles}
+        for m in (db.query(Match)
+                  .filter(Match.vehicle_id.in_(by_vehicle), Match.status.in_(ACTIVE_STATUSES))
+                  .order_by(Match.id)):
+            by_vehicle[m.vehicle_id].append(m)
+        for v in vehicles:
+            active = by_vehicle[v.id]
+            v.load_meals, v.busy_until = 0, None
+            if not active:
+                self._set_available(v)
+                continue
+            route = json.loads(active[0].route_json or "{}")
+            last = route.get("stops", [])[-1:]
+            if last and all(m.route_json == active[0].route_json for m in active):
+                v.load_meals = sum(m.load for m in active)
+                v.pos_lat, v.pos_lon = last[0]["lat"], last[0]["lon"]
+                v.busy_until = datetime.fromisoformat(last[0]["eta"])
+            else:
+                v.pos_lat = v.pos_lon = None
+                for m in active:
+                    self._append(v, m, now)
+            self._set_available(v)
+
+    @timed("fleet.rank_vehicles")
+    def rank_vehicles(self, vehicles, m, now=None) -> List[VehicleOption]:
+        """Vehicles that can take match `m`, best first.
+
+        A vehicle qualifies if it has room for the donation and can reach the
+        pickup before the food expires. Ranked by detour distance plus a
+        penalty for how full the vehicle would be afterwards.
+        """
+        now = now or datetime.now()
+        d, r = m.donation, m.request
+        vehicles = [v for v in vehicles if v.id == m.vehicle_id or self.fits(v, m)]
+        if not vehicles:
+            return []
+        pos = np.array([self.position(v) for v in vehicles], dtype=float)
+        to_pickup = haversine_many(pos[:, 0], pos[:, 1], d.lat, d.lon)
+        detour = to_pickup + haversine(d.lat, d.lon, r.lat, r.lon)
+        options = []
+        for v, km, extra in zip(vehicles, to_pickup, detour):
+            load = (v.load_meals or 0) - (m.load if v.id == m.vehicle_id else 0)
+            spare = v.capacity_meals - load - m.load
+            if spare < 0:
+                continue
+            eta = max(now, v.busy_until or now) + self._drive(float(km))
+            if eta > d.expire_by:
+                continue
+            fullness = 1.0 - spare / max(1, v.capacity_meals)
+            options.append(VehicleOption(v.id, v.name, float(extra), spare, eta,
+                                         float(extra) + self.spare_weight_km * fullness))
+        options.sort(key=lambda o: o.cost)
+        return options
+
+    def best_vehicle(self, db, m, now=None) -> Optional[Vehicle]:
+        # lock the fleet so concurrent assignments see each other's load
+        options = self.rank_vehicles(db.query(Vehicle).with_for_update().all(), m, now)
+        return db.get(Vehicle, options[0].vehicle_id) if options else None
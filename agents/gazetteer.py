@@ -0,0 +1,111 @@
+"""Offline pincode -> (taluk, centroid) lookups for Belagavi district.
+
+The editable source is data/belagavi_pincodes.csv. On first use it is
+compiled into a dense array indexed by `pincode - PIN_BASE` and saved next to
+it as .npy, which later processes memory-map instead of parsing; a lookup is
+a single array index.
+"""
+import csv
+import os
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+SOURCE = os.path.join(DATA_DIR, "belagavi_pincodes.csv")
+COMPILED = os.path.join(DATA_DIR, "belagavi_pincodes.npy")
+
+# Belagavi district pincodes fall in 590000-591999
+PIN_BASE = 590000
+PIN_SPAN = 2000
+
+TALUKS = (
+    "belagavi", "gokak", "khanapur", "ramdurg", "saundatti",
+    "bailhongal", "athani", "chikkodi", "raibag", "hukkeri",
+)
+# taluk code 0 marks an unused slot
+_DTYPE = np.dtype([("taluk", "u1"), ("lat", "<f4"), ("lon", "<f4")])
+
+@dataclass(frozen=True)
+class Place:
+    pincode: str
+    taluk: str
+    lat: float
+    lon: float
+
+def compile_table(source=SOURCE):
+    table = np.zeros(PIN_SPAN, dtype=_DTYPE)
+    with open(source, encoding="utf-8", newline="") as f:
+        rows = csv.DictReader(line for line in f if not line.startswith("#"))
+        for row in rows:
+            slot = int(row["pincode"]) - PIN_BASE
+            if not 0 <= slot < PIN_SPAN:
+                raise ValueError(f"pincode {row['pincode']} outside Belagavi district range")
+            table[slot] = (TALUKS.index(row["taluk"].strip().lower()) + 1,
+                           float(row["lat"]), float(row["lon"]))
+    return table
+
+def _load(source=SOURCE, compiled=COMPILED):
+    fresh = os.path.exists(compiled) and os.path.getmtime(compiled) >= os.path.getmtime(source)
+    if not fresh:
+        table = compile_table(source)
+        try:
+            # workers may compile at once: write aside, then rename into place
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(compiled), suffix=".npy.tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, table)
+                os.replace(tmp, compiled)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            # read-only checkout: keep the in-memory copy
+            return table
+    return np.load(compiled, mmap_mode="r")
+
+class Gazetteer:
+
+    def __init__(self, table=None):
+        self.table = _load() if table is None else table
+        self.centroids = {}
+        for code, taluk in enumerate(TALUKS, start=1):
+            rows = self.table[self.table["taluk"] == code]
+            if len(rows):
+                self.centroids[taluk] = (round(float(rows["lat"].mean()), 5),
+                                         round(float(rows["lon"].mean()), 5))
+
+    def lookup(self, pincode) -> Optional[Place]:
+        try:
+            slot = int(str(pincode).strip()) - PIN_BASE
+        except ValueError:
+            return None
+        if not 0 <= slot < PIN_SPAN:
+            return None
+        code, lat, lon = self.table[slot].tolist()
+        if not code:
+            return None
+        # float32 storage: round away the representation noise
+        return Place(str(pincode).strip(), TALUKS[code - 1], round(lat, 5), round(lon, 5))
+
+    def lookup_many(self, pincodes: Sequence) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vectorized lookup: (taluk codes, lats, lons); code 0 means unknown."""
+        slots = np.full(len(pincodes), -1, dtype=np.int64)
+        for i, p in enumerate(pincodes):
+            try:
+                slot = int(str(p).strip()) - PIN_BASE
+            except ValueError:
+                continue
+            # range-check before storing: huge numbers overflow int64
+            if 0 <= slot < PIN_SPAN:
+                slots[i] = slot
+        valid = (slots >= 0) & (slots < PIN_SPAN)
+        rec = self.table[np.where(valid, slots, 0)]
+        codes = np.where(valid, rec["taluk"], 0)
+        return codes, rec["lat"].astype(float), rec["lon"].astype(float)
+
+@lru_cache(maxsize=1)
+def get_gazetteer() -> Gazetteer:
+    return Gazetteer()
@@ -0,0 +1,288 @@
+"""Point-in-polygon geofence for Belagavi district's taluks.
+
+Taluk boundaries are read from data/belagavi_taluks.geojson (one Feature per
+taluk, Polygon or MultiPolygon, coordinates as [lon, lat], holes allowed).
+On load every polygon part gets a bounding box, and a uniform grid over the
+district records for each cell:
+
+- the part containing the cell's centre (computed once, by ray casting), and
+- the edges that touch the cell.
+
+A lookup then only tests the few edges in the point's cell: the point is in
+a part if the centre is, flipped once per edge crossed on the way from the
+centre to the point. Cells with no edges answer with a single array read.
+
+The shipped boundary file is a coarse approximation (Voronoi cells of the
+gazetteer's pincode centroids, clipped to the district's bounding box),
+produced by
+
+    python -m agents.geofence build-approx
+
+Replace it with surveyed taluk boundaries when they are available, then set
+GEOFENCE_STRICT_TALUK=true so ingestion also rejects coordinates that fall
+in another taluk; until then only district containment is enforced.
+"""
+import argparse
+import json
+import os
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from config import Config
+from agents.gazetteer import DATA_DIR, TALUKS, get_gazetteer
+
+BOUNDARIES = os.path.join(DATA_DIR, "belagavi_taluks.geojson")
+
+
+def _edges_of(rings):
+    """(n, 4) array of x0, y0, x1, y1 for every edge of closed `rings`."""
+    edges = []
+    for ring in rings:
+        pts = np.asarray(ring, dtype=float)
+        if len(pts) and (pts[0] != pts[-1]).any():
+            pts = np.vstack([pts, pts[:1]])
+        edges.append(np.hstack([pts[:-1], pts[1:]]))
+    return np.vstack(edges)
+
+
+def _inside(edges, x, y):
+    """Even-odd ray casting of points (x, y) against `edges`; vectorized over points."""
+    x = np.atleast_1d(x)[:, None]
+    y = np.atleast_1d(y)[:, None]
+    x0, y0, x1, y1 = edges.T
+    straddles = (y0 > y) != (y1 > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+    return (straddles & (x < x_cross)).sum(axis=1) % 2 == 1
+
+
+def _crosses(cx, cy, px, py, x0, y0, x1, y1):
+    """Whether segment (cx, cy)-(px, py) properly crosses edge (x0, y0)-(x1, y1)."""
+    d1 = (x1 - x0) * (cy - y0) - (y1 - y0) * (cx - x0)
+    d2 = (x1 - x0) * (py - y0) - (y1 - y0) * (px - x0)
+    d3 = (px - cx) * (y0 - cy) - (py - cy) * (x0 - cx)
+    d4 = (px - cx) * (y1 - cy) - (py - cy) * (x1 - cx)
+    return (d1 * d2 < 0) & (d3 * d4 < 0)
+
+
+class Geofence:
+    """Resolves (lat, lon) to a taluk of Belagavi district, or None outside it."""
+
+    def __init__(self, parts: Sequence[Tuple[str, List]], grid=None):
+        """`parts`: (taluk, rings) per polygon part; rings are [[lon, lat], ...]."""
+        grid = grid or Config.GEOFENCE_GRID
+        self.codes = np.array([TALUKS.index(t) + 1 for t, _ in parts], dtype=np.uint8)
+        part_edges = [_edges_of(rings) for _, rings in parts]
+        self.bboxes = np.array([
+            (e[:, [0, 2]].min(), e[:, [1, 3]].min(), e[:, [0, 2]].max(), e[:, [1, 3]].max())
+            for e in part_edges
+        ])
+        # plain floats: single lookups stay in pure Python
+        self.x0, self.y0 = float(self.bboxes[:, 0].min()), float(self.bboxes[:, 1].min())
+        self.x1, self.y1 = float(self.bboxes[:, 2].max()), float(self.bboxes[:, 3].max())
+        self.n = grid
+        self.dx = (self.x1 - self.x0) / grid
+        self.dy = (self.y1 - self.y0) / grid
+
+        # which part holds each cell centre (-1: none)
+        cx = self.x0 + (np.arange(grid) + 0.5) * self.dx
+        cy = self.y0 + (np.arange(grid) + 0.5) * self.dy
+        gx, gy = np.meshgrid(cx, cy, indexing="ij")
+        self.centre_part = np.full((grid, grid), -1, dtype=np.int32)
+        for p, edges in enumerate(part_edges):
+            b = self.bboxes[p]
+            near = (gx >= b[0]) & (gx <= b[2]) & (gy >= b[1]) & (gy <= b[3])
+            hit = np.zeros_like(near)
+            hit[near] = _inside(edges, gx[near], gy[near])
+            self.centre_part[hit] = p
+
+        # (cell, part, edge) for every cell an edge's bounding box overlaps;
+        # extra cells are harmless, the segment test rejects them
+        entries = []
+        for p, edges in enumerate(part_edges):
+            ix0 = self._col(np.minimum(edges[:, 0], edges[:, 2]))
+            ix1 = self._col(np.maximum(edges[:, 0], edges[:, 2]))
+            iy0 = self._row(np.minimum(edges[:, 1], edges[:, 3]))
+            iy1 = self._row(np.maximum(edges[:, 1], edges[:, 3]))
+            for e in range(len(edges)):
+                for i in range(ix0[e], ix1[e] + 1):
+                    for j in range(iy0[e], iy1[e] + 1):
+                        entries.append((i * grid + j, p, *edges[e]))
+        entries.sort(key=lambda t: (t[0], t[1]))
+        table = np.array(entries, dtype=float).reshape(-1, 6)
+
+        # CSR layout for batches: cell_start[c]:cell_start[c+1] indexes the edge arrays
+        cells = table[:, 0].astype(np.int64)
+        self.cell_start = np.searchsorted(cells, np.arange(grid * grid + 1))
+        self.edge_part = table[:, 1].astype(np.int32)
+        self.edge_xy = table[:, 2:]
+        # tuples for single lookups: {cell: [(part, x0, y0, x1, y1), ...]}
+        self.centre_list = self.centre_part.ravel().tolist()
+        self.cell_edges = {}
+        for row in entries:
+            self.cell_edges.setdefault(int(row[0]), []).append((int(row[1]), *map(float, row[2:])))
+
+    def _col(self, x):
+        return np.clip(((x - self.x0) / self.dx).astype(int), 0, self.n - 1)
+
+    def _row(self, y):
+        return np.clip(((y - self.y0) / self.dy).astype(int), 0, self.n - 1)
+
+    def _part(self, lat, lon) -> int:
+        x, y = lon, lat
+        if not (self.x0 <= x <= self.x1 and self.y0 <= y <= self.y1):
+            return -1
+        i = min(int((x - self.x0) / self.dx), self.n - 1)
+        j = min(int((y - self.y0) / self.dy), self.n - 1)
+        cell = i * self.n + j
+        centre = self.centre_list[cell]
+        edges = self.cell_edges.get(cell)
+        if not edges:
+            return centre
+        cx = self.x0 + (i + 0.5) * self.dx
+        cy = self.y0 + (j + 0.5) * self.dy
+        # parity of boundary crossings per part on the way from the centre
+        odd = {}
+        for p, x0, y0, x1, y1 in edges:
+            odd[p] = odd.get(p, False) ^ _crosses(cx, cy, x, y, x0, y0, x1, y1)
+        for p, flipped in odd.items():
+            if (p == centre) ^ flipped:
+                return p
+        return -1 if centre in odd else centre
+
+    def locate(self, lat, lon) -> Optional[str]:
+        """The taluk containing (lat, lon), or None outside the district."""
+        p = self._part(float(lat), float(lon))
+        return TALUKS[self.codes[p] - 1] if p >= 0 else None
+
+    def contains(self, lat, lon) -> bool:
+        return self._part(float(lat), float(lon)) >= 0
+
+    def locate_many(self, lats, lons) -> np.ndarray:
+        """Taluk codes (index into TALUKS + 1; 0 = outside) for arrays of points.
+
+        Fully vectorized: every point is paired with the edges of its cell
+        only, and crossings are summed per (point, part).
+        """
+        y = np.asarray(lats, dtype=float)
+        x = np.asarray(lons, dtype=float)
+        out = np.zeros(len(x), dtype=np.uint8)
+        ok = (np.isfinite(x) & np.isfinite(y)
+              & (x >= self.x0) & (x <= self.x1) & (y >= self.y0) & (y <= self.y1))
+        idx = np.nonzero(ok)[0]
+        x, y = x[idx], y[idx]
+        i, j = self._col(x), self._row(y)
+        cell = i * self.n + j
+        part = self.centre_part[i, j].astype(np.int64)
+
+        start = self.cell_start[cell]
+        counts = self.cell_start[cell + 1] - start
+        pt = np.repeat(np.arange(len(idx)), counts)
+        edge = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(start, counts)
+        x0, y0, x1, y1 = self.edge_xy[edge].T
+        crossed = _crosses(self.x0 + (i[pt] + 0.5) * self.dx, self.y0 + (j[pt] + 0.5) * self.dy,
+                           x[pt], y[pt], x0, y0, x1, y1)
+        # odd crossings per (point, part) flip that part's centre status
+        nparts = len(self.codes)
+        keys, odd = np.unique(pt * nparts + self.edge_part[edge], return_inverse=True)
+        odd = np.bincount(odd, weights=crossed, minlength=len(keys)) % 2 == 1
+        key_pt, key_part = keys // nparts, keys % nparts
+        in_part = (key_part == part[key_pt]) ^ odd
+        # the centre's part no longer applies where its boundary runs through the cell
+        part[key_pt[key_part == part[key_pt]]] = -1
+        part[key_pt[in_part]] = key_part[in_part]
+
+        hit = part >= 0
+        out[idx[hit]] = self.codes[part[hit]]
+        return out
+
+
+def load_parts(path=BOUNDARIES):
+    """[(taluk, rings), ...] from a GeoJSON FeatureCollection."""
+    with open(path, encoding="utf-8") as f:
+        collection = json.load(f)
+    parts = []
+    for feature in collection["features"]:
+        taluk = feature["properties"]["taluk"].strip().lower()
+        geometry = feature["geometry"]
+        if geometry["type"] == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry["type"] == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            raise ValueError(f"{taluk}: unsupported geometry {geometry['type']}")
+        parts.extend((taluk, rings) for rings in polygons)
+    return parts
+
+
+@lru_cache(maxsize=1)
+def get_geofence() -> Geofence:
+    return Geofence(load_parts())
+
+
+# ---------- APPROXIMATE BOUNDARIES ----------
+def _clip(poly, a, b, c):
+    """Sutherland-Hodgman: keep the part of `poly` where a*x + b*y <= c."""
+    out = []
+    for k in range(len(poly)):
+        p, q = poly[k], poly[(k + 1) % len(poly)]
+        fp, fq = a * p[0] + b * p[1] - c, a * q[0] + b * q[1] - c
+        if fp <= 0:
+            out.append(p)
+        if fp * fq < 0:
+            t = fp / (fp - fq)
+            out.append((p[0] + t * (q[0] - p[0]), p[1] + t * (q[1] - p[1])))
+    return out
+
+
+def approximate_boundaries(margin=0.15):
+    """GeoJSON of Voronoi cells around the gazetteer's pincode centroids, per taluk."""
+    table = get_gazetteer().table
+    seeds = {}
+    for code, lat, lon in table[table["taluk"] > 0].tolist():
+        seeds.setdefault((round(lon, 5), round(lat, 5)), TALUKS[code - 1])
+    points = list(seeds)
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+    box = [(min(xs) - margin, min(ys) - margin), (max(xs) + margin, min(ys) - margin),
+           (max(xs) + margin, max(ys) + margin), (min(xs) - margin, max(ys) + margin)]
+    cells = {}
+    for p in points:
+        poly = box
+        for q in points:
+            if q != p:
+                # half-plane of points closer to p than to q
+                a, b = q[0] - p[0], q[1] - p[1]
+                c = (q[0] ** 2 + q[1] ** 2 - p[0] ** 2 - p[1] ** 2) / 2
+                poly = _clip(poly, a, b, c)
+        ring = [[round(x, 5), round(y, 5)] for x, y in poly]
+        cells.setdefault(seeds[p], []).append([ring + ring[:1]])
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "properties": {"taluk": taluk, "source": "approximate: Voronoi cells of pincode centroids"},
+            "geometry": {"type": "MultiPolygon", "coordinates": polygons},
+        } for taluk, polygons in sorted(cells.items())],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Taluk geofence tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build-approx", help="write approximate boundaries from the gazetteer")
+    build.add_argument("--out", default=BOUNDARIES)
+    locate = sub.add_parser("locate", help="print the taluk of a point")
+    locate.add_argument("lat", type=float)
+    locate.add_argument("lon", type=float)
+    args = parser.parse_args()
+    if args.command == "build-approx":
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(approximate_boundaries(), f, separators=(",", ":"))
+            f.write("\n")
+        print(f"wrote {args.out}")
+    else:
+        print(get_geofence().locate(args.lat, args.lon) or "outside Belagavi district")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,235 @@
-from dataclasses import dataclass
-from typing import List, Tuple
-from agents.utils import haversine
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from agents.utils import distance_matrix
+from config import Config
+from metrics import timed
 
 @dataclass
 class RoutePlan:
     order: List[Tuple[float, float]]
     total_km: float
 
+@dataclass
+class Stop:
+    match_id: int
+    kind: str           # pickup / dropoff
+    node: int           # row/column in the planner's distance matrix
+    lat: float
+    lon: float
+    meals: int
+    earliest: float     # time window, minutes after planning start
+    latest: float
+
+@dataclass
+class VehicleRoute:
+    vehicle_id: int
+    stops: List[Stop]
+    etas: List[datetime]
+    total_km: float
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "vehicle_id": self.vehicle_id,
+            "order": [(s.lat, s.lon) for s in self.stops],
+            "km": self.total_km,
+            "stops": [
+                {"match_id": s.match_id, "kind": s.kind, "lat": s.lat, "lon": s.lon,
+                 "eta": eta.isoformat(timespec="minutes")}
+                for s, eta in zip(self.stops, self.etas)
+            ],
+        })
+
+@dataclass
+class FleetPlan:
+    routes: Dict[int, VehicleRoute] = field(default_factory=dict)
+    unassigned: List[int] = field(default_factory=list)  # match ids that fit no vehicle
+
 class LogisticsAgent:
-    """Assigns a vehicle and builds a simple nearest-neighbor multi-stop route."""
+    """Assigns vehicles and builds routes: a nearest-neighbor route for one
+    match, or capacity- and time-window-aware routes for the whole fleet."""
     def __init__(self):
         pass
 
+    @timed("logistics.nearest_neighbor")
     def nearest_neighbor(self, start_lat, start_lon, stops: List[Tuple[float,float]]) -> RoutePlan:
-        remaining = stops[:]
+        # index 0 is the start, 1..n are the stops
+        dist = distance_matrix([(start_lat, start_lon)] + list(stops), list(stops))
+        visited = np.zeros(len(stops), dtype=bool)
         order = []
-        cur = (start_lat, start_lon)
+        cur = 0
         total = 0.0
-        while remaining:
-            nxt = min(remaining, key=lambda p: haversine(cur[0], cur[1], p[0], p[1]))
-            total += haversine(cur[0], cur[1], nxt[0], nxt[1])
-            order.append(nxt)
-            remaining.remove(nxt)
-            cur = nxt
+        for _ in range(len(stops)):
+            row = np.where(visited, np.inf, dist[cur])
+            nxt = int(np.argmin(row))
+            total += float(row[nxt])
+            order.append(stops[nxt])
+            visited[nxt] = True
+            cur = nxt + 1
         return RoutePlan(order=order, total_km=total)
+
+    @timed("logistics.plan_fleet")
+    def plan_fleet(self, vehicles, matches, now: Optional[datetime] = None,
+                   time_budget_s: float = Config.ROUTE_TIME_BUDGET_S) -> FleetPlan:
+        """Multi-stop routes for the whole fleet.
+
+        Every match becomes a pickup (donation, within ready_by..expire_by) and
+        a dropoff (request, within earliest..latest and before the food
+        expires). Matches are inserted cheapest-first into capacity- and
+        time-feasible positions, then each route is improved with 2-opt and
+        or-opt moves until no move helps or `time_budget_s` runs out. Matches
+        still left when the budget is spent are only tried at route ends.
+
+        Each route starts where the vehicle's committed work leaves it: at its
+        position, no earlier than `busy_until`, and with only the capacity its
+        `load_meals` leaves free. Pass vehicles whose state reflects just the
+        work that is not being re-planned (see `FleetAgent.refresh`).
+        """
+        return _FleetPlanner(vehicles, matches, now or datetime.now()).solve(time_budget_s)
+
+
+class _FleetPlanner:
+
+    def __init__(self, vehicles, matches, now):
+        self.now = now
+        self.speed_km_per_min = Config.VEHICLE_SPEED_KMPH / 60.0
+        self.service_min = Config.STOP_SERVICE_MIN
+        self.vehicles = list(vehicles)
+        # meals already committed (e.g. enroute) keep their room on board
+        self.capacity = {v.id: v.capacity_meals - (v.load_meals or 0) for v in self.vehicles}
+        self.start_node = {v.id: i for i, v in enumerate(self.vehicles)}
+        self.start_min = {v.id: max(0.0, self._minutes(v.busy_until)) if v.busy_until else 0.0
+                          for v in self.vehicles}
+
+        points = [(v.base_lat, v.base_lon) if v.pos_lat is None or v.pos_lon is None
+                  else (v.pos_lat, v.pos_lon) for v in self.vehicles]
+        self.jobs = []
+        for m in matches:
+            d, r = m.donation, m.request
+            pickup = Stop(m.id, "pickup", len(points), d.lat, d.lon, m.load,
+                          self._minutes(d.ready_by), self._minutes(d.expire_by))
+            points.append((d.lat, d.lon))
+            dropoff = Stop(m.id, "dropoff", len(points), r.lat, r.lon, m.load,
+                           self._minutes(r.earliest), self._minutes(min(r.latest, d.expire_by)))
+            points.append((r.lat, r.lon))
+            self.jobs.append((pickup, dropoff))
+        self.dist = distance_matrix(points, points)
+        self.routes = {v.id: [] for v in self.vehicles}
+        self.km = {v.id: 0.0 for v in self.vehicles}
+
+    def _minutes(self, t):
+        return (t - self.now).total_seconds() / 60.0
+
+    def evaluate(self, vid, stops):
+        """(km, arrival minutes) if the stop sequence is feasible for vehicle `vid`, else None."""
+        cap = self.capacity[vid]
+        cur = self.start_node[vid]
+        t = self.start_min[vid]
+        km = 0.0
+        load = 0
+        picked = set()
+        arrivals = []
+        for s in stops:
+            leg = self.dist[cur, s.node]
+            km += leg
+            t = max(t + leg / self.speed_km_per_min, s.earliest)
+            if t > s.latest:
+                return None
+            if s.kind == "pickup":
+                load += s.meals
+                if load > cap:
+                    return None
+                picked.add(s.match_id)
+            else:
+                if s.match_id not in picked:
+                    return None
+                load -= s.meals
+            arrivals.append(t)
+            t += self.service_min
+            cur = s.node
+        return float(km), arrivals
+
+    @staticmethod
+    def _positions(n, deadline):
+        """(pickup, dropoff) slots for a job in an n-stop route.
+
+        Every slot while time lasts; once `deadline` has passed only appending
+        to the end, so a long plan degrades to cheap insertions, not overruns.
+        """
+        for i in range(n + 1):
+            if time.monotonic() > deadline:
+                yield n, n + 1
+                return
+            for j in range(i + 1, n + 2):
+                yield i, j
+
+    def insert(self, pickup, dropoff, deadline=float("inf")):
+        best = None
+        for vid, route in self.routes.items():
+            for i, j in self._positions(len(route), deadline):
+                with_pickup = route[:i] + [pickup] + route[i:]
+                cand = with_pickup[:j] + [dropoff] + with_pickup[j:]
+                res = self.evaluate(vid, cand)
+                if res is None:
+                    continue
+                delta = res[0] - self.km[vid]
+                if best is None or delta < best[0]:
+                    best = (delta, vid, cand, res[0])
+        if best is None:
+            return False
+        _, vid, cand, km = best
+        self.routes[vid] = cand
+        self.km[vid] = km
+        return True
+
+    @staticmethod
+    def _neighbours(route):
+        """2-opt and or-opt variants of `route`, built one at a time."""
+        n = len(route)
+        # 2-opt: reverse route[i..j]
+        for i in range(n - 1):
+            for j in range(i + 1, n):
+                yield route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+        # or-opt: move a run of 1-3 consecutive stops elsewhere
+        for length in (1, 2, 3):
+            for i in range(n - length + 1):
+                seg = route[i:i + length]
+                rest = route[:i] + route[i + length:]
+                for k in range(len(rest) + 1):
+                    if k != i:
+                        yield rest[:k] + seg + rest[k:]
+
+    def improve(self, vid, deadline):
+        """Apply the first improving 2-opt or or-opt move; False when none is left."""
+        for cand in self._neighbours(self.routes[vid]):
+            if time.monotonic() > deadline:
+                return False
+            res = self.evaluate(vid, cand)
+            if res is not None and res[0] < self.km[vid] - 1e-9:
+                self.routes[vid] = cand
+                self.km[vid] = res[0]
+                return True
+        return False
+
+    def solve(self, time_budget_s):
+        deadline = time.monotonic() + time_budget_s
+        plan = FleetPlan()
+        # most perishable first
+        for pickup, dropoff in sorted(self.jobs, key=lambda job: job[0].latest):
+            if not self.insert(pickup, dropoff, deadline):
+                plan.unassigned.append(pickup.match_id)
+
+        for vid in self.routes:
+            while time.monotonic() < deadline and self.improve(vid, deadline):
+                pass
+
+        for vid, stops in self.routes.items():
+            if not stops:
+                continue
+            _, arrivals = self.evaluate(vid, stops)
+            etas = [self.now + timedelta(minutes=t) for t in arrivals]
+            plan.routes[vid] = VehicleRoute(vid, stops, etas, self.km[vid])
+        return plan
@@ -1,26 +1,209 @@
 from dataclasses import dataclass
-from typing import Tuple
-from agents.utils import haversine
+from datetime import datetime
+from typing import List, Sequence, Tuple
+import numpy as np
+from agents.utils import haversine, distance_matrix
+from agents.spatial import GridIndex
+from config import Config
+from metrics import timed
 
 @dataclass
 class MatchScore:
     score: float
     reason: str
 
+def linear_assignment(cost) -> Tuple[np.ndarray, np.ndarray]:
+    """Minimum-cost one-to-one assignment (Hungarian method with potentials).
+
+    Works on rectangular matrices; returns (row_idx, col_idx) for the
+    min(n_rows, n_cols) assigned cells.
+    """
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)    # p[j]: 1-based row holding column j
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used
+            free[0] = False
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free[1:] & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            masked = np.where(free[1:], minv[1:], np.inf)
+            j1 = int(np.argmin(masked)) + 1
+            delta = masked[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.nonzero(p[1:])[0]
+    rows = p[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+TIME_WEIGHT = 0.1
+
+def urgency(expire_by, now, horizon_h=Config.URGENCY_HORIZON_H) -> float:
+    """0 for food good for `horizon_h` or more, rising linearly to 1 at expiry."""
+    hours_left = (expire_by - now).total_seconds() / 3600.0
+    return min(1.0, max(0.0, 1.0 - hours_left / horizon_h))
+
 class MatchingAgent:
     """Computes compatibility score between a donation and a request."""
-    def __init__(self):
-        pass
+    def __init__(self, radius_km: float = Config.MATCH_RADIUS_KM):
+        # only pairs within this radius are considered for matching
+        self.radius_km = radius_km
+        # spatial indexes over open rows, keyed by id
+        self.open_donations = GridIndex(cell_km=radius_km)
+        self.open_requests = GridIndex(cell_km=radius_km)
+
+    def track_donation(self, donation):
+        self.open_donations.insert(donation.id, donation.lat, donation.lon)
+
+    def track_request(self, request):
+        self.open_requests.insert(request.id, request.lat, request.lon)
+
+    def untrack_donation(self, donation_id):
+        self.open_donations.remove(donation_id)
+
+    def untrack_request(self, request_id):
+        self.open_requests.remove(request_id)
+
+    def sync(self, donations: Sequence, requests: Sequence):
+        """Bring the open-row indexes in line with the given open rows.
+
+        Rows created or closed by another worker process are picked up here.
+        """
+        for index, rows in ((self.open_donations, donations), (self.open_requests, requests)):
+            ids = set()
+            for row in rows:
+                ids.add(row.id)
+                if row.id not in index:
+                    index.insert(row.id, row.lat, row.lon)
+            # keys() is a snapshot: request threads may track/untrack meanwhile
+            for stale in [k for k in index.keys() if k not in ids]:
+                index.remove(stale)
+
+    def candidate_groups(self, donations: Sequence, requests: Sequence):
+        """Split the rows into independent groups of nearby donations/requests.
 
-    def score(self, donation, request) -> MatchScore:
+        Two rows share a group when they are linked by a chain of pairs within
+        `radius_km`; pairs in different groups can never be matched, so each
+        group is scored and assigned on its own.
+        """
+        self.sync(donations, requests)
+        n_d = len(donations)
+        req_pos = {r.id: j for j, r in enumerate(requests)}
+        parent = list(range(n_d + len(requests)))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        linked = set()
+        for i, d in enumerate(donations):
+            for rid in self.open_requests.query(d.lat, d.lon, self.radius_km):
+                j = req_pos.get(rid)
+                if j is None:
+                    continue
+                linked.update((i, n_d + j))
+                a, b = find(i), find(n_d + j)
+                if a != b:
+                    parent[a] = b
+
+        groups = {}
+        for x in sorted(linked):
+            ds, rs = groups.setdefault(find(x), ([], []))
+            if x < n_d:
+                ds.append(donations[x])
+            else:
+                rs.append(requests[x - n_d])
+        return list(groups.values())
+
+    def urgency_vector(self, donations: Sequence, now=None) -> np.ndarray:
+        now = now or datetime.now()
+        return np.array([urgency(d.expire_by, now) for d in donations], dtype=float)
+
+    @timed("matching.score")
+    def score(self, donation, request, now=None) -> MatchScore:
         # base score from food preference
         food_score = 1.0 if (donation.is_veg or (not donation.is_veg and not request.prefers_veg)) else 0.3
-        # quantity fit
-        qty_ratio = min(1.0, donation.quantity_meals / max(1, request.need_meals))
+        # quantity fit, on the meals not yet allocated elsewhere
+        qty_ratio = min(1.0, donation.remaining_meals / max(1, request.remaining_meals))
         # distance penalty
         dist_km = haversine(donation.lat, donation.lon, request.lat, request.lon)
         dist_score = max(0.0, 1.0 - (dist_km / 10.0))  # 0 at 10+ km
         # freshness: if donation expires soon, prioritize
-        time_score = 1.0
-        s = 0.4*food_score + 0.3*qty_ratio + 0.2*dist_score + 0.1*time_score
-        return MatchScore(score=s, reason=f"food={food_score:.2f}, qty={qty_ratio:.2f}, dist={dist_km:.1f}km")
+        time_score = urgency(donation.expire_by, now or datetime.now())
+        s = 0.4*food_score + 0.3*qty_ratio + 0.2*dist_score + TIME_WEIGHT*time_score
+        return MatchScore(score=s, reason=f"food={food_score:.2f}, qty={qty_ratio:.2f}, dist={dist_km:.1f}km, urgency={time_score:.2f}")
+
+    def score_matrix(self, donations: Sequence, requests: Sequence, now=None):
+        """Same terms as `score`, for every donation x request pair at once.
+
+        Returns (scores, food, qty, dist_km), each shaped (len(donations), len(requests)).
+        """
+        is_veg = np.array([bool(d.is_veg) for d in donations])
+        qty = np.array([d.remaining_meals for d in donations], dtype=float)
+        d_pts = [(d.lat, d.lon) for d in donations]
+        prefers_veg = np.array([bool(r.prefers_veg) for r in requests])
+        need = np.array([max(1, r.remaining_meals) for r in requests], dtype=float)
+        r_pts = [(r.lat, r.lon) for r in requests]
+
+        food = np.where(is_veg[:, None] | ~prefers_veg[None, :], 1.0, 0.3)
+        qty_ratio = np.minimum(1.0, qty[:, None] / need[None, :])
+        dist_km = distance_matrix(d_pts, r_pts)
+        dist_score = np.maximum(0.0, 1.0 - dist_km / 10.0)
+        time_score = self.urgency_vector(donations, now)[:, None]
+        scores = 0.4*food + 0.3*qty_ratio + 0.2*dist_score + TIME_WEIGHT*time_score
+        return scores, food, qty_ratio, dist_km
+
+    @timed("matching.match_all")
+    def match_all(self, donations: Sequence, requests: Sequence,
+                  min_score: float = 0.0, now=None) -> List[Tuple[object, object, MatchScore]]:
+        """Globally optimal one-to-one pairing that maximizes total score.
+
+        Only pairs within `radius_km` are considered; the urgency term makes
+        donations that expire soon win over fresher ones. Returns
+        (donation, request, MatchScore) for every assigned pair whose score
+        is at least `min_score`.
+        """
+        if not donations or not requests:
+            return []
+        pairs = []
+        for group_d, group_r in self.candidate_groups(donations, requests):
+            scores, food, qty_ratio, dist_km = self.score_matrix(group_d, group_r, now)
+            in_range = dist_km <= self.radius_km
+            # out-of-range pairs get a prohibitive cost and are dropped below
+            rows, cols = linear_assignment(np.where(in_range, -scores, 1e6))
+            for i, j in zip(rows, cols):
+                s = float(scores[i, j])
+                if not in_range[i, j] or s < min_score:
+                    continue
+                reason = f"food={food[i, j]:.2f}, qty={qty_ratio[i, j]:.2f}, dist={dist_km[i, j]:.1f}km"
+                pairs.append((group_d[i], group_r[j], MatchScore(score=s, reason=reason)))
+        return pairs
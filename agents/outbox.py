@@ -0,0 +1,183 @@
+import atexit
+import heapq
+import itertools
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from config import Config
+from metrics import AGENT_SECONDS
+
+log = logging.getLogger(__name__)
+
+class EmailOutbox:
+    """In-process mail queue drained by background workers.
+
+    Request handlers only pay for a `queue.put`; the message itself is built
+    on the worker. Each worker keeps one SMTP
+    connection open and reuses it across batches, reconnects when the server
+    drops it, and retries failed messages with exponential backoff.
+    """
+
+    def __init__(self, workers=Config.OUTBOX_WORKERS, batch_size=Config.OUTBOX_BATCH_SIZE,
+                 max_attempts=Config.OUTBOX_MAX_ATTEMPTS, backoff_s=Config.OUTBOX_BACKOFF_S,
+                 idle_close_s=30.0):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.idle_close_s = idle_close_s
+        self.sent = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._retries = []              # heap of (due, seq, attempts, item)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._idle = threading.Condition(self._lock)
+        self._pid = None
+        self._threads = []
+
+    # ---------- producer side ----------
+    def enqueue(self, subject, to_email, body):
+        with self._lock:
+            self._pending += 1
+        self._queue.put((0, (subject, to_email, body)))
+        if self._pid != os.getpid():
+            self._start()
+
+    def flush(self, timeout=None):
+        """Block until every queued message is sent or dropped."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def _start(self):
+        with self._lock:
+            # threads don't survive fork(); start fresh ones in each process
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"email-outbox-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for t in self._threads:
+            t.start()
+
+    # ---------- worker side ----------
+    def _connect(self):
+        if Config.SMTP_SSL:
+            smtp = smtplib.SMTP_SSL(Config.SMTP_HOST, Config.SMTP_PORT, timeout=30)
+        else:
+            smtp = smtplib.SMTP(Config.SMTP_HOST, Config.SMTP_PORT, timeout=30)
+        if Config.GMAIL_USER and Config.GMAIL_PASS:
+            smtp.login(Config.GMAIL_USER, Config.GMAIL_PASS)
+        return smtp
+
+    @staticmethod
+    def _build(item):
+        subject, to_email, body = item
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = Config.MAIL_FROM
+        msg["To"] = to_email
+        msg.set_content(body)
+        return msg
+
+    def _next_batch(self):
+        """Wait for work; returns [(attempts, item), ...] or [] on idle timeout."""
+        batch = []
+        with self._lock:
+            now = time.monotonic()
+            while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+                _, _, attempts, item = heapq.heappop(self._retries)
+                batch.append((attempts, item))
+            wait = self.idle_close_s
+            if self._retries:
+                wait = min(wait, max(0.0, self._retries[0][0] - now))
+        if not batch:
+            try:
+                batch.append(self._queue.get(timeout=wait))
+            except queue.Empty:
+                return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _done(self, sent):
+        with self._idle:
+            if sent:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._pending -= 1
+            if not self._pending:
+                self._idle.notify_all()
+
+    def _run(self):
+        smtp = None
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if smtp is not None:
+                    # idle: give the connection back to the server
+                    try:
+                        smtp.quit()
+                    except (smtplib.SMTPException, OSError):
+                        pass
+                    smtp = None
+                continue
+            for attempts, item in batch:
+                t = time.perf_counter()
+                try:
+                    if smtp is None:
+                        smtp = self._connect()
+                    smtp.send_message(self._build(item))
+                    AGENT_SECONDS.observe(time.perf_counter() - t, "smtp.deliver")
+                except (smtplib.SMTPException, OSError) as e:
+                    if isinstance(e, (smtplib.SMTPServerDisconnected, OSError)):
+                        smtp = None
+                    self._retry(attempts + 1, item, e)
+                    continue
+                except Exception as e:
+                    # a bad message or a bug must not kill the worker, or flush()
+                    # would wait forever; the connection may be mid-command
+                    log.exception("Unexpected error sending email to %s", item[1])
+                    if smtp is not None:
+                        try:
+                            smtp.close()
+                        except Exception:
+                            pass
+                        smtp = None
+                    self._retry(attempts + 1, item, e)
+                    continue
+                self._done(sent=True)
+
+    def _retry(self, attempts, item, error):
+        to_email = item[1]
+        if attempts >= self.max_attempts:
+            log.error("Dropping email to %s after %d attempts: %s", to_email, attempts, error)
+            self._done(sent=False)
+            return
+        due = time.monotonic() + self.backoff_s * 2 ** (attempts - 1)
+        log.warning("Email to %s failed (%s); retry %d scheduled", to_email, error, attempts)
+        with self._lock:
+            heapq.heappush(self._retries, (due, next(self._seq), attempts, item))
+
+
+outbox = EmailOutbox()
+
+# best effort: deliver what is already queued when the process exits
+atexit.register(lambda: outbox.flush(timeout=5))
@@ -0,0 +1,225 @@
+"""Incrementally maintained rollups for impact reporting.
+
+When a match becomes delivered, `record_deliveries` adds it to two small
+tables inside the same transaction (and `forget_deliveries` takes it out
+again when a delivered match is deleted):
+
+- rollup_deliveries, keyed by (day, pincode, veg flag): deliveries, meals and
+  the summed post-to-delivery time; the taluk comes from the gazetteer.
+- rollup_vehicles, keyed by (day, vehicle): deliveries, meals and capacity.
+
+Days are local days in REPORT_TIMEZONE (IST), not UTC ones. Reports read
+only these tables, so they cost O(days x areas) however many matches exist. `rebuild` regenerates both from the matches (hot and
+archived) after a bug fix or a manual data change:
+
+    python -m agents.rollups rebuild
+"""
+import argparse
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+from sqlalchemy import select, delete, func, case
+from sqlalchemy.dialects import mysql, sqlite
+from agents.gazetteer import get_gazetteer
+from config import Config
+from models import (SessionLocal, DeliveryRollup, VehicleRollup, Match, ArchivedMatch,
+                    FoodDonation, ArchivedDonation, Vehicle)
+
+DELIVERY_KEYS = ("day", "pincode", "is_veg")
+VEHICLE_KEYS = ("day", "vehicle_id")
+
+# the donation columns a rollup needs, read straight from a rebuild query
+_DonationView = namedtuple("_DonationView", "pincode is_veg created_at")
+
+
+def local_day(utc_time: datetime) -> date:
+    """The REPORT_TIMEZONE day of a naive UTC timestamp."""
+    return utc_time.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(Config.REPORT_TIMEZONE)).date()
+
+
+def _taluk(pincode):
+    place = get_gazetteer().lookup(pincode)
+    return place.taluk if place else "unknown"
+
+
+def _upsert(db, model, keys, rows):
+    """Add each row's counters onto the existing rollup row, creating it if missing."""
+    if not rows:
+        return
+    table = model.__table__
+    counters = [c for c in rows[0] if c not in keys and c != "taluk"]
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in counters})
+        db.execute(stmt)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys), set_={c: table.c[c] + stmt.excluded[c] for c in counters})
+        db.execute(stmt)
+    else:
+        for row in rows:
+            key = {k: row[k] for k in keys}
+            existing = db.get(model, key)
+            if existing is None:
+                db.add(model(**row))
+            else:
+                for c in counters:
+                    setattr(existing, c, getattr(existing, c) + row[c])
+        db.flush()
+
+
+def _accumulate(deliveries, vehicles, donation, meals, vehicle_id, capacity, delivered_at, sign=1):
+    day = local_day(delivered_at)
+    meals = meals or 0
+    d = deliveries[(day, donation.pincode or "", bool(donation.is_veg))]
+    d["deliveries"] += sign
+    d["meals"] += sign * meals
+    if donation.created_at:
+        d["post_to_delivery_s"] += sign * max(0.0, (delivered_at - donation.created_at).total_seconds())
+    if vehicle_id is not None:
+        v = vehicles[(day, vehicle_id)]
+        v["deliveries"] += sign
+        v["meals"] += sign * meals
+        v["capacity_meals"] += sign * (capacity or 0)
+
+
+def _rows(keys, totals):
+    rows = []
+    for key, counters in sorted(totals.items()):
+        row = dict(zip(keys, key), **counters)
+        if "pincode" in row:
+            row["taluk"] = _taluk(row["pincode"])
+        rows.append(row)
+    return rows
+
+
+def _new_totals():
+    return (defaultdict(lambda: {"deliveries": 0, "meals": 0, "post_to_delivery_s": 0.0}),
+            defaultdict(lambda: {"deliveries": 0, "meals": 0, "capacity_meals": 0}))
+
+
+def record_deliveries(db, matches, delivered_at):
+    """Commit-ready: add newly delivered `matches` to the rollups.
+
+    Call in the transaction that moves them to delivered, and only for
+    matches that were not delivered before. `delivered_at` is UTC, like
+    created_at; it is bucketed by its REPORT_TIMEZONE day. Each match's donation and vehicle must be loadable.
+    """
+    deliveries, vehicles = _new_totals()
+    for m in matches:
+        v = m.vehicle
+        _accumulate(deliveries, vehicles, m.donation, m.load, m.vehicle_id,
+                    v.capacity_meals if v else 0, delivered_at)
+    _upsert(db, DeliveryRollup, DELIVERY_KEYS, _rows(DELIVERY_KEYS, deliveries))
+    _upsert(db, VehicleRollup, VEHICLE_KEYS, _rows(VEHICLE_KEYS, vehicles))
+
+
+def forget_deliveries(db, matches):
+    """Commit-ready: take delivered `matches` that are being deleted out of the rollups.
+
+    `rebuild` can't see deleted matches, so without this the incremental
+    totals would disagree with a rebuild. Counted on the same day `rebuild`
+    would have used (delivered_at, else created_at).
+    """
+    deliveries, vehicles = _new_totals()
+    for m in matches:
+        v = m.vehicle
+        _accumulate(deliveries, vehicles, m.donation, m.load, m.vehicle_id,
+                    v.capacity_meals if v else 0, m.delivered_at or m.created_at, sign=-1)
+    _upsert(db, DeliveryRollup, DELIVERY_KEYS, _rows(DELIVERY_KEYS, deliveries))
+    _upsert(db, VehicleRollup, VEHICLE_KEYS, _rows(VEHICLE_KEYS, vehicles))
+    # a rebuild has no rows for days/areas left with nothing delivered
+    db.execute(delete(DeliveryRollup).where(DeliveryRollup.deliveries <= 0))
+    db.execute(delete(VehicleRollup).where(VehicleRollup.deliveries <= 0))
+
+
+def rebuild(session_factory=SessionLocal, chunk=5000):
+    """Recompute both rollup tables from every delivered match, hot or archived."""
+    deliveries, vehicles = _new_totals()
+    with session_factory() as db:
+        capacity = dict(db.execute(select(Vehicle.id, Vehicle.capacity_meals)).all())
+        # a hot match never points at an archived donation (agents.archive moves matches first)
+        for match_t, donation_t in ((Match, FoodDonation), (ArchivedMatch, ArchivedDonation),
+                                    (ArchivedMatch, FoodDonation)):
+            stmt = (select(match_t.vehicle_id, match_t.delivered_at, match_t.created_at,
+                           func.coalesce(match_t.meals, donation_t.quantity_meals).label("meals"),
+                           donation_t.pincode, donation_t.is_veg,
+                           donation_t.created_at.label("posted_at"))
+                    .join(donation_t, donation_t.id == match_t.donation_id)
+                    .where(match_t.status == "delivered")
+                    .execution_options(yield_per=chunk))
+            for row in db.execute(stmt):
+                # matches delivered before delivered_at existed count on their creation day
+                when = row.delivered_at or row.created_at
+                donation = _DonationView(row.pincode, row.is_veg, row.posted_at)
+                _accumulate(deliveries, vehicles, donation, row.meals, row.vehicle_id,
+                            capacity.get(row.vehicle_id, 0), when)
+        db.execute(delete(DeliveryRollup))
+        db.execute(delete(VehicleRollup))
+        delivery_rows = _rows(DELIVERY_KEYS, deliveries)
+        vehicle_rows = _rows(VEHICLE_KEYS, vehicles)
+        for i in range(0, len(delivery_rows), chunk):
+            db.execute(DeliveryRollup.__table__.insert(), delivery_rows[i:i + chunk])
+        for i in range(0, len(vehicle_rows), chunk):
+            db.execute(VehicleRollup.__table__.insert(), vehicle_rows[i:i + chunk])
+        db.commit()
+    return len(delivery_rows), len(vehicle_rows)
+
+
+# ---------- REPORTS ----------
+def report(db, start: date, end: date):
+    """Impact figures for days start..end inclusive, read from the rollups only."""
+    d = DeliveryRollup
+    by_taluk = db.execute(
+        select(d.day, d.taluk,
+               func.sum(d.deliveries), func.sum(d.meals),
+               func.sum(case((d.is_veg == True, d.meals), else_=0)),
+               func.sum(d.post_to_delivery_s))
+        .where(d.day >= start, d.day <= end)
+        .group_by(d.day, d.taluk).order_by(d.day.desc(), d.taluk)
+    ).all()
+    v = VehicleRollup
+    by_vehicle = db.execute(
+        select(v.day, v.vehicle_id, Vehicle.name, v.deliveries, v.meals, v.capacity_meals)
+        .outerjoin(Vehicle, Vehicle.id == v.vehicle_id)
+        .where(v.day >= start, v.day <= end)
+        .order_by(v.day.desc(), v.vehicle_id)
+    ).all()
+
+    def avg_hours(total_s, n):
+        return round(total_s / n / 3600, 2) if n else None
+
+    deliveries = sum(r[2] for r in by_taluk)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "totals": {
+            "deliveries": deliveries,
+            "meals": sum(r[3] for r in by_taluk),
+            "avg_post_to_delivery_h": avg_hours(sum(r[5] for r in by_taluk), deliveries),
+        },
+        "taluks": [{
+            "day": day.isoformat(), "taluk": taluk, "deliveries": n, "meals": meals,
+            "veg_meals": veg, "non_veg_meals": meals - veg,
+            "avg_post_to_delivery_h": avg_hours(total_s, n),
+        } for day, taluk, n, meals, veg, total_s in by_taluk],
+        "vehicles": [{
+            "day": day.isoformat(), "vehicle_id": vehicle_id, "name": name or f"#{vehicle_id}",
+            "deliveries": n, "meals": meals,
+            "utilization": round(meals / cap, 3) if cap else None,
+        } for day, vehicle_id, name, n, meals, cap in by_vehicle],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Impact reporting rollups.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+    deliveries, vehicles = rebuild()
+    print(f"rebuilt {deliveries} delivery rows, {vehicles} vehicle rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+import numpy as np
+from sqlalchemy import update, select
+from agents.expiry import ExpiryQueue, sweep_expired
+from agents.matching import MatchingAgent, linear_assignment, urgency, TIME_WEIGHT
+from config import Config
+import events
+from metrics import AGENT_SECONDS
+from models import FoodDonation, FoodRequest, Match
+
+log = logging.getLogger(__name__)
+
+DONATION_FIELDS = ("id", "is_veg", "quantity_meals", "remaining_meals", "lat", "lon", "ready_by", "expire_by")
+REQUEST_FIELDS = ("id", "prefers_veg", "need_meals", "remaining_meals", "lat", "lon", "earliest", "latest")
+
+
+def _snapshot(row, fields):
+    return SimpleNamespace(**{f: getattr(row, f) for f in fields})
+
+
+class MatchingScheduler:
+    """Background matcher driven by donation/request changes.
+
+    Write handlers call `notify_*` after they commit. The worker keeps the open
+    rows and the scores of every in-range pair in memory, so a change only
+    re-scores the changed row against its spatial neighbours. Changes are
+    coalesced: the first one opens a `debounce_s` window (extended by later
+    changes, capped at `max_wait_s`) and the whole burst is handled by one
+    matching pass. A full resync from the database every `resync_s` picks up
+    rows written by other processes or bulk imports.
+
+    Open rows also sit in an expiry heap; the worker wakes at the earliest
+    deadline and sweeps stale rows to "expired". Cached scores leave out the
+    urgency term, which is added per pass so it tracks the clock.
+    """
+
+    def __init__(self, session_factory, agent=None,
+                 auto_commit=Config.SCHEDULER_AUTO_COMMIT,
+                 debounce_s=Config.SCHEDULER_DEBOUNCE_S,
+                 max_wait_s=Config.SCHEDULER_MAX_WAIT_S,
+                 resync_s=Config.SCHEDULER_RESYNC_S,
+                 min_score=0.0):
+        self.session_factory = session_factory
+        # own agent: its spatial indexes are only touched by the worker thread
+        self.agent = agent or MatchingAgent()
+        self.auto_commit = auto_commit
+        self.debounce_s = debounce_s
+        self.max_wait_s = max_wait_s
+        self.resync_s = resync_s
+        self.min_score = min_score
+
+        self.donations: Dict[int, SimpleNamespace] = {}
+        self.requests: Dict[int, SimpleNamespace] = {}
+        self.scores: Dict[Tuple[int, int], float] = {}      # without the urgency term
+        self.expiry = ExpiryQueue()
+        self._pairs_of_d = defaultdict(set)
+        self._pairs_of_r = defaultdict(set)
+
+        # last pass's suggestions when not auto-committing: [(donation_id, request_id, score)]
+        self.proposals: List[Tuple[int, int, float]] = []
+        self.passes = 0
+        self.committed = 0
+        self.expired = 0
+
+        self._pending = {}          # ("d"|"r", id) -> snapshot, or None when closed
+        self._resync_wanted = True
+        self._last_resync = 0.0
+        self._cond = threading.Condition()
+        self._pid = None
+
+    # ---------- producer side (request threads) ----------
+    def start(self):
+        with self._cond:
+            # threads don't survive fork(); start a fresh worker in each process
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="matching-scheduler", daemon=True).start()
+
+    def _push(self, key, value):
+        with self._cond:
+            self._pending[key] = value
+            self._cond.notify()
+        if self._pid != os.getpid():
+            self.start()
+
+    def notify_donation(self, donation):
+        self._push(("d", donation.id),
+                   _snapshot(donation, DONATION_FIELDS) if donation.status == "open" else None)
+
+    def notify_request(self, request):
+        self._push(("r", request.id),
+                   _snapshot(request, REQUEST_FIELDS) if request.status == "open" else None)
+
+    def notify_closed(self, donation_ids=(), request_ids=()):
+        with self._cond:
+            for i in donation_ids:
+                self._pending[("d", i)] = None
+            for i in request_ids:
+                self._pending[("r", i)] = None
+            self._cond.notify()
+
+    def request_resync(self):
+        with self._cond:
+            self._resync_wanted = True
+            self._cond.notify()
+
+    # ---------- worker ----------
+    def _seconds_to_expiry(self):
+        deadline = self.expiry.next_deadline()
+        if deadline is None:
+            return float("inf")
+        return (deadline - datetime.now()).total_seconds()
+
+    def _wait_for_burst(self):
+        """Block until there is work, then let a burst settle. Returns (changes, resync)."""
+        with self._cond:
+            while not self._pending and not self._resync_wanted:
+                timeout = min(self._last_resync + self.resync_s - time.monotonic(),
+                              self._seconds_to_expiry())
+                if timeout <= 0:
+                    break       # resync or expiry due
+                self._cond.wait(timeout)
+            if time.monotonic() >= self._last_resync + self.resync_s:
+                self._resync_wanted = True
+            first = time.monotonic()
+            seen = len(self._pending)
+            while seen:
+                remaining = min(self.debounce_s, first + self.max_wait_s - time.monotonic())
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                if len(self._pending) == seen:
+                    break       # quiet for a whole debounce window
+                seen = len(self._pending)
+            changes, self._pending = self._pending, {}
+            resync, self._resync_wanted = self._resync_wanted, False
+        return changes, resync
+
+    def _run(self):
+        while True:
+            changes, resync = self._wait_for_burst()
+            t = time.perf_counter()
+            try:
+                if resync:
+                    self._sweep(self.expiry.pop_due(datetime.now()), force=True)
+                    self._resync()
+                    self._last_resync = time.monotonic()
+                for (kind, row_id), snap in changes.items():
+                    if kind == "d":
+                        self._upsert_donation(row_id, snap)
+                    else:
+                        self._upsert_request(row_id, snap)
+                self._sweep(self.expiry.pop_due(datetime.now()))
+                self._pass()
+            except Exception:
+                # keep the worker alive; the next resync rebuilds state from the DB
+                log.exception("Matching pass failed")
+                with self._cond:
+                    self._resync_wanted = True
+            AGENT_SECONDS.observe(time.perf_counter() - t, "scheduler.pass")
+
+    def _sweep(self, due, force=False):
+        """Expire rows whose deadline passed; `force` sweeps even if none are tracked here."""
+        if not due and not force:
+            return
+        with self.session_factory() as db:
+            donations, requests = sweep_expired(db)
+            if donations or requests:
+                self._publish(db, [i for k, i in due if k == "d"], [i for k, i in due if k == "r"])
+        self.expired += donations + requests
+        for kind, row_id in due:
+            if kind == "d":
+                self._upsert_donation(row_id, None)
+            else:
+                self._upsert_request(row_id, None)
+        if donations or requests:
+            log.info("Expired %d donations and %d requests", donations, requests)
+
+    def _resync(self):
+        with self.session_factory() as db:
+            ds = {d.id: _snapshot(d, DONATION_FIELDS)
+                  for d in db.query(FoodDonation).filter(FoodDonation.status=="open")}
+            rs = {r.id: _snapshot(r, REQUEST_FIELDS)
+                  for r in db.query(FoodRequest).filter(FoodRequest.status=="open")}
+        for i in [i for i in self.donations if i not in ds]:
+            self._upsert_donation(i, None)
+        for i in [i for i in self.requests if i not in rs]:
+            self._upsert_request(i, None)
+        for i, snap in ds.items():
+            if i not in self.donations:
+                self._upsert_donation(i, snap)
+        for i, snap in rs.items():
+            if i not in self.requests:
+                self._upsert_request(i, snap)
+
+    # ---------- incremental score maintenance ----------
+    def _drop_pairs(self, keys):
+        for key in keys:
+            self.scores.pop(key, None)
+            self._pairs_of_d[key[0]].discard(key)
+            self._pairs_of_r[key[1]].discard(key)
+
+    def _upsert_donation(self, donation_id, snap):
+        self._drop_pairs(list(self._pairs_of_d.pop(donation_id, ())))
+        if snap is None:
+            self.donations.pop(donation_id, None)
+            self.agent.untrack_donation(donation_id)
+            self.expiry.discard("d", donation_id)
+            return
+        self.donations[donation_id] = snap
+        self.agent.track_donation(snap)
+        self.expiry.push("d", donation_id, snap.expire_by)
+        near = [self.requests[i] for i in self.agent.open_requests.query(snap.lat, snap.lon, self.agent.radius_km)]
+        if near:
+            now = datetime.now()
+            scores = self.agent.score_matrix([snap], near, now)[0][0] - TIME_WEIGHT*urgency(snap.expire_by, now)
+            for r, s in zip(near, scores):
+                self._add_pair(donation_id, r.id, float(s))
+
+    def _upsert_request(self, request_id, snap):
+        self._drop_pairs(list(self._pairs_of_r.pop(request_id, ())))
+        if snap is None:
+            self.requests.pop(request_id, None)
+            self.agent.untrack_request(request_id)
+            self.expiry.discard("r", request_id)
+            return
+        self.requests[request_id] = snap
+        self.agent.track_request(snap)
+        self.expiry.push("r", request_id, snap.latest)
+        near = [self.donations[i] for i in self.agent.open_donations.query(snap.lat, snap.lon, self.agent.radius_km)]
+        if near:
+            now = datetime.now()
+            scores = (self.agent.score_matrix(near, [snap], now)[0][:, 0]
+                      - TIME_WEIGHT*self.agent.urgency_vector(near, now))
+            for d, s in zip(near, scores):
+                self._add_pair(d.id, request_id, float(s))
+
+    def _add_pair(self, d_id, r_id, score):
+        key = (d_id, r_id)
+        self.scores[key] = score
+        self._pairs_of_d[d_id].add(key)
+        self._pairs_of_r[r_id].add(key)
+
+    # ---------- matching pass ----------
+    def _groups(self):
+        """Connected components of the in-range pair graph, as (donation ids, request ids)."""
+        parent = {}
+
+        def find(x):
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for d_id, r_id in self.scores:
+            a, b = find(("d", d_id)), find(("r", r_id))
+            if a != b:
+                parent[a] = b
+        groups = defaultdict(lambda: ([], []))
+        for node in list(parent):
+            kind, i = node
+            groups[find(node)][0 if kind == "d" else 1].append(i)
+        return groups.values()
+
+    def _pass(self):
+        now = datetime.now()
+        bonus = {d: TIME_WEIGHT*urgency(row.expire_by, now) for d, row in self.donations.items()}
+        chosen = []
+        # soonest-expiring groups first, so their matches are claimed first
+        groups = sorted(self._groups(), key=lambda g: min(self.donations[d].expire_by for d in g[0]))
+        for d_ids, r_ids in groups:
+            d_ids.sort()
+            r_ids.sort()
+            cost = np.full((len(d_ids), len(r_ids)), 1e6)
+            r_pos = {r: j for j, r in enumerate(r_ids)}
+            for i, d in enumerate(d_ids):
+                for _, r in self._pairs_of_d[d]:
+                    cost[i, r_pos[r]] = -(self.scores[(d, r)] + bonus[d])
+            for i, j in zip(*linear_assignment(cost)):
+                s = -cost[i, j]
+                if cost[i, j] < 1e6 and s >= self.min_score:
+                    chosen.append((d_ids[i], r_ids[j], float(s)))
+        chosen.sort(key=lambda p: (self.donations[p[0]].expire_by, -p[2]))
+        self.passes += 1
+        if self.auto_commit:
+            self._commit(chosen)
+            self.proposals = []
+        else:
+            self.proposals = chosen
+
+    def _publish(self, db, donation_ids, request_ids):
+        """Push rows this worker changed to open pages (see events.py)."""
+        if not len(events.bus):
+            return
+        for d in db.query(FoodDonation).filter(FoodDonation.id.in_(donation_ids)):
+            events.publish_donation(d)
+        for r in db.query(FoodRequest).filter(FoodRequest.id.in_(request_ids)):
+            events.publish_request(r)
+        events.publish_counts(db)
+
+    def _commit(self, chosen):
+        if not chosen:
+            return
+        with self.session_factory() as db:
+            # conditional UPDATEs claim rows atomically, even against other workers
+            claimed_d = {d for d, _, _ in chosen if db.execute(
+                update(FoodDonation).where(FoodDonation.id==d, FoodDonation.status=="open")
+                .values(status="matched")).rowcount == 1}
+            claimed_r = {r for _, r, _ in chosen if db.execute(
+                update(FoodRequest).where(FoodRequest.id==r, FoodRequest.status=="open")
+                .values(status="matched")).rowcount == 1}
+            # unallocated meals of the claimed rows; consolidation may have booked some
+            left_d = dict(db.execute(select(FoodDonation.id, FoodDonation.quantity_meals - FoodDonation.allocated_meals)
+                                     .where(FoodDonation.id.in_(claimed_d))).all()) if claimed_d else {}
+            left_r = dict(db.execute(select(FoodRequest.id, FoodRequest.need_meals - FoodRequest.allocated_meals)
+                                     .where(FoodRequest.id.in_(claimed_r))).all()) if claimed_r else {}
+            # only the side that is used up closes; the other keeps its meals
+            made, still_d, still_r = [], [], []
+            for d, r, s in chosen:
+                if d in claimed_d and r in claimed_r:
+                    meals = max(0, min(left_d[d], left_r[r]))
+                    db.execute(update(FoodDonation).where(FoodDonation.id==d)
+                               .values(allocated_meals=FoodDonation.allocated_meals + meals))
+                    db.execute(update(FoodRequest).where(FoodRequest.id==r)
+                               .values(allocated_meals=FoodRequest.allocated_meals + meals))
+                    made.append(Match(donation_id=d, request_id=r, score=s, meals=meals, status="planned"))
+                    left_d[d] -= meals
+                    left_r[r] -= meals
+                    if left_d[d] > 0:
+                        still_d.append(d)
+                    if left_r[r] > 0:
+                        still_r.append(r)
+                elif d in claimed_d:
+                    db.execute(update(FoodDonation).where(FoodDonation.id==d).values(status="open"))
+                elif r in claimed_r:
+                    db.execute(update(FoodRequest).where(FoodRequest.id==r).values(status="open"))
+            if still_d:
+                db.execute(update(FoodDonation).where(FoodDonation.id.in_(still_d)).values(status="open"))
+            if still_r:
+                db.execute(update(FoodRequest).where(FoodRequest.id.in_(still_r)).values(status="open"))
+            db.add_all(made)
+            db.commit()
+            if made:
+                for m in made:
+                    events.publish_match(m)
+                self._publish(db, [m.donation_id for m in made], [m.request_id for m in made])
+        self.committed += len(made)
+        snaps_d = {d: self.donations[d] for d in still_d}
+        snaps_r = {r: self.requests[r] for r in still_r}
+        # everything we tried is either matched now or was closed by someone else
+        for d, r, _ in chosen:
+            if d in claimed_d and r not in claimed_r:
+                self._upsert_request(r, None)
+            elif r in claimed_r and d not in claimed_d:
+                self._upsert_donation(d, None)
+            else:
+                self._upsert_donation(d, None)
+                self._upsert_request(r, None)
+        # ...or still open with fewer meals, and scored again on those
+        for d, snap in snaps_d.items():
+            self._upsert_donation(d, SimpleNamespace(**{**vars(snap), "remaining_meals": left_d[d]}))
+        for r, snap in snaps_r.items():
+            self._upsert_request(r, SimpleNamespace(**{**vars(snap), "remaining_meals": left_r[r]}))
+        if made:
+            log.info("Scheduler committed %d matches", len(made))
@@ -0,0 +1,74 @@
+import math
+import threading
+from collections import defaultdict
+from typing import Dict, Hashable, List, Tuple
+from agents.utils import haversine
+
+KM_PER_DEG_LAT = 111.32
+
+class GridIndex:
+    """Buckets points into a uniform lat/lon grid for fast radius lookups.
+
+    A radius query only visits the cells overlapping the query's bounding box,
+    so its cost depends on how many points are nearby, not on the total count.
+    Safe to share between threads: request handlers track and untrack rows
+    while a matching pass queries or syncs the same index.
+    """
+
+    def __init__(self, cell_km: float = 10.0):
+        self.cell_deg = cell_km / KM_PER_DEG_LAT
+        self._cells: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float]]] = defaultdict(dict)
+        self._where: Dict[Hashable, Tuple[int, int]] = {}
+        self._lock = threading.RLock()
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def keys(self) -> List[Hashable]:
+        """A snapshot of the keys, safe to iterate while others insert/remove."""
+        with self._lock:
+            return list(self._where)
+
+    def insert(self, key, lat, lon):
+        with self._lock:
+            self.remove(key)
+            cell = self._cell(lat, lon)
+            self._cells[cell][key] = (lat, lon)
+            self._where[key] = cell
+
+    def remove(self, key):
+        with self._lock:
+            cell = self._where.pop(key, None)
+            if cell is None:
+                return
+            bucket = self._cells[cell]
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._where.clear()
+
+    def query(self, lat, lon, radius_km) -> List[Hashable]:
+        """Keys of all points within `radius_km` of (lat, lon)."""
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlon = radius_km / (KM_PER_DEG_LAT * max(0.01, math.cos(math.radians(lat))))
+        lo_i, lo_j = self._cell(lat - dlat, lon - dlon)
+        hi_i, hi_j = self._cell(lat + dlat, lon + dlon)
+        with self._lock:
+            points = []
+            for i in range(lo_i, hi_i + 1):
+                for j in range(lo_j, hi_j + 1):
+                    bucket = self._cells.get((i, j))
+                    if bucket:
+                        points.extend(bucket.items())
+        # distances outside the lock; the copied points are a consistent snapshot
+        return [key for key, (plat, plon) in points if haversine(lat, lon, plat, plon) <= radius_km]
@@ -1,10 +1,17 @@
 import math
-from email.message import EmailMessage
-import smtplib
+import threading
+from collections import OrderedDict
+import numpy as np
 from config import Config
+from agents.outbox import outbox
+from metrics import timed
+
+EARTH_RADIUS_KM = 6371.0
+# distance_matrix rounds coordinates to this many decimals (~1 m) before caching
+COORD_DECIMALS = 5
 
 def haversine(lat1, lon1, lat2, lon2):
-    R = 6371.0
+    R = EARTH_RADIUS_KM
     phi1, phi2 = math.radians(lat1), math.radians(lat2)
     dphi = math.radians(lat2 - lat1)
     dl = math.radians(lon2 - lon1)
@@ -12,18 +19,75 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R * c  # km
 
+def haversine_many(lat1s, lon1s, lat2s, lon2s):
+    """Vectorized `haversine`; arguments broadcast like any NumPy expression."""
+    phi1 = np.radians(np.asarray(lat1s, dtype=float))
+    phi2 = np.radians(np.asarray(lat2s, dtype=float))
+    dphi = phi2 - phi1
+    dl = np.radians(np.asarray(lon2s, dtype=float) - np.asarray(lon1s, dtype=float))
+    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dl/2)**2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1-a))  # km
+
+class _MatrixCache:
+    """Thread-safe LRU of distance matrices, bounded by total cell count."""
+
+    def __init__(self, max_cells=2_000_000):
+        self.max_cells = max_cells
+        self.cells = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            m = self._data.get(key)
+            if m is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return m
+
+    def put(self, key, m):
+        if m.size > self.max_cells:
+            return
+        with self._lock:
+            if key in self._data:
+                return
+            self._data[key] = m
+            self.cells += m.size
+            while self.cells > self.max_cells:
+                _, old = self._data.popitem(last=False)
+                self.cells -= old.size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.cells = 0
+
+distance_cache = _MatrixCache()
+
+def distance_matrix(points_a, points_b):
+    """km between every (lat, lon) in points_a and every (lat, lon) in points_b.
+
+    Coordinates are rounded to COORD_DECIMALS and the result is served from a
+    shared LRU cache, so the returned array is read-only.
+    """
+    a = np.round(np.asarray(points_a, dtype=float).reshape(-1, 2), COORD_DECIMALS)
+    b = np.round(np.asarray(points_b, dtype=float).reshape(-1, 2), COORD_DECIMALS)
+    key = (a.shape[0], a.tobytes(), b.tobytes())
+    m = distance_cache.get(key)
+    if m is None:
+        m = haversine_many(a[:, 0, None], a[:, 1, None], b[None, :, 0], b[None, :, 1])
+        m.flags.writeable = False
+        distance_cache.put(key, m)
+    return m
+
+@timed("send_email")
 def send_email(subject, to_email, body):
-    if not (Config.GMAIL_USER and Config.GMAIL_PASS):
+    """Queue a message on the outbox; delivery happens on a background worker."""
+    if not Config.MAIL_FROM:
         return False, "Email not configured"
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = Config.GMAIL_USER
-    msg["To"] = to_email
-    msg.set_content(body)
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-            smtp.login(Config.GMAIL_USER, Config.GMAIL_PASS)
-            smtp.send_message(msg)
-        return True, "sent"
-    except Exception as e:
-        return False, str(e)
+    outbox.enqueue(subject, to_email, body)
+    return True, "queued"
@@ -1,42 +1,146 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response
+from sqlalchemy import select, func, update, union_all, literal, and_, or_, String, Integer
+from sqlalchemy.orm import joinedload
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from config import Config
-from models import init_db, SessionLocal, User, FoodDonation, FoodRequest, Vehicle, Match
+from models import (init_db, engine, SessionLocal, User, FoodDonation, FoodRequest, Vehicle, Match,
+                    ArchivedDonation, ArchivedRequest)
+import metrics
+import events
 
 # Agents
 from agents.data_ingestion import DataIngestionAgent
 from agents.matching import MatchingAgent
 from agents.logistics import LogisticsAgent
+from agents.fleet import FleetAgent, ACTIVE_STATUSES
 from agents.monitoring import MonitoringAgent
+from agents.bulk_import import BulkImporter, KINDS as IMPORT_KINDS, format_for
+from agents.scheduler import MatchingScheduler
+from agents.consolidation import ConsolidationAgent, CLOSED_LINES, release_line, settle_delivered
+from agents import archive, rollups
+from user_cache import UserCache, invalidate_on_update, instrument_cache
 
+import io
 import json
+import logging
+import os
+import secrets
+import threading
+import time
+import click
 
+log = logging.getLogger(__name__)
+
+# Routes register on this module-level app; create_app() configures it.
 app = Flask(__name__)
-app.config["SECRET_KEY"] = Config.SECRET_KEY
 
-# AI Agents
+# AI Agents: cheap to build. DB connections and background threads start
+# lazily in each process, so this module is safe to import before fork.
 ingestion_agent = DataIngestionAgent()
 matching_agent = MatchingAgent()
+consolidation_agent = ConsolidationAgent()
 logistics_agent = LogisticsAgent()
+fleet_agent = FleetAgent()
 monitoring_agent = MonitoringAgent()
-
-# Initialize DB & seed vehicles
-init_db()
-with SessionLocal() as db:
-    if db.query(Vehicle).count() == 0:
-        db.add_all([
-            Vehicle(name="Van-1", capacity_meals=80, base_lat=15.8528, base_lon=74.4987),
-            Vehicle(name="Bike-1", capacity_meals=30, base_lat=15.8528, base_lon=74.4987),
-        ])
-        db.commit()
+matching_scheduler = MatchingScheduler(SessionLocal)
+user_cache = UserCache(ingestion_agent.locate)
+invalidate_on_update(user_cache)
+instrument_cache(user_cache)
+
+
+# ------------- APP FACTORY ----------
+def create_app():
+    """Configure the app. No database access; see warmup() and the CLI."""
+    if "surplus" not in app.extensions:
+        app.config["SECRET_KEY"] = Config.SECRET_KEY
+        metrics.init_app(app, engine)
+        app.before_request(_ensure_warm)
+        app.extensions["surplus"] = True
+    return app
+
+
+_warm_pid = None
+_warm_lock = threading.Lock()
+
+
+def warmup():
+    """Per-process start-up, run after fork and before taking traffic.
+
+    The production server calls this from its post_fork hook; otherwise the
+    first request of each process runs it.
+    """
+    global _warm_pid
+    with _warm_lock:
+        if _warm_pid == os.getpid():
+            return
+        t = time.perf_counter()
+        # connections inherited from a parent process must not be reused here
+        engine.dispose(close=False)
+        with SessionLocal() as db:
+            # load open rows into the matching agent's spatial index
+            matching_agent.sync(
+                db.query(FoodDonation).filter(FoodDonation.status=="open").all(),
+                db.query(FoodRequest).filter(FoodRequest.status=="open").all(),
+            )
+        for name in ("base.html", "index.html", "portal.html", "dashboard.html"):
+            app.jinja_env.get_template(name)
+        if Config.SCHEDULER_ENABLED:
+            matching_scheduler.start()
+        _warm_pid = os.getpid()
+        elapsed = time.perf_counter() - t
+        metrics.AGENT_SECONDS.observe(elapsed, "app.warmup")
+        log.info("Process %d warmed up in %.0f ms", _warm_pid, elapsed * 1000)
+
+
+def _ensure_warm():
+    if _warm_pid != os.getpid():
+        warmup()
+
+
+def seed_vehicles(db):
+    """Demo fleet for an empty database; returns how many vehicles were added."""
+    if db.query(Vehicle).count():
+        return 0
+    db.add_all([
+        Vehicle(name="Van-1", capacity_meals=80, base_lat=15.8528, base_lon=74.4987),
+        Vehicle(name="Bike-1", capacity_meals=30, base_lat=15.8528, base_lon=74.4987),
+    ])
+    db.commit()
+    return 2
+
+
+@app.cli.command("init-db")
+@click.option("--seed/--no-seed", default=True, help="Add the demo vehicles to an empty fleet.")
+def init_db_command(seed):
+    """Create tables, apply migrations and seed the demo fleet."""
+    init_db()
+    click.echo("Schema is up to date.")
+    if seed:
+        with SessionLocal() as db:
+            click.echo(f"Seeded {seed_vehicles(db)} vehicles.")
 
 
 # ------------- SESSION USER ----------
-def current_user(db):
-    if "user_email" not in session:
+def current_user(db=None):
+    """The logged-in user's SessionUser, or None.
+
+    Served from user_cache when possible; only a miss reads the users table,
+    through `db` if given or a short-lived session otherwise.
+    """
+    email = session.get("user_email")
+    if email is None:
         return None
-    return db.get(User, session["user_email"])
+    version = session.get("user_ver", "")
+    user = user_cache.get(email, version)
+    if user is not None:
+        return user
+    if db is None:
+        with SessionLocal() as db:
+            row = db.get(User, email)
+    else:
+        row = db.get(User, email)
+    return user_cache.put(row, version) if row is not None else None
 
 
 # ------------- ROUTES --------------
@@ -67,32 +171,6 @@ def register():
         pincode = request.form["pincode"].strip()
         address_line = request.form["address"].strip()
 
-        # ✅ Allowed taluks in Belagavi district
-        belagavi_taluks = {
-            "Belagavi", "Gokak", "Khanapur", "Ramdurg", "Saundatti",
-            "Bailhongal", "Athani", "Chikkodi", "Raibag", "Hukkeri"
-        }
-
-        if taluk not in belagavi_taluks:
-            flash("Only Belagavi district taluks are allowed.")
-            return redirect(url_for("register"))
-
-        # ✅ Taluk → Coordinates
-        taluk_coordinates = {
-            "Belagavi": (15.8497, 74.4977),
-            "Gokak": (16.1691, 74.5146),
-            "Khanapur": (15.6390, 74.5089),
-            "Ramdurg": (15.9481, 75.2980),
-            "Saundatti": (15.7525, 75.1177),
-            "Bailhongal": (15.8222, 74.8580),
-            "Athani": (16.7260, 75.0648),
-            "Chikkodi": (16.4296, 74.6009),
-            "Raibag": (16.4918, 74.7845),
-            "Hukkeri": (16.2300, 74.6000)
-        }
-
-        lat, lon = taluk_coordinates[taluk]
-
         # ✅ AI agent validation
         res = ingestion_agent.validate_user_address({
             "district": district,
@@ -146,8 +224,10 @@ def login():
                 flash("Invalid email or password.")
                 return redirect(url_for("login"))
 
-            # ✅ Store correct session key
+            # ✅ Store correct session key; a new version starts a fresh cache entry
             session["user_email"] = user.email
+            session["user_ver"] = secrets.token_hex(4)
+            user_cache.put(user, session["user_ver"])
 
         return redirect(url_for("portal"))
 
@@ -181,7 +261,9 @@ def admin_login():
 # ---------- LOGOUT ----------
 @app.route("/logout")
 def logout():
-    session.pop("user_email", None)
+    email = session.pop("user_email", None)
+    if email is not None:
+        user_cache.discard(email, session.pop("user_ver", ""))
     flash("Logged out.")
     return redirect(url_for("index"))
 
@@ -192,58 +274,188 @@ def admin_logout():
     return redirect(url_for("index"))
 
 # ---------- PORTAL ----------
+ACTIVITY_KINDS = ("request", "donation")   # tie-break order within one created_at
+# hot table and archive per kind; a row lives in exactly one of them
+ACTIVITY_SOURCES = {
+    "donation": (FoodDonation, ArchivedDonation),
+    "request": (FoodRequest, ArchivedRequest),
+}
+
+
+def _activity_branch(kind, t, email, cursor, limit):
+    """One owner's donations or requests from table `t`, newest first, after `cursor`."""
+    if kind == "donation":
+        stmt = select(literal(kind, String(10)).label("kind"), t.id, t.created_at, t.status,
+                      t.title.label("title"), literal(None, Integer).label("need_meals"))
+        stmt = stmt.where(t.donor_email==email)
+    else:
+        stmt = select(literal(kind, String(10)).label("kind"), t.id, t.created_at, t.status,
+                      literal(None, String(200)).label("title"), t.need_meals.label("need_meals"))
+        stmt = stmt.where(t.recipient_email==email)
+    if cursor is not None:
+        ts, c_kind, c_id = cursor
+        # rows sort by (created_at, kind, id) descending
+        if ACTIVITY_KINDS.index(kind) < ACTIVITY_KINDS.index(c_kind):
+            stmt = stmt.where(t.created_at <= ts)
+        elif kind == c_kind:
+            stmt = stmt.where(or_(t.created_at < ts, and_(t.created_at == ts, t.id < c_id)))
+        else:
+            stmt = stmt.where(t.created_at < ts)
+    # each branch walks its (owner, created_at) index and stops after `limit` rows
+    return select(stmt.order_by(t.created_at.desc(), t.id.desc()).limit(limit).subquery())
+
+
+def encode_cursor(row):
+    return f"{row['created_at'].isoformat()}_{row['kind']}_{row['id']}"
+
+
+def decode_cursor(value):
+    try:
+        ts, kind, id_ = value.split("_")
+        if kind not in ACTIVITY_KINDS:
+            raise ValueError(kind)
+        return datetime.fromisoformat(ts), kind, int(id_)
+    except ValueError:
+        raise ValueError("malformed cursor")
+
+
+def activity_page(db, email, before=None, limit=None):
+    """A page of the user's donations and requests, newest first, in one UNION query.
+
+    Archived rows are included, so the history survives archival.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    limit = limit or Config.ACTIVITY_PAGE_SIZE
+    cursor = decode_cursor(before) if before else None
+    feed = union_all(*(
+        _activity_branch(k, t, email, cursor, limit + 1)
+        for k in ACTIVITY_KINDS for t in ACTIVITY_SOURCES[k]
+    )).subquery()
+    kind_rank = (feed.c.kind == ACTIVITY_KINDS[1])
+    rows = db.execute(
+        select(feed).order_by(feed.c.created_at.desc(), kind_rank.desc(), feed.c.id.desc()).limit(limit + 1)
+    ).mappings().all()
+    rows = [dict(r) for r in rows]
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def activity_counts(db, email):
+    """{"donation": {status: n}, "request": {status: n}} for one user, counted in SQL."""
+    owner = {"donation": "donor_email", "request": "recipient_email"}
+    stmt = union_all(*(
+        select(literal(kind, String(10)).label("kind"), t.status, func.count())
+            .where(getattr(t, owner[kind])==email).group_by(t.status)
+        for kind in ACTIVITY_KINDS for t in ACTIVITY_SOURCES[kind]
+    ))
+    counts = {k: {} for k in ACTIVITY_KINDS}
+    for kind, status, n in db.execute(stmt):
+        counts[kind][status] = counts[kind].get(status, 0) + n
+    return counts
+
+
+def activity_item(row):
+    item = {"kind": row["kind"], "id": row["id"], "status": row["status"],
+            "created_at": row["created_at"].isoformat() if row["created_at"] else None}
+    if row["kind"] == "donation":
+        item["title"] = row["title"]
+    else:
+        item["need_meals"] = row["need_meals"]
+    return item
+
+
 @app.route("/portal")
 def portal():
-    with SessionLocal() as db:
-        user = current_user(db)
-        if not user:
-            flash("Please login.")
-            return redirect(url_for("login"))
-
-        # Build activity list
-        activity = []
-        for d in user.donations:
-            activity.append({"type": "Donation", "details": d.title, "status": d.status})
-        for r in user.requests:
-            activity.append({"type": "Request", "details": f"{r.need_meals} meals", "status": r.status})
+    user = current_user()
+    if not user:
+        flash("Please login.")
+        return redirect(url_for("login"))
 
-        return render_template("portal.html", user=user, activity=activity)
+    with SessionLocal() as db:
+        activity, next_cursor = activity_page(db, user.email)
+        counts = activity_counts(db, user.email)
+    return render_template("portal.html", user=user, activity=activity,
+                           next_cursor=next_cursor, counts=counts)
+
+
+@app.route("/api/activity")
+def api_activity():
+    user = current_user()
+    if not user:
+        return jsonify(error="Login required."), 401
+    limit = max(1, min(request.args.get("limit", Config.ACTIVITY_PAGE_SIZE, type=int), 200))
+    try:
+        with SessionLocal() as db:
+            rows, next_cursor = activity_page(db, user.email, request.args.get("before"), limit)
+            counts = None if request.args.get("before") else activity_counts(db, user.email)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    data = dict(items=[activity_item(r) for r in rows], next=next_cursor)
+    if counts is not None:
+        data["counts"] = counts
+    return jsonify(data)
+
+
+# (model, payload, owner column); matches are admin-only
+RECORD_KINDS = {
+    "donations": (FoodDonation, events.donation_row, "donor_email"),
+    "requests": (FoodRequest, events.request_row, "recipient_email"),
+    "matches": (Match, events.match_row, None),
+}
+
+
+@app.route("/api/<kind>/<int:row_id>")
+def api_record(kind, row_id):
+    """One donation, request or match by id, whether still live or archived."""
+    if kind not in RECORD_KINDS:
+        return jsonify(error=f"Unknown record kind: {kind}"), 404
+    model, payload, owner = RECORD_KINDS[kind]
+    admin = "admin" in session
+    user = None if admin else current_user()
+    if not admin and user is None:
+        return jsonify(error="Login required."), 401
+    if not admin and owner is None:
+        return jsonify(error="Admin access only."), 403
+    with SessionLocal() as db:
+        row = archive.get(db, model, row_id)
+        if row is None or (not admin and getattr(row, owner) != user.email):
+            return jsonify(error="Not found."), 404
+        return jsonify(dict(payload(row), archived=archive.is_archived(row)))
 
 
 
 # ✅ ✅ ✅ ADD DONATE-PAGE (GET)
 @app.route("/donate-page")
 def donate_page():
-    with SessionLocal() as db:
-        u = current_user(db)
-        if not u or u.role != "donor":
-            flash("Only donors can donate.")
-            return redirect(url_for("portal"))
-        return render_template("donate-page.html", user=u)
+    u = current_user()
+    if not u or u.role != "donor":
+        flash("Only donors can donate.")
+        return redirect(url_for("portal"))
+    return render_template("donate-page.html", user=u)
 
 
 
 # ✅ ✅ ✅ ADD REQUEST-PAGE (GET)
 @app.route("/request-page")
 def request_page():
-    with SessionLocal() as db:
-        u = current_user(db)
-        if not u or u.role != "recipient":
-            flash("Only recipients can request food.")
-            return redirect(url_for("portal"))
-        return render_template("request-page.html", user=u)
+    u = current_user()
+    if not u or u.role != "recipient":
+        flash("Only recipients can request food.")
+        return redirect(url_for("portal"))
+    return render_template("request-page.html", user=u)
 
 
 
 # ---------- DONATE (POST ONLY) ----------
 @app.post("/donate")
 def donate():
-    with SessionLocal() as db:
-        user = current_user(db)
-        if not user or user.role != "donor":
-            flash("Only donors can donate.")
-            return redirect(url_for("portal"))
+    user = current_user()
+    if not user or user.role != "donor":
+        flash("Only donors can donate.")
+        return redirect(url_for("portal"))
 
+    with SessionLocal() as db:
         donation = FoodDonation(
             donor_email=user.email,
             title=request.form["title"],
@@ -254,12 +466,16 @@ def donate():
             expire_by=datetime.fromisoformat(request.form["expire_by"]),
             address=user.address,
             pincode=user.pincode,
-            lat=15.8497,
-            lon=74.4977,
+            lat=user.lat,
+            lon=user.lon,
         )
 
         db.add(donation)
         db.commit()
+        matching_agent.track_donation(donation)
+        matching_scheduler.notify_donation(donation)
+        events.publish_donation(donation)
+        events.publish_counts(db)
 
     flash("Donation posted.")
     return redirect(url_for("portal"))
@@ -268,12 +484,12 @@ def donate():
 # ---------- REQUEST FOOD (POST ONLY) ----------
 @app.post("/request-food")
 def request_food():
-    with SessionLocal() as db:
-        user = current_user(db)
-        if not user or user.role != "recipient":
-            flash("Only recipients can request.")
-            return redirect(url_for("portal"))
+    user = current_user()
+    if not user or user.role != "recipient":
+        flash("Only recipients can request.")
+        return redirect(url_for("portal"))
 
+    with SessionLocal() as db:
         req = FoodRequest(
             recipient_email=user.email,
             need_meals=int(request.form["need_meals"]),
@@ -282,106 +498,499 @@ def request_food():
             latest=datetime.fromisoformat(request.form["latest"]),
             address=user.address,
             pincode=user.pincode,
-            lat=15.8570,
-            lon=74.5060,
+            lat=user.lat,
+            lon=user.lon,
         )
 
         db.add(req)
         db.commit()
+        matching_agent.track_request(req)
+        matching_scheduler.notify_request(req)
+        events.publish_request(req)
+        events.publish_counts(db)
 
     flash("Request submitted.")
     return redirect(url_for("portal"))
 
 
+# ---------- BULK IMPORT (PARTNER FEEDS) ----------
+@app.post("/import/<kind>")
+def bulk_import(kind):
+    if "admin" not in session:
+        return jsonify(error="Admin access only."), 403
+    if kind not in IMPORT_KINDS:
+        return jsonify(error=f"Unknown import kind: {kind}"), 404
+
+    upload = request.files.get("file")
+    if not upload:
+        return jsonify(error="Attach the feed as a 'file' upload."), 400
+    try:
+        fmt = format_for(upload.filename)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    # werkzeug spools large uploads to disk; read it back line by line
+    stream = io.TextIOWrapper(upload.stream, encoding="utf-8", newline="")
+    report = BulkImporter(ingestion_agent).run_stream(kind, stream, fmt)
+    if report.inserted:
+        matching_scheduler.request_resync()
+        with SessionLocal() as db:
+            events.publish_counts(db)
+    return jsonify(report.to_dict())
+
+
 # ---------- ADMIN DASHBOARD ----------
+def keyset_page(query, col, cursor=None, descending=False, limit=None):
+    """One page of `query` ordered by `col`, starting after `cursor`.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    limit = limit or Config.DASHBOARD_PAGE_SIZE
+    if cursor is not None:
+        query = query.filter(col < cursor if descending else col > cursor)
+    rows = query.order_by(col.desc() if descending else col).limit(limit + 1).all()
+    next_cursor = getattr(rows[limit - 1], col.key) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def dashboard_data(db, args):
+    counts = events.dashboard_counts(db)
+
+    donations, d_next = keyset_page(
+        db.query(FoodDonation).filter(FoodDonation.status=="open"),
+        FoodDonation.id, args.get("d_after", type=int))
+    requests, r_next = keyset_page(
+        db.query(FoodRequest).filter(FoodRequest.status=="open"),
+        FoodRequest.id, args.get("r_after", type=int))
+    matches, m_next = keyset_page(
+        db.query(Match).options(joinedload(Match.vehicle)),
+        Match.id, args.get("m_before", type=int), descending=True)
+    vehicles = db.query(Vehicle).filter(Vehicle.is_available==True).all()
+
+    # scheduler suggestions; drop any whose rows were matched since its last pass
+    proposals = matching_scheduler.proposals[:Config.DASHBOARD_PAGE_SIZE]
+    if proposals:
+        open_d = set(db.scalars(select(FoodDonation.id).where(
+            FoodDonation.id.in_({p[0] for p in proposals}), FoodDonation.status=="open")))
+        open_r = set(db.scalars(select(FoodRequest.id).where(
+            FoodRequest.id.in_({p[1] for p in proposals}), FoodRequest.status=="open")))
+        proposals = [p for p in proposals if p[0] in open_d and p[1] in open_r]
+
+    return dict(
+        counts=counts,
+        donations=donations, requests=requests, matches=matches, vehicles=vehicles,
+        proposals=proposals,
+        cursors={"d_after": d_next, "r_after": r_next, "m_before": m_next},
+    )
+
+
 @app.route("/dashboard")
 def dashboard():
     if "admin" not in session:
         flash("Admin access only.")
-        return redirect(url_for("admin-login"))
+        return redirect(url_for("admin_login"))
+
+    with SessionLocal() as db:
+        return render_template("dashboard.html", **dashboard_data(db, request.args))
+
+
+@app.route("/api/dashboard")
+def api_dashboard():
+    if "admin" not in session:
+        return jsonify(error="Admin access only."), 403
 
     with SessionLocal() as db:
-        donations = db.query(FoodDonation).filter(FoodDonation.status=="open").all()
-        requests = db.query(FoodRequest).filter(FoodRequest.status=="open").all()
-        matches = db.query(Match).all()
-        vehicles = db.query(Vehicle).filter(Vehicle.is_available==True).all()
+        data = dashboard_data(db, request.args)
+        return jsonify(
+            counts=data["counts"],
+            cursors=data["cursors"],
+            donations=[events.donation_row(d) for d in data["donations"]],
+            requests=[events.request_row(r) for r in data["requests"]],
+            matches=[events.match_row(m) for m in data["matches"]],
+            vehicles=[{
+                "id": v.id, "name": v.name, "capacity_meals": v.capacity_meals,
+                "load_meals": v.load_meals,
+                "busy_until": v.busy_until.isoformat() if v.busy_until else None,
+            } for v in data["vehicles"]],
+            proposals=[{
+                "donation_id": d_id, "request_id": r_id, "score": score,
+            } for d_id, r_id, score in data["proposals"]],
+        )
+
 
-        return render_template("dashboard.html",
-            donations=donations, requests=requests, matches=matches, vehicles=vehicles)
+# ---------- LIVE UPDATES ----------
+@app.route("/events")
+def events_stream():
+    admin = "admin" in session
+    email = session.get("user_email")
+    if not admin and not email:
+        return jsonify(error="Login required."), 401
+    # each stream pins a server thread; keep the rest for ordinary requests
+    sub = events.bus.subscribe(admin=admin, email=email, limit=Config.SSE_MAX_STREAMS)
+    if sub is None:
+        return jsonify(error="Too many live connections; try again later."), 503, {"Retry-After": "30"}
+    resp = Response(
+        events.bus.stream(sub),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # the stream's own cleanup never runs if it is closed before the first frame
+    resp.call_on_close(lambda: events.bus.unsubscribe(sub))
+    return resp
+
+
+def publish_match_change(m):
+    """Push a changed match and its donation/request to open pages."""
+    events.publish_match(m)
+    events.publish_donation(m.donation)
+    events.publish_request(m.request)
+
+
+def done(message, status=200):
+    """Finish a dashboard action.
+
+    The live dashboard posts with fetch() and an X-Live header, then waits for
+    the /events patch; plain form posts get the usual flash and redirect.
+    """
+    if request.headers.get("X-Live") == "1":
+        return jsonify(message=message), status
+    flash(message)
+    return redirect(url_for("dashboard"))
 
 
 # ---------- MATCH ----------
+def allocate(d, r, meals=None):
+    """Book `meals` (default: all that fit) from donation `d` to request `r`."""
+    if meals is None:
+        meals = max(0, min(d.remaining_meals, r.remaining_meals))
+    d.allocated_meals = (d.allocated_meals or 0) + meals
+    r.allocated_meals = (r.allocated_meals or 0) + meals
+    return meals
+
+
+def close_filled(*rows):
+    """Rows with nothing left to give or receive are matched; the rest stay open."""
+    for row in rows:
+        if row.remaining_meals <= 0:
+            row.status = "matched"
+
+
+def announce_allocated(donations, requests):
+    """Hand rows that just had meals allocated back to the matchers (after commit).
+
+    Matched rows leave the open indexes; rows still open are re-announced so
+    the scheduler scores them on the meals they have left.
+    """
+    closed_d = [d.id for d in donations if d.status == "matched"]
+    closed_r = [r.id for r in requests if r.status == "matched"]
+    for i in closed_d:
+        matching_agent.untrack_donation(i)
+    for i in closed_r:
+        matching_agent.untrack_request(i)
+    matching_scheduler.notify_closed(closed_d, closed_r)
+    for d in donations:
+        if d.status == "open":
+            matching_scheduler.notify_donation(d)
+    for r in requests:
+        if r.status == "open":
+            matching_scheduler.notify_request(r)
+
+
 @app.post("/match/<int:donation_id>")
 def create_match(donation_id):
-    req_id = int(request.form["request_id"])
+    try:
+        req_id = int(request.form["request_id"])
+    except (KeyError, ValueError):
+        return done("Enter a request number.")
     with SessionLocal() as db:
-        d = db.get(FoodDonation, donation_id)
-        r = db.get(FoodRequest, req_id)
+        # the request id is typed in, so check both rows under lock
+        d = db.get(FoodDonation, donation_id, with_for_update=True)
+        r = db.get(FoodRequest, req_id, with_for_update=True)
+        if d is None or d.status != "open":
+            return done(f"Donation #{donation_id} is not open.")
+        if r is None or r.status != "open":
+            return done(f"Request #{req_id} is not open.")
 
         score_info = matching_agent.score(d, r)
+        meals = allocate(d, r)
 
         match = Match(
             donation_id=d.id,
             request_id=r.id,
             score=score_info.score,
+            meals=meals,
             status="planned"
         )
-
-        d.status = "matched"
-        r.status = "matched"
+        # a 50-meal donation for a 30-meal request keeps 20 meals to give
+        close_filled(d, r)
 
         db.add(match)
         db.commit()
+        announce_allocated([d], [r])
+        publish_match_change(match)
+        events.publish_counts(db)
 
-    flash("Match created.")
-    return redirect(url_for("dashboard"))
+    return done("Match created.")
+
+
+# ---------- AUTO MATCH ----------
+@app.post("/match/auto")
+def auto_match():
+    if "admin" not in session:
+        flash("Admin access only.")
+        return redirect(url_for("admin_login"))
+
+    with SessionLocal() as db:
+        # lock the open rows so two admins can't pair the same donation twice;
+        # rows past their deadline are left for the expiry sweeper
+        now = datetime.now()
+        donations = (db.query(FoodDonation)
+                     .filter(FoodDonation.status=="open", FoodDonation.expire_by > now)
+                     .with_for_update().all())
+        requests = (db.query(FoodRequest)
+                    .filter(FoodRequest.status=="open", FoodRequest.latest > now)
+                    .with_for_update().all())
+
+        pairs = matching_agent.match_all(donations, requests, now=now)
+
+        created = []
+        for d, r, score_info in pairs:
+            created.append(Match(
+                donation_id=d.id,
+                request_id=r.id,
+                score=score_info.score,
+                meals=allocate(d, r),
+                status="planned",
+            ))
+            close_filled(d, r)
+
+        # one transaction for the whole pass
+        db.add_all(created)
+        db.commit()
+        announce_allocated([d for d, _, _ in pairs], [r for _, r, _ in pairs])
+        for m in created:
+            publish_match_change(m)
+        events.publish_counts(db)
+
+    return done(f"Auto-match created {len(pairs)} matches.")
+
+
+# ---------- CONSOLIDATE ----------
+@app.post("/match/consolidate")
+def consolidate():
+    """Split and merge meals across open rows: one match line per (donation, request)."""
+    if "admin" not in session:
+        flash("Admin access only.")
+        return redirect(url_for("admin_login"))
+
+    with SessionLocal() as db:
+        now = datetime.now()
+        donations = (db.query(FoodDonation)
+                     .filter(FoodDonation.status=="open", FoodDonation.expire_by > now)
+                     .with_for_update().all())
+        requests = (db.query(FoodRequest)
+                    .filter(FoodRequest.status=="open", FoodRequest.latest > now)
+                    .with_for_update().all())
+
+        allocations = consolidation_agent.plan(donations, requests, now=now)
+
+        created = []
+        for a in allocations:
+            created.append(Match(
+                donation_id=a.donation.id,
+                request_id=a.request.id,
+                score=matching_agent.score(a.donation, a.request, now).score,
+                meals=allocate(a.donation, a.request, a.meals),
+                status="planned",
+            ))
+        touched_d = {a.donation.id: a.donation for a in allocations}
+        touched_r = {a.request.id: a.request for a in allocations}
+        close_filled(*touched_d.values(), *touched_r.values())
+
+        db.add_all(created)
+        db.commit()
+        announce_allocated(touched_d.values(), touched_r.values())
+        for m in created:
+            publish_match_change(m)
+        events.publish_counts(db)
+
+    meals = sum(a.meals for a in allocations)
+    return done(f"Consolidation allocated {meals} meals in {len(created)} match lines.")
 
 
 # ---------- ASSIGN VEHICLE ----------
 @app.post("/assign/<int:match_id>")
 def assign_vehicle(match_id):
-    vehicle_id = int(request.form["vehicle_id"])
+    try:
+        vehicle_id = ("auto" if request.form.get("vehicle_id") in (None, "", "auto")
+                      else item_id(request.form, "vehicle_id"))
+    except ValueError as e:
+        return done(f"Cannot assign: {e}.", 400)
     with SessionLocal() as db:
-        m = db.get(Match, match_id)
-        v = db.get(Vehicle, vehicle_id)
+        m = db.get(Match, match_id, with_for_update=True)
+        if m is None:
+            return done(f"No such match #{match_id}.", 404)
+        # a delivered or cancelled line has no load left to carry
+        if m.status not in ("planned", "assigned"):
+            return done(f"Cannot assign: match #{m.id} is {m.status}.")
+        if vehicle_id == "auto":
+            v = fleet_agent.best_vehicle(db, m)
+            if v is None:
+                return done("No vehicle has room for this match before the food expires.")
+        else:
+            v = db.get(Vehicle, vehicle_id, with_for_update=True)
+            if v is None:
+                return done(f"No such vehicle #{vehicle_id}.", 404)
+            if m.vehicle_id != v.id and not fleet_agent.fits(v, m):
+                return done(f"{v.name} has room for only {v.capacity_meals - v.load_meals} more meals.")
 
         d = m.donation
         r = m.request
 
+        # the route starts wherever the vehicle's current route ends
+        start_lat, start_lon = fleet_agent.position(v)
         route = logistics_agent.nearest_neighbor(
-            v.base_lat, v.base_lon, [
+            start_lat, start_lon, [
                 (d.lat, d.lon),
                 (r.lat, r.lon)
             ]
         )
 
-        m.vehicle_id = v.id
+        fleet_agent.assign(db, v, m)
         m.route_json = json.dumps({"order": route.order, "km": route.total_km})
         m.status = "assigned"
 
         db.commit()
+        events.publish_match(m)
+        events.publish_counts(db)
+
+    return done("Vehicle assigned.")
 
-    flash("Vehicle assigned.")
-    return redirect(url_for("dashboard"))
+
+@app.route("/api/matches/<int:match_id>/vehicles")
+def api_match_vehicles(match_id):
+    if "admin" not in session:
+        return jsonify(error="Admin access only."), 403
+
+    with SessionLocal() as db:
+        m = db.get(Match, match_id)
+        if m is None:
+            return jsonify(error="No such match."), 404
+        options = fleet_agent.rank_vehicles(db.query(Vehicle).all(), m)
+        return jsonify(vehicles=[{
+            "vehicle_id": o.vehicle_id, "name": o.name, "detour_km": round(o.detour_km, 2),
+            "spare_meals": o.spare_meals, "pickup_eta": o.pickup_eta.isoformat(timespec="minutes"),
+        } for o in options])
+
+
+# ---------- AUTO ASSIGN (FLEET ROUTING) ----------
+@app.post("/assign/auto")
+def auto_assign():
+    if "admin" not in session:
+        flash("Admin access only.")
+        return redirect(url_for("admin_login"))
+
+    with SessionLocal() as db:
+        # full vehicles too: re-planning may move their matches elsewhere
+        vehicles = db.query(Vehicle).with_for_update().all()
+        matches = (db.query(Match)
+                   .filter(Match.status.in_(("planned", "assigned")))
+                   .with_for_update().all())
+
+        # start every route from what the vehicle is already committed to
+        # (enroute matches), not from an empty vehicle at its base
+        for m in matches:
+            m.vehicle_id = None
+        fleet_agent.refresh(db, vehicles)
+        plan = logistics_agent.plan_fleet(vehicles, matches)
+
+        by_id = {m.id: m for m in matches}
+        for route in plan.routes.values():
+            route_json = route.to_json()
+            for match_id in {s.match_id for s in route.stops}:
+                m = by_id[match_id]
+                m.vehicle_id = route.vehicle_id
+                m.route_json = route_json
+                m.status = "assigned"
+        # matches that no longer fit any route go back to the planning pool
+        for match_id in plan.unassigned:
+            m = by_id[match_id]
+            m.vehicle_id = None
+            m.route_json = None
+            m.status = "planned"
+        fleet_agent.refresh(db, vehicles)
+
+        db.commit()
+        for m in matches:
+            events.publish_match(m)
+        events.publish_counts(db)
+
+    msg = f"Planned {len(plan.routes)} vehicle routes for {len(matches) - len(plan.unassigned)} matches."
+    if plan.unassigned:
+        msg += f" {len(plan.unassigned)} matches could not be routed."
+    return done(msg)
 
 
 # ---------- UPDATE MATCH STATUS ----------
+MATCH_STATUSES = ("assigned", "enroute", "delivered", "cancelled")
+
+
+def status_error(m, new_status):
+    """Why `m` can't move to `new_status`, or None."""
+    # closed lines are final: their load and meals are already released
+    if m.status in CLOSED_LINES and new_status != m.status:
+        return f"match #{m.id} is already {m.status}"
+    return None
+
+
+def reopen(donations, requests):
+    """Hand rows a cancelled line reopened back to the matchers (after commit)."""
+    for d in donations:
+        matching_agent.track_donation(d)
+        matching_scheduler.notify_donation(d)
+    for r in requests:
+        matching_agent.track_request(r)
+        matching_scheduler.notify_request(r)
+
+
 @app.post("/status/<int:match_id>")
 def update_status(match_id):
-    new_status = request.form["status"]
+    new_status = request.form.get("status")
+    if new_status not in MATCH_STATUSES:
+        return done(f"Status must be one of {', '.join(MATCH_STATUSES)}.")
     with SessionLocal() as db:
         m = db.get(Match, match_id)
-
+        if m is None:
+            return done(f"No such match #{match_id}.")
+        error = status_error(m, new_status)
+        if error:
+            return done(f"Cannot update: {error}.")
+        # rollups count a match once, on its first delivery
+        first_delivery = m.status != "delivered" and m.delivered_at is None
+
+        # a match leaving the road frees its vehicle, however it leaves
+        if m.status in ACTIVE_STATUSES and new_status not in ACTIVE_STATUSES:
+            fleet_agent.deliver(db, m)
+        # a cancelled line gives its meals back
+        reopened = ([], [])
+        if new_status == "cancelled" and m.status != "cancelled":
+            reopened = release_line(m)
         m.status = new_status
 
-        if new_status == "delivered":
-            m.donation.status = "delivered"
-            m.request.status = "fulfilled"
+        if new_status == "delivered" and first_delivery:
+            m.delivered_at = datetime.utcnow()
+            rollups.record_deliveries(db, [m], m.delivered_at)
+        if new_status in CLOSED_LINES:
+            # a split donation or merged request closes with its last line
+            db.flush()
+            settle_delivered(db, [m.donation_id], [m.request_id])
 
         db.commit()
+        reopen(*reopened)
+        publish_match_change(m)
+        events.publish_counts(db)
 
-    flash("Status updated.")
-    return redirect(url_for("dashboard"))
+    return done("Status updated.")
 
 @app.post("/delete/<int:match_id>")
 def delete_match(match_id):
@@ -389,15 +998,301 @@ def delete_match(match_id):
         m = db.get(Match, match_id)
 
         if m.status != "delivered":
-            flash("You can delete only delivered records.")
-            return redirect(url_for("dashboard"))
+            return done("You can delete only delivered records.")
 
+        # keep the rollups equal to what a rebuild from the remaining matches gives
+        rollups.forget_deliveries(db, [m])
         db.delete(m)
         db.commit()
+        events.publish_deleted_match(match_id)
+        events.publish_counts(db)
+
+    return done("Record deleted successfully.")
+
+# ---------- BATCH OPERATIONS ----------
+def batch_items(fields, shared=(), joined=None):
+    """Items for a batch endpoint: JSON {"items": [{...}, ...]} or form lists.
+
+    Dashboard multi-select forms send one value per checked row for each of
+    `fields` and a single value for each of `shared`; a checkbox named
+    `joined` may instead carry all of `fields` as "a:b".
+    """
+    if request.is_json:
+        items = (request.get_json(silent=True) or {}).get("items")
+        if not isinstance(items, list) or not all(isinstance(i, dict) for i in items):
+            raise ValueError('Expected {"items": [{...}, ...]}.')
+    elif joined and request.form.getlist(joined):
+        items = [dict(zip(fields, v.split(":"))) for v in request.form.getlist(joined)]
+    else:
+        columns = [request.form.getlist(f) for f in fields]
+        common = {f: request.form.get(f) for f in shared}
+        items = [dict(zip(fields, values), **common) for values in zip(*columns)]
+    if not items:
+        raise ValueError("Nothing selected.")
+    if len(items) > Config.BATCH_MAX_ITEMS:
+        raise ValueError(f"At most {Config.BATCH_MAX_ITEMS} items per batch.")
+    return items
+
+
+def item_id(item, field):
+    try:
+        return int(item[field])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer")
+
+
+def batch_response(results, summary):
+    ok = sum(1 for r in results if r["ok"])
+    if request.is_json:
+        return jsonify(results=results, ok=ok, failed=len(results) - ok)
+    return done(f"{summary}: {ok} of {len(results)} done.")
+
+
+def run_batch(apply, fields, shared=(), joined=None):
+    """Admin check, parsing and error handling shared by the batch endpoints."""
+    if "admin" not in session:
+        return jsonify(error="Admin access only."), 403
+    try:
+        items = batch_items(fields, shared, joined)
+    except ValueError as e:
+        if request.is_json:
+            return jsonify(error=str(e)), 400
+        return done(str(e))
+    with SessionLocal() as db:
+        return apply(db, items)
+
+
+@app.post("/api/batch/match")
+def batch_match():
+    """Create matches for (donation_id, request_id) pairs in one transaction."""
+    def apply(db, items):
+        results, pairs = [], []
+        for item in items:
+            try:
+                pairs.append((item_id(item, "donation_id"), item_id(item, "request_id")))
+                results.append(None)
+            except ValueError as e:
+                pairs.append(None)
+                results.append({"ok": False, "error": str(e)})
+
+        d_ids = {p[0] for p in pairs if p}
+        r_ids = {p[1] for p in pairs if p}
+        donations = {d.id: d for d in db.query(FoodDonation)
+                     .filter(FoodDonation.id.in_(d_ids)).with_for_update()}
+        requests = {r.id: r for r in db.query(FoodRequest)
+                    .filter(FoodRequest.id.in_(r_ids)).with_for_update()}
+
+        # a row stays open (and usable by a later item) until its meals run out
+        created, used_d, used_r = [], {}, {}
+        for n, pair in enumerate(pairs):
+            if pair is None:
+                continue
+            d, r = donations.get(pair[0]), requests.get(pair[1])
+            if d is None or r is None:
+                error = f"no such {'donation' if d is None else 'request'}"
+            elif d.status != "open":
+                error = f"donation #{d.id} is not open"
+            elif r.status != "open":
+                error = f"request #{r.id} is not open"
+            else:
+                used_d[d.id], used_r[r.id] = d, r
+                score = matching_agent.score(d, r).score
+                created.append((n, Match(donation_id=d.id, request_id=r.id, meals=allocate(d, r),
+                                         score=score, status="planned")))
+                close_filled(d, r)
+                continue
+            results[n] = {"ok": False, "error": error}
+
+        if created:
+            # the unit of work sends the row changes as batched UPDATEs
+            db.add_all(m for _, m in created)
+            db.commit()
+        for n, m in created:
+            results[n] = {"ok": True, "match_id": m.id}
+            publish_match_change(m)
+        if created:
+            announce_allocated(used_d.values(), used_r.values())
+            events.publish_counts(db)
+        return batch_response(results, "Matched")
+
+    # suggested-match checkboxes carry "donation_id:request_id"
+    return run_batch(apply, ("donation_id", "request_id"), joined="pair")
+
+
+@app.post("/api/batch/assign")
+def batch_assign():
+    """Assign (match_id, vehicle_id) pairs in one transaction; vehicle_id may be "auto"."""
+    def apply(db, items):
+        results = [None] * len(items)
+        wanted = []
+        for n, item in enumerate(items):
+            try:
+                match_id = item_id(item, "match_id")
+                vehicle_id = "auto" if item.get("vehicle_id") in (None, "", "auto") else item_id(item, "vehicle_id")
+                wanted.append((n, match_id, vehicle_id))
+            except ValueError as e:
+                results[n] = {"ok": False, "error": str(e)}
+
+        matches = {m.id: m for m in db.query(Match)
+                   .options(joinedload(Match.donation), joinedload(Match.request))
+                   .filter(Match.id.in_({w[1] for w in wanted})).with_for_update()}
+        # every vehicle: "auto" items may pick any of them
+        vehicles = {v.id: v for v in db.query(Vehicle).with_for_update()}
+
+        assigned = []
+        for n, match_id, vehicle_id in wanted:
+            m = matches.get(match_id)
+            if m is None:
+                results[n] = {"ok": False, "error": f"no such match #{match_id}"}
+                continue
+            if m.status not in ("planned", "assigned"):
+                results[n] = {"ok": False, "error": f"match #{m.id} is {m.status}"}
+                continue
+            if vehicle_id == "auto":
+                options = fleet_agent.rank_vehicles(vehicles.values(), m)
+                v = vehicles[options[0].vehicle_id] if options else None
+                if v is None:
+                    results[n] = {"ok": False, "error": "no vehicle has room before the food expires"}
+                    continue
+            else:
+                v = vehicles.get(vehicle_id)
+                if v is None:
+                    results[n] = {"ok": False, "error": f"no such vehicle #{vehicle_id}"}
+                    continue
+                if m.vehicle_id != v.id and not fleet_agent.fits(v, m):
+                    results[n] = {"ok": False, "error": f"{v.name} has room for only {v.capacity_meals - v.load_meals} more meals"}
+                    continue
+            start_lat, start_lon = fleet_agent.position(v)
+            route = logistics_agent.nearest_neighbor(
+                start_lat, start_lon, [(m.donation.lat, m.donation.lon), (m.request.lat, m.request.lon)])
+            fleet_agent.assign(db, v, m)
+            m.route_json = json.dumps({"order": route.order, "km": route.total_km})
+            m.status = "assigned"
+            assigned.append(m)
+            results[n] = {"ok": True, "match_id": m.id, "vehicle_id": v.id}
+
+        # the unit of work sends the row changes as batched UPDATEs
+        db.commit()
+        for m in assigned:
+            events.publish_match(m)
+        if assigned:
+            events.publish_counts(db)
+        return batch_response(results, "Assigned")
+
+    return run_batch(apply, ("match_id",), ("vehicle_id",))
+
+
+@app.post("/api/batch/status")
+def batch_status():
+    """Set (match_id, status) pairs in one transaction."""
+    def apply(db, items):
+        results = [None] * len(items)
+        wanted, seen = [], set()
+        for n, item in enumerate(items):
+            try:
+                match_id = item_id(item, "match_id")
+            except ValueError as e:
+                results[n] = {"ok": False, "error": str(e)}
+                continue
+            # side effects (vehicle release, meals given back) must run once per match
+            if match_id in seen:
+                results[n] = {"ok": False, "error": f"match #{match_id} is repeated in this batch"}
+                continue
+            seen.add(match_id)
+            if item.get("status") not in MATCH_STATUSES:
+                results[n] = {"ok": False, "error": f"status must be one of {', '.join(MATCH_STATUSES)}"}
+                continue
+            wanted.append((n, match_id, item["status"]))
+
+        matches = {m.id: m for m in db.query(Match)
+                   .options(joinedload(Match.donation), joinedload(Match.request), joinedload(Match.vehicle))
+                   .filter(Match.id.in_({w[1] for w in wanted})).with_for_update()}
+
+        by_status, newly_delivered, reopened = {}, {}, ([], [])
+        for n, match_id, status in wanted:
+            m = matches.get(match_id)
+            if m is None:
+                results[n] = {"ok": False, "error": f"no such match #{match_id}"}
+                continue
+            error = status_error(m, status)
+            if error:
+                results[n] = {"ok": False, "error": error}
+                continue
+            if m.status in ACTIVE_STATUSES and status not in ACTIVE_STATUSES:
+                fleet_agent.deliver(db, m)
+            if status == "delivered" and m.status != "delivered" and m.delivered_at is None:
+                newly_delivered[m.id] = m
+            if status == "cancelled" and m.status != "cancelled":
+                for rows, more in zip(reopened, release_line(m)):
+                    rows.extend(more)
+            by_status.setdefault(status, set()).add(m.id)
+            results[n] = {"ok": True, "match_id": m.id, "status": status}
+
+        # one UPDATE per target status, then settle the closed lines' donations/requests
+        for status, ids in by_status.items():
+            db.execute(update(Match).where(Match.id.in_(ids)).values(status=status))
+        if newly_delivered:
+            now = datetime.utcnow()
+            db.execute(update(Match).where(Match.id.in_(list(newly_delivered))).values(delivered_at=now))
+            rollups.record_deliveries(db, newly_delivered.values(), now)
+        closed = [matches[i] for s in CLOSED_LINES for i in by_status.get(s, ())]
+        if closed:
+            db.flush()
+            settle_delivered(db, {m.donation_id for m in closed}, {m.request_id for m in closed})
+        db.commit()
+        reopen(*reopened)
+        for ids in by_status.values():
+            for i in ids:
+                publish_match_change(matches[i])
+        if by_status:
+            events.publish_counts(db)
+        return batch_response(results, "Updated")
 
-    flash("Record deleted successfully.")
-    return redirect(url_for("dashboard"))
+    return run_batch(apply, ("match_id",), ("status",))
+
+
+# ---------- IMPACT REPORTS ----------
+def report_range(args):
+    """(start, end) dates from ?start=&end= (ISO days); the last 30 days by default."""
+    end = date.fromisoformat(args["end"]) if args.get("end") else rollups.local_day(datetime.utcnow())
+    start = date.fromisoformat(args["start"]) if args.get("start") else end - timedelta(days=29)
+    if start > end:
+        raise ValueError("start must not be after end")
+    return start, end
+
+
+@app.route("/reports")
+def reports():
+    if "admin" not in session:
+        flash("Admin access only.")
+        return redirect(url_for("admin_login"))
+    try:
+        start, end = report_range(request.args)
+    except ValueError as e:
+        flash(str(e))
+        return redirect(url_for("reports"))
+    with SessionLocal() as db:
+        return render_template("reports.html", report=rollups.report(db, start, end))
+
+
+@app.route("/api/reports")
+def api_reports():
+    if "admin" not in session:
+        return jsonify(error="Admin access only."), 403
+    try:
+        start, end = report_range(request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    with SessionLocal() as db:
+        return jsonify(rollups.report(db, start, end))
+
+
+# ---------- METRICS ----------
+@app.route("/metrics")
+def metrics_endpoint():
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
 
 # ---------- RUN ----------
 if __name__ == "__main__":
-    app.run(debug=True)
+    # development server; production runs gunicorn (see gunicorn.conf.py)
+    create_app().run(debug=True)
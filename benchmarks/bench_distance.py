@@ -0,0 +1,60 @@
+"""Checks haversine_many/distance_matrix against the scalar haversine and
+times them on a 1k x 1k Belagavi-sized point cloud.
+
+    python -m benchmarks.bench_distance [--n 1000]
+"""
+import argparse
+import time
+import numpy as np
+from agents.utils import haversine, haversine_many, distance_matrix, distance_cache
+
+
+def random_points(rng, n):
+    # roughly the Belagavi district bounding box
+    return np.column_stack([rng.uniform(15.4, 16.9, n), rng.uniform(74.0, 75.4, n)])
+
+
+def check_equivalence(a, b):
+    d = distance_matrix(a, b)
+    ref = np.array([[haversine(p[0], p[1], q[0], q[1]) for q in b] for p in a])
+    # distance_matrix works on coordinates rounded to ~1 m
+    assert np.allclose(d, ref, atol=5e-3), float(np.abs(d - ref).max())
+    pairs = haversine_many(a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+    assert np.allclose(pairs, np.diag(ref), rtol=1e-12, atol=1e-9)
+    return float(np.abs(d - ref).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    a = random_points(rng, args.n)
+    b = random_points(rng, args.n)
+
+    max_err = check_equivalence(a[:50], b[:50])
+    print(f"equivalence: ok (max abs error {max_err:.2e} km)")
+
+    t = time.perf_counter()
+    for p in a:
+        for q in b:
+            haversine(p[0], p[1], q[0], q[1])
+    scalar = time.perf_counter() - t
+
+    distance_cache.clear()
+    t = time.perf_counter()
+    distance_matrix(a, b)
+    vector = time.perf_counter() - t
+
+    t = time.perf_counter()
+    distance_matrix(a, b)
+    cached = time.perf_counter() - t
+
+    print(f"{args.n}x{args.n} scalar loop : {scalar*1000:9.1f} ms")
+    print(f"{args.n}x{args.n} vectorized  : {vector*1000:9.1f} ms  ({scalar/vector:.0f}x)")
+    print(f"{args.n}x{args.n} cache hit   : {cached*1000:9.1f} ms  ({scalar/cached:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
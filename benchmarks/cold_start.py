@@ -0,0 +1,72 @@
+"""Cold-start time of a fresh worker, checked against COLD_START_BUDGET_MS.
+
+Each run starts a new interpreter and times the phases a production worker
+goes through: importing the app, create_app(), warmup() and the first
+request. Uses a throwaway SQLite database unless DATABASE_URL is set.
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --runs 10 --budget-ms 1000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = r"""
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+flask_app = app.create_app()
+t2 = time.perf_counter()
+app.warmup()
+t3 = time.perf_counter()
+resp = flask_app.test_client().get("/")
+t4 = time.perf_counter()
+assert resp.status_code == 200, resp.status_code
+print(json.dumps({"import": t1 - t0, "create_app": t2 - t1, "warmup": t3 - t2,
+                  "first_request": t4 - t3, "total": t4 - t0}))
+"""
+
+SETUP = "import models; models.init_db()"
+
+
+def main():
+    from config import Config
+    parser = argparse.ArgumentParser(description="Measure worker cold-start time.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=Config.COLD_START_BUDGET_MS)
+    args = parser.parse_args()
+
+    env = dict(os.environ, SCHEDULER_ENABLED="false")
+    if "DATABASE_URL" not in env:
+        path = os.path.join(tempfile.mkdtemp(prefix="surplus-cold-"), "cold.db")
+        env["DATABASE_URL"] = f"sqlite:///{path}"
+    # schema setup is a one-off CLI step, not part of a worker's start-up
+    subprocess.run([sys.executable, "-c", SETUP], cwd=ROOT, env=env, check=True)
+
+    runs = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", WORKER], cwd=ROOT, env=env,
+                             check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+
+    for phase in ("import", "create_app", "warmup", "first_request", "total"):
+        ms = [r[phase] * 1000 for r in runs]
+        print(f"{phase:<14} median {statistics.median(ms):8.1f} ms   max {max(ms):8.1f} ms")
+
+    total = statistics.median(r["total"] * 1000 for r in runs)
+    if total > args.budget_ms:
+        print(f"\nOVER BUDGET: {total:.0f} ms > {args.budget_ms:.0f} ms")
+        return 1
+    print(f"\nwithin budget: {total:.0f} ms <= {args.budget_ms:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,400 @@
+"""Load test: scripted donor, recipient and admin journeys over real HTTP.
+
+Journeys, each run by a fresh virtual user with its own cookie session:
+
+- donor:     POST /register -> POST /login -> GET /donate-page -> POST /donate
+- recipient: POST /register -> POST /login -> GET /request-page -> POST /request-food
+- admin:     POST /admin-login once, then loops GET /dashboard, GET /api/dashboard,
+             POST /match/<id>, POST /assign/<id>, POST /status/<id>
+
+Donor and recipient journeys arrive open-loop (Poisson, --donor-rate and
+--recipient-rate per second) and run on at most --concurrency virtual users
+at once; arrivals that find every user busy wait, and that wait is reported
+as arrival lag. Admins are --admins closed loops with --admin-think seconds
+between rounds.
+
+Without --url the app is started locally under gunicorn with gunicorn.conf.py,
+on a throwaway SQLite database seeded by benchmarks.synthetic, or on
+DATABASE_URL (e.g. a MySQL stand-in) when set. Reports p50/p95/p99 latency,
+throughput and error rate per route, writes
+benchmarks/results/<commit>-load.json and exits non-zero when a route's
+error rate exceeds --max-error-rate.
+
+    python -m benchmarks.load
+    python -m benchmarks.load --duration 120 --donor-rate 10 --recipient-rate 10 --concurrency 200
+    DATABASE_URL=mysql+pymysql://u:p@localhost/food_load python -m benchmarks.load --workers 4
+    python -m benchmarks.load --url http://localhost:8000 --admin-email a@x.org --admin-password ...
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+from benchmarks.run import RESULTS_DIR, git_revision
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "load-pass"
+
+
+class JourneyError(Exception):
+    pass
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of sorted `samples`."""
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+class Stats:
+    """Per-route latencies and errors, shared by every virtual user."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(list)    # route -> [ms]
+        self.errors = defaultdict(int)
+        self.journeys = defaultdict(lambda: {"ok": 0, "failed": 0})
+        self.lag = []                       # arrival lag of open-loop journeys, ms
+
+    def record(self, route, ms, ok):
+        with self._lock:
+            self.latency[route].append(ms)
+            if not ok:
+                self.errors[route] += 1
+
+    def journey(self, kind, ok, lag_ms=None):
+        with self._lock:
+            self.journeys[kind]["ok" if ok else "failed"] += 1
+            if lag_ms is not None:
+                self.lag.append(lag_ms)
+
+    def summary(self, seconds):
+        routes = {}
+        for route, samples in sorted(self.latency.items()):
+            samples = sorted(samples)
+            routes[route] = {
+                "n": len(samples),
+                "rps": len(samples) / seconds,
+                "error_rate": self.errors[route] / len(samples),
+                "p50_ms": percentile(samples, 0.50),
+                "p95_ms": percentile(samples, 0.95),
+                "p99_ms": percentile(samples, 0.99),
+                "max_ms": samples[-1],
+            }
+        lag = sorted(self.lag)
+        return {
+            "seconds": seconds,
+            "routes": routes,
+            "journeys": dict(self.journeys),
+            "arrival_lag_p95_ms": percentile(lag, 0.95) if lag else 0.0,
+        }
+
+
+class Client:
+    """One virtual user: a keep-alive connection and its cookies."""
+
+    def __init__(self, base_url, stats, timeout=30):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.stats = stats
+        self.timeout = timeout
+        self.cookies = {}
+        self._conn = None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def call(self, method, path, form=None, expect=200, live=False):
+        """Send one request; `expect` is a status code or the path a 3xx must redirect to."""
+        route = f"{method} {re.sub(r'/[0-9]+', '/<id>', path.split('?')[0])}"
+        headers = {}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if live:
+            headers["X-Live"] = "1"
+        t = time.perf_counter()
+        try:
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._conn.request(method, path, body, headers)
+            resp = self._conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.stats.record(route, (time.perf_counter() - t) * 1000, False)
+            self.close()
+            raise JourneyError(f"{route}: {e}")
+        ms = (time.perf_counter() - t) * 1000
+        for cookie in resp.headers.get_all("Set-Cookie") or ():
+            name, _, rest = cookie.partition("=")
+            self.cookies[name.strip()] = rest.split(";", 1)[0]
+        if isinstance(expect, int):
+            ok = resp.status == expect
+        else:
+            ok = 300 <= resp.status < 400 and urlsplit(resp.getheader("Location", "")).path == expect
+        self.stats.record(route, ms, ok)
+        if not ok:
+            raise JourneyError(f"{route}: {resp.status} {resp.getheader('Location', '')}")
+        return data
+
+
+# ---------- journeys ----------
+def _stamp(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M")
+
+
+def _register_and_login(client, role, email, place, rng):
+    taluk, pincode, _, _ = place
+    client.call("POST", "/register", {
+        "name": f"Load {role}", "phone": f"9{rng.randrange(10**9):09d}", "email": email,
+        "password": PASSWORD, "role": role, "prefers_veg": "true",
+        "taluk": taluk, "pincode": pincode, "address": "1 Load Test Road",
+    }, expect="/login")
+    client.call("POST", "/login", {"email": email, "password": PASSWORD}, expect="/portal")
+
+
+def donor_journey(client, email, place, rng):
+    _register_and_login(client, "donor", email, place, rng)
+    client.call("GET", "/donate-page")
+    ready = datetime.now() + timedelta(minutes=rng.randint(0, 120))
+    client.call("POST", "/donate", {
+        "title": "Load test meals", "is_veg": rng.choice(["true", "false"]),
+        "quantity": rng.randint(5, 120), "ready_by": _stamp(ready),
+        "expire_by": _stamp(ready + timedelta(hours=rng.randint(2, 10))),
+    }, expect="/portal")
+
+
+def recipient_journey(client, email, place, rng):
+    _register_and_login(client, "recipient", email, place, rng)
+    client.call("GET", "/request-page")
+    earliest = datetime.now() + timedelta(minutes=rng.randint(0, 240))
+    client.call("POST", "/request-food", {
+        "need_meals": rng.randint(10, 150), "prefers_veg": rng.choice(["true", "false"]),
+        "earliest": _stamp(earliest),
+        "latest": _stamp(earliest + timedelta(hours=rng.randint(2, 8))),
+    }, expect="/portal")
+
+
+def admin_round(client, rng):
+    client.call("GET", "/dashboard")
+    data = json.loads(client.call("GET", "/api/dashboard"))
+    # like an operator: take a scheduler suggestion, else any open pair on screen
+    if data["proposals"]:
+        pick = rng.choice(data["proposals"])
+        pair = (pick["donation_id"], pick["request_id"])
+    elif data["donations"] and data["requests"]:
+        pair = (rng.choice(data["donations"])["id"], rng.choice(data["requests"])["id"])
+    else:
+        pair = None
+    if pair:
+        client.call("POST", f"/match/{pair[0]}", {"request_id": pair[1]}, live=True)
+    planned = [m["id"] for m in data["matches"] if m["status"] == "planned"]
+    if planned:
+        client.call("POST", f"/assign/{rng.choice(planned)}", {"vehicle_id": "auto"}, live=True)
+    assigned = [m["id"] for m in data["matches"] if m["status"] == "assigned"]
+    if assigned:
+        client.call("POST", f"/status/{rng.choice(assigned)}", {"status": "delivered"}, live=True)
+
+
+# ---------- local server ----------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, log_path):
+    """Seed a database and start gunicorn on it; returns (process, base url)."""
+    if "DATABASE_URL" not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(prefix="surplus-load-"), "load.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    from models import init_db
+    from benchmarks.synthetic import generate, PASSWORD as SEED_PASSWORD
+    init_db()
+    data = generate(users=args.users, donations=args.donations, requests=args.requests,
+                    vehicles=args.vehicles, seed=args.seed)
+    args.admin_email, args.admin_password = data["admin"], SEED_PASSWORD
+
+    port = _free_port()
+    env = dict(os.environ, WEB_BIND=f"127.0.0.1:{port}")
+    if args.workers:
+        env["WEB_WORKERS"] = str(args.workers)
+    log = open(log_path, "w")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:create_app()"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with {proc.returncode}; see {log_path}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return proc, url
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit(f"server did not come up within 60 s; see {log_path}")
+
+
+# ---------- driver ----------
+def run(args, url):
+    from agents.data_ingestion import DataIngestionAgent
+    from benchmarks.synthetic import _places
+    places = _places(DataIngestionAgent())
+    stats = Stats()
+    stop = threading.Event()
+    tag = secrets.token_hex(3)      # keeps emails unique across runs on one database
+    seq = iter(range(10**9))
+    seq_lock = threading.Lock()
+
+    def journey(kind, fn, arrived, seed):
+        lag_ms = (time.perf_counter() - arrived) * 1000
+        rng = random.Random(seed)
+        with seq_lock:
+            n = next(seq)
+        client = Client(url, stats, args.timeout)
+        try:
+            fn(client, f"load-{tag}-{kind}{n}@load.local", rng.choice(places), rng)
+            stats.journey(kind, True, lag_ms)
+        except JourneyError:
+            stats.journey(kind, False, lag_ms)
+        finally:
+            client.close()
+
+    def arrivals(pool, kind, fn, rate, seed):
+        rng = random.Random(seed)
+        due = time.perf_counter()
+        while rate > 0:
+            due += rng.expovariate(rate)
+            wait = due - time.perf_counter()
+            if stop.wait(max(0.0, wait)):
+                return
+            pool.submit(journey, kind, fn, due, rng.random())
+
+    def admin(seed):
+        rng = random.Random(seed)
+        client = Client(url, stats, args.timeout)
+        try:
+            client.call("POST", "/admin-login",
+                        {"email": args.admin_email, "password": args.admin_password}, expect="/dashboard")
+        except JourneyError:
+            stats.journey("admin", False)
+            return
+        while not stop.is_set():
+            try:
+                admin_round(client, rng)
+                stats.journey("admin", True)
+            except JourneyError:
+                stats.journey("admin", False)
+            stop.wait(args.admin_think)
+        client.close()
+
+    admins = args.admins if args.admin_email else 0
+    if args.admins and not admins:
+        print("no admin account (--admin-email/--admin-password); skipping admin loops")
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        threads = [threading.Thread(target=arrivals, args=(pool, "donor", donor_journey, args.donor_rate, args.seed + 1)),
+                   threading.Thread(target=arrivals, args=(pool, "recipient", recipient_journey, args.recipient_rate, args.seed + 2))]
+        threads += [threading.Thread(target=admin, args=(args.seed + 100 + i,)) for i in range(admins)]
+        for t in threads:
+            t.start()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+    # in-flight journeys finish before the pool closes, so they count in the window
+    return stats.summary(time.perf_counter() - t0)
+
+
+def print_summary(summary):
+    print(f"\n{'route':<28} {'n':>7} {'req/s':>8} {'err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, r in summary["routes"].items():
+        print(f"{route:<28} {r['n']:>7} {r['rps']:>8.2f} {r['error_rate'] * 100:>6.2f} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+    print()
+    for kind, j in summary["journeys"].items():
+        print(f"{kind:<10} journeys ok {j['ok']:>6}   failed {j['failed']:>5}")
+    print(f"arrival lag p95 {summary['arrival_lag_p95_ms']:.1f} ms over {summary['seconds']:.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the app with scripted user journeys.")
+    parser.add_argument("--url", help="test a running instance instead of starting one")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of arrivals")
+    parser.add_argument("--donor-rate", type=float, default=2.0, help="donor journeys per second")
+    parser.add_argument("--recipient-rate", type=float, default=2.0, help="recipient journeys per second")
+    parser.add_argument("--admins", type=int, default=1, help="concurrent admin loops")
+    parser.add_argument("--admin-think", type=float, default=1.0, help="seconds between admin rounds")
+    parser.add_argument("--concurrency", type=int, default=50, help="max donor/recipient journeys in flight")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout, seconds")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--admin-email")
+    parser.add_argument("--admin-password")
+    # local instance only
+    parser.add_argument("--workers", type=int, help="gunicorn workers (default WEB_WORKERS)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--donations", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--vehicles", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    proc = None
+    if args.url:
+        url = args.url.rstrip("/")
+    else:
+        log_path = os.path.join(tempfile.mkdtemp(prefix="surplus-load-"), "server.log")
+        proc, url = start_server(args, log_path)
+        print(f"serving {os.environ['DATABASE_URL'].split(':', 1)[0]} at {url} (log: {log_path})")
+    try:
+        summary = run(args, url)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+    print_summary(summary)
+
+    report = {
+        "commit": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "target": args.url or os.environ["DATABASE_URL"].split(":", 1)[0],
+        "params": {k: v for k, v in vars(args).items() if k != "admin_password"},
+        **summary,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = os.path.join(RESULTS_DIR, f"{report['commit']}-load.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
+
+    failing = [r for r, s in summary["routes"].items() if s["error_rate"] > args.max_error_rate]
+    if failing:
+        print(f"\nERROR RATE over {args.max_error_rate:.1%}: {', '.join(failing)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""Benchmark suite for the agents and the hot Flask routes.
+
+Loads a synthetic dataset (benchmarks.synthetic) into a throwaway SQLite
+database unless DATABASE_URL points elsewhere, times each case and writes
+the results to benchmarks/results/<commit>.json for comparison across commits.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --donations 5000 --requests 5000 --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    samples.sort()
+    return {
+        "n": repeat,
+        "min_ms": samples[0],
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "mean_ms": statistics.fmean(samples),
+    }
+
+
+def git_revision():
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"]) != 0
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args):
+    # the database must be chosen before config/models are imported
+    if "DATABASE_URL" not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(prefix="surplus-bench-"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from models import init_db, SessionLocal, FoodDonation, FoodRequest
+    from benchmarks.synthetic import generate
+    init_db()
+    data = generate(users=args.users, donations=args.donations, requests=args.requests,
+                    vehicles=args.vehicles, seed=args.seed)
+
+    import app as webapp
+    from agents.logistics import LogisticsAgent
+    from agents.matching import MatchingAgent
+    from agents.utils import distance_cache
+
+    rng = random.Random(args.seed)
+    results = {}
+
+    # ---------- agents ----------
+    with SessionLocal() as db:
+        donations = db.query(FoodDonation).filter(FoodDonation.status=="open").all()
+        requests = db.query(FoodRequest).filter(FoodRequest.status=="open").all()
+
+    matcher = MatchingAgent()
+    pairs = [(rng.choice(donations), rng.choice(requests)) for _ in range(args.score_pairs)]
+    results[f"matching.score x{len(pairs)}"] = measure(
+        lambda: [matcher.score(d, r) for d, r in pairs], args.repeat)
+    results[f"matching.score_matrix {len(donations)}x{len(requests)}"] = measure(
+        lambda: matcher.score_matrix(donations, requests), args.repeat)
+    results[f"matching.match_all {len(donations)}x{len(requests)}"] = measure(
+        lambda: matcher.match_all(donations, requests), max(1, args.repeat // 5))
+
+    logistics = LogisticsAgent()
+
+    def cold_route(stops):
+        # time the distance computation too, not just a cache hit
+        distance_cache.clear()
+        logistics.nearest_neighbor(15.8528, 74.4987, stops)
+
+    for n in (10, 50, 100, 250, 500):
+        stops = [(d.lat, d.lon) for d in rng.sample(donations, min(n, len(donations)))]
+        results[f"logistics.nearest_neighbor {len(stops)} stops"] = measure(
+            lambda: cold_route(stops), args.repeat)
+
+    from agents.geofence import get_geofence
+    fence = get_geofence()
+    points = [(d.lat, d.lon) for d in donations]
+    lats, lons = [p[0] for p in points], [p[1] for p in points]
+    results[f"geofence.locate x{len(points)}"] = measure(
+        lambda: [fence.locate(lat, lon) for lat, lon in points], args.repeat)
+    results[f"geofence.locate_many {len(points)}"] = measure(
+        lambda: fence.locate_many(lats, lons), args.repeat)
+
+    # ---------- routes ----------
+    client = webapp.create_app().test_client()
+    with client.session_transaction() as s:
+        s["admin"] = data["admin"]
+
+    def get_ok(path):
+        r = client.get(path)
+        assert r.status_code == 200, (path, r.status_code)
+
+    results["GET /dashboard"] = measure(lambda: get_ok("/dashboard"), args.repeat)
+
+    with SessionLocal() as db:
+        busiest = max(data["donors"], key=lambda e: db.query(FoodDonation)
+                      .filter(FoodDonation.donor_email==e).count())
+    with client.session_transaction() as s:
+        s["user_email"] = busiest
+    results["GET /portal"] = measure(lambda: get_ok("/portal"), args.repeat)
+
+    # every create_match consumes one open donation/request pair
+    todo = list(zip(donations, requests))
+    rng.shuffle(todo)
+
+    def create_match():
+        d, r = todo.pop()
+        resp = client.post(f"/match/{d.id}", data={"request_id": r.id})
+        assert resp.status_code == 302, resp.status_code
+
+    results["POST /match/<id>"] = measure(create_match, min(args.repeat, len(todo) - 1))
+
+    return {
+        "commit": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+        "params": {k: v for k, v in vars(args).items() if k != "compare"},
+        "results": results,
+    }
+
+
+def compare(report, baseline):
+    print(f"\n{'case':<48} {'base ms':>10} {'now ms':>10} {'ratio':>7}")
+    for name, now in report["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        ratio = now["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+        flag = "  <-- slower" if ratio > 1.2 else ""
+        print(f"{name:<48} {base['median_ms']:>10.2f} {now['median_ms']:>10.2f} {ratio:>6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--donations", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--vehicles", type=int, default=10)
+    parser.add_argument("--score-pairs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", metavar="BASELINE_JSON")
+    args = parser.parse_args()
+
+    report = run(args)
+    for name, r in report["results"].items():
+        print(f"{name:<48} median {r['median_ms']:9.2f} ms   p95 {r['p95_ms']:9.2f} ms")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
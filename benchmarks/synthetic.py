@@ -0,0 +1,123 @@
+"""Synthetic Belagavi-district datasets for benchmarks and load tests.
+
+Users, donations, requests and vehicles are spread over the ten taluks in
+DataIngestionAgent.allowed_taluks, placed near real pincode centroids from the
+gazetteer, and written with bulk INSERTs.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.synthetic --donations 5000
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from agents.data_ingestion import DataIngestionAgent
+from agents.gazetteer import TALUKS
+from models import engine, init_db, User, FoodDonation, FoodRequest, Vehicle
+
+PASSWORD = "bench-pass"
+MEALS = ["Veg biryani", "Chapati and dal", "Jeera rice", "Idli sambar", "Chicken curry",
+         "Lemon rice", "Poori bhaji", "Egg fried rice", "Upma", "Mixed veg curry"]
+
+
+def _places(agent):
+    """[(taluk, pincode, lat, lon)] for every gazetteer pincode in an allowed taluk."""
+    places = []
+    for slot, (code, lat, lon) in enumerate(agent.gazetteer.table.tolist()):
+        if code and TALUKS[code - 1] in agent.allowed_taluks:
+            places.append((TALUKS[code - 1], str(590000 + slot), lat, lon))
+    return places
+
+
+def generate(bind=engine, users=200, donations=2000, requests=2000, vehicles=10,
+             seed=0, now=None, chunk=5000):
+    """Insert a dataset and return {'donors': [...], 'recipients': [...], 'admin': email}."""
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    places = _places(DataIngestionAgent())
+    # hashing is deliberately slow; every synthetic user shares one hash
+    pw_hash = generate_password_hash(PASSWORD)
+
+    def jitter(lat, lon):
+        return lat + rng.uniform(-0.02, 0.02), lon + rng.uniform(-0.02, 0.02)
+
+    def put(model, rows):
+        with bind.begin() as conn:
+            for i in range(0, len(rows), chunk):
+                conn.execute(insert(model.__table__), rows[i:i + chunk])
+
+    user_rows, donors, recipients = [], [], []
+    for i in range(users):
+        taluk, pincode, _, _ = rng.choice(places)
+        role = "donor" if i % 2 == 0 else "recipient"
+        email = f"{role}{i}@bench.local"
+        (donors if role == "donor" else recipients).append((email, pincode))
+        user_rows.append(dict(
+            email=email, name=f"{role.title()} {i}", phone=f"9{i:09d}",
+            address=f"{i} Main Road, {taluk.title()}, Belagavi, Karnataka, {pincode}",
+            pincode=pincode, role=role, password_hash=pw_hash,
+            created_at=now, is_active=True,
+        ))
+    admin = "admin@bench.local"
+    user_rows.append(dict(email=admin, name="Bench Admin", phone="9000000000", address="",
+                          pincode="590001", role="admin", password_hash=pw_hash,
+                          created_at=now, is_active=True))
+    put(User, user_rows)
+
+    by_pin = {p[1]: p for p in places}
+    rows = []
+    for i in range(donations):
+        email, pincode = rng.choice(donors)
+        lat, lon = jitter(*by_pin[pincode][2:])
+        ready = now + timedelta(minutes=rng.randint(-60, 180))
+        rows.append(dict(
+            donor_email=email, title=rng.choice(MEALS), description="",
+            is_veg=rng.random() < 0.7, quantity_meals=rng.randint(5, 120),
+            ready_by=ready, expire_by=ready + timedelta(hours=rng.randint(2, 10)),
+            address="synthetic", pincode=pincode, lat=lat, lon=lon,
+            status="open", created_at=now,
+        ))
+    put(FoodDonation, rows)
+
+    rows = []
+    for i in range(requests):
+        email, pincode = rng.choice(recipients)
+        lat, lon = jitter(*by_pin[pincode][2:])
+        earliest = now + timedelta(minutes=rng.randint(0, 240))
+        rows.append(dict(
+            recipient_email=email, need_meals=rng.randint(10, 150),
+            prefers_veg=rng.random() < 0.6, earliest=earliest,
+            latest=earliest + timedelta(hours=rng.randint(2, 8)),
+            address="synthetic", pincode=pincode, lat=lat, lon=lon,
+            status="open", created_at=now,
+        ))
+    put(FoodRequest, rows)
+
+    rows = []
+    for i in range(vehicles):
+        _, _, lat, lon = rng.choice(places)
+        kind, cap = rng.choice([("Van", 80), ("Bike", 30), ("Truck", 200)])
+        rows.append(dict(name=f"{kind}-{i + 1}", capacity_meals=cap,
+                         base_lat=lat, base_lon=lon, is_available=True))
+    put(Vehicle, rows)
+
+    return {"donors": [e for e, _ in donors], "recipients": [e for e, _ in recipients], "admin": admin}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a synthetic Belagavi dataset.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--donations", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--vehicles", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    init_db()
+    generate(users=args.users, donations=args.donations, requests=args.requests,
+             vehicles=args.vehicles, seed=args.seed)
+    print(f"Loaded {args.users} users, {args.donations} donations, "
+          f"{args.requests} requests, {args.vehicles} vehicles into {engine.url}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,14 +10,95 @@ class Config:
     MYSQL_USER = os.getenv("MYSQL_USER", "root")
     MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "")
     MYSQL_DB = os.getenv("MYSQL_DB", "belagavi_food")
-    SQLALCHEMY_DATABASE_URI = (
-        f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
-    )
+    # "mysql", or "sqlite" (WAL mode, one file) for local load tests and CI
+    DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+    SQLITE_PATH = os.getenv("SQLITE_PATH", "surplus_food.db")
+    # DATABASE_URL overrides the backend settings (e.g. sqlite:///bench.db for benchmarks)
+    DATABASE_URL = os.getenv("DATABASE_URL")
     SQLALCHEMY_ECHO = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connection pool, per process: size + overflow should stay below the
+    # server's max_connections divided by WEB_WORKERS
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    # seconds to wait for a free connection before raising
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # reconnect connections older than this; keep below MySQL's wait_timeout
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    # test each connection on checkout so a dropped one is replaced, not raised
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+    # Production server (gunicorn.conf.py)
+    WEB_BIND = os.getenv("WEB_BIND", "0.0.0.0:8000")
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", str(2 * (os.cpu_count() or 1) + 1)))
+    # threads per worker; each open /events stream holds one for as long as it is open
+    WEB_THREADS = int(os.getenv("WEB_THREADS", "32"))
+    # /events streams per worker; more are refused (503) so at least
+    # WEB_THREADS - SSE_MAX_STREAMS threads stay free for ordinary requests
+    SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", str(max(1, WEB_THREADS * 3 // 4))))
+    # benchmarks/cold_start.py fails when a fresh worker takes longer than this
+    COLD_START_BUDGET_MS = float(os.getenv("COLD_START_BUDGET_MS", "1500"))
+
+    # Log requests slower than this (with their SQL); 0 disables
+    SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+
+    # Session user cache (per process): entries and seconds before a re-read
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    USER_CACHE_TTL_S = float(os.getenv("USER_CACHE_TTL_S", "60"))
+
+    # Rows per page on the admin dashboard and its JSON API
+    DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", "50"))
+    # Rows per page of a user's activity on the portal and /api/activity
+    ACTIVITY_PAGE_SIZE = int(os.getenv("ACTIVITY_PAGE_SIZE", "25"))
+    # Largest list accepted by the /api/batch/* endpoints
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+    # Matching: only donation/request pairs within this distance are scored
+    MATCH_RADIUS_KM = float(os.getenv("MATCH_RADIUS_KM", "10"))
+    # Donations expiring within this many hours get a growing urgency bonus
+    URGENCY_HORIZON_H = float(os.getenv("URGENCY_HORIZON_H", "12"))
+    # Background matching scheduler: reacts to new/changed rows within seconds.
+    # Without auto-commit it only proposes matches on the dashboard.
+    SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+    SCHEDULER_AUTO_COMMIT = os.getenv("SCHEDULER_AUTO_COMMIT", "false").lower() == "true"
+    SCHEDULER_DEBOUNCE_S = float(os.getenv("SCHEDULER_DEBOUNCE_S", "2"))
+    SCHEDULER_MAX_WAIT_S = float(os.getenv("SCHEDULER_MAX_WAIT_S", "10"))
+    SCHEDULER_RESYNC_S = float(os.getenv("SCHEDULER_RESYNC_S", "300"))
+
+    # Archival (agents.archive): closed rows created more than this many days
+    # ago move to the *_archive tables, in chunks with a short pause between
+    ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+    ARCHIVE_PAUSE_S = float(os.getenv("ARCHIVE_PAUSE_S", "0.05"))
+
+    # Impact reports (agents.rollups) count deliveries per day in this zone
+    REPORT_TIMEZONE = os.getenv("REPORT_TIMEZONE", "Asia/Kolkata")
+
+    # Fleet routing
+    VEHICLE_SPEED_KMPH = float(os.getenv("VEHICLE_SPEED_KMPH", "25"))
+    STOP_SERVICE_MIN = float(os.getenv("STOP_SERVICE_MIN", "5"))
+    ROUTE_TIME_BUDGET_S = float(os.getenv("ROUTE_TIME_BUDGET_S", "2"))
+    # Vehicle ranking: a full vehicle counts as this many km of extra detour
+    FLEET_SPARE_WEIGHT_KM = float(os.getenv("FLEET_SPARE_WEIGHT_KM", "3"))
 
     GMAIL_USER = os.getenv("GMAIL_USER")
     GMAIL_PASS = os.getenv("GMAIL_PASS")
+    MAIL_FROM = os.getenv("MAIL_FROM", GMAIL_USER)
+    # Point these at a local debugging SMTP server for testing
+    SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+    SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+    SMTP_SSL = os.getenv("SMTP_SSL", "true").lower() == "true"
+    # Email outbox: background delivery over reused SMTP connections
+    OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "1"))
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+    OUTBOX_BACKOFF_S = float(os.getenv("OUTBOX_BACKOFF_S", "2"))
+
+    # Geofence (agents.geofence): cells per side of the point-in-polygon grid
+    GEOFENCE_GRID = int(os.getenv("GEOFENCE_GRID", "64"))
+    # reject coordinates that fall in another taluk's polygon; only meaningful
+    # with surveyed boundaries (the shipped ones are approximate, so off)
+    GEOFENCE_STRICT_TALUK = os.getenv("GEOFENCE_STRICT_TALUK", "false").lower() == "true"
 
     # Geo guard: restrict to Belagavi Taluk only
     ALLOWED_CITY = "Belagavi"
@@ -0,0 +1,96 @@
+"""Engine construction: backend selection, pool tuning and pool stats.
+
+DB_BACKEND picks the database: "mysql" (production) or "sqlite", a
+single-file stand-in for local load tests and CI that runs in WAL mode so
+readers don't block the writer. DATABASE_URL overrides both. Pool size,
+overflow, timeout, recycle and pre-ping come from Config.
+
+Connections are handed out by `TimedQueuePool`, which records how long each
+checkout waited; `pool_stats()` reports the pool's in-use counts.
+"""
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+import metrics
+from config import Config
+
+POOL_CHECKOUT_SECONDS = metrics.Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.")
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that observes the wait for every checkout."""
+
+    def _do_get(self):
+        t = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - t)
+
+
+def database_uri(backend=None):
+    if Config.DATABASE_URL:
+        return Config.DATABASE_URL
+    backend = backend or Config.DB_BACKEND
+    if backend == "mysql":
+        return (f"mysql+pymysql://{Config.MYSQL_USER}:{Config.MYSQL_PASSWORD}"
+                f"@{Config.MYSQL_HOST}:{Config.MYSQL_PORT}/{Config.MYSQL_DB}")
+    if backend == "sqlite":
+        return f"sqlite:///{Config.SQLITE_PATH}"
+    raise ValueError(f"unknown DB_BACKEND: {backend!r} (expected mysql or sqlite)")
+
+
+def _sqlite_pragmas(dbapi_conn, record):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    # WAL keeps the database consistent with NORMAL; FULL would fsync every commit
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute(f"PRAGMA busy_timeout={int(Config.DB_POOL_TIMEOUT * 1000)}")
+    cur.execute("PRAGMA foreign_keys=ON")
+    cur.close()
+
+
+def make_engine(uri=None):
+    uri = uri or database_uri()
+    kwargs = dict(
+        echo=Config.SQLALCHEMY_ECHO,
+        future=True,
+        poolclass=TimedQueuePool,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_pre_ping=Config.DB_POOL_PRE_PING,
+    )
+    sqlite = uri.startswith("sqlite")
+    if sqlite:
+        if ":memory:" in uri or uri in ("sqlite://", "sqlite:///"):
+            raise ValueError("the SQLite backend needs a database file, not :memory:")
+        # pooled connections move between request and background threads
+        kwargs["connect_args"] = {"check_same_thread": False}
+    else:
+        # recycle before the server (or a proxy) drops idle connections
+        kwargs["pool_recycle"] = Config.DB_POOL_RECYCLE
+    engine = create_engine(uri, **kwargs)
+    if sqlite:
+        event.listen(engine, "connect", _sqlite_pragmas)
+    return engine
+
+
+def pool_stats(engine):
+    """Current pool occupancy: configured size, checked-out and idle connections, overflow."""
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": Config.DB_MAX_OVERFLOW,
+    }
+
+
+def instrument_pool(engine):
+    """Publish pool_stats(engine) on /metrics."""
+    metrics.Gauge(
+        "db_pool_connections", "Pooled database connections by state.", ("state",),
+        lambda: {(k,): v for k, v in pool_stats(engine).items()})
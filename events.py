@@ -0,0 +1,154 @@
+"""In-process pub/sub feeding the /events Server-Sent Events stream.
+
+Write handlers publish the rows they changed after committing; every open
+/events connection holds a `Subscriber` and receives the events it is allowed
+to see (admins see everything, donors and recipients only their own rows).
+Pages patch the affected table rows in place instead of reloading.
+
+Events only reach clients connected to the same process; with several
+workers each keeps its own subscribers.
+"""
+import json
+import queue
+import threading
+from typing import Optional
+from sqlalchemy import select, func
+from models import FoodDonation, FoodRequest, Vehicle, Match
+
+HEARTBEAT_S = 15
+QUEUE_SIZE = 256
+
+
+class Subscriber:
+    def __init__(self, admin: bool, email: Optional[str]):
+        self.admin = admin
+        self.email = email
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        # set when the client fell too far behind; it is told to reload instead
+        self.overflowed = False
+
+    def wants(self, owner):
+        return self.admin or (owner is not None and owner == self.email)
+
+
+class EventBus:
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def has_admins(self):
+        with self._lock:
+            return any(s.admin for s in self._subscribers)
+
+    def subscribe(self, admin=False, email=None, limit=None) -> Optional[Subscriber]:
+        """A new subscriber, or None when `limit` subscribers are already connected."""
+        sub = Subscriber(admin, email)
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event, data, owner=None):
+        """Send to admins and, if given, to the owning user's connections."""
+        if not self._subscribers:
+            return
+        frame = f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        with self._lock:
+            subs = [s for s in self._subscribers if s.wants(owner)]
+        for sub in subs:
+            try:
+                sub.queue.put_nowait(frame)
+            except queue.Full:
+                sub.overflowed = True
+
+    def stream(self, sub, heartbeat_s=HEARTBEAT_S):
+        """SSE frames for `sub` until the client disconnects."""
+        try:
+            yield "retry: 3000\n\n"
+            while not sub.overflowed:
+                try:
+                    yield sub.queue.get(timeout=heartbeat_s)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+            yield "event: reload\ndata: {}\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+
+bus = EventBus()
+
+
+# ---------- row payloads (shared with the JSON APIs) ----------
+def donation_row(d):
+    return {
+        "id": d.id, "title": d.title, "quantity_meals": d.quantity_meals,
+        # archived rows have the column but not the model's property
+        "remaining_meals": d.quantity_meals - (d.allocated_meals or 0),
+        "is_veg": d.is_veg, "donor_email": d.donor_email, "pincode": d.pincode,
+        "ready_by": d.ready_by.isoformat(), "expire_by": d.expire_by.isoformat(),
+        "status": d.status,
+    }
+
+
+def request_row(r):
+    return {
+        "id": r.id, "need_meals": r.need_meals, "prefers_veg": r.prefers_veg,
+        "remaining_meals": r.need_meals - (r.allocated_meals or 0),
+        "recipient_email": r.recipient_email, "pincode": r.pincode,
+        "earliest": r.earliest.isoformat(), "latest": r.latest.isoformat(),
+        "status": r.status,
+    }
+
+
+def match_row(m):
+    return {
+        "id": m.id, "donation_id": m.donation_id, "request_id": m.request_id,
+        "score": m.score, "status": m.status, "vehicle_id": m.vehicle_id, "meals": m.meals,
+        # archived matches have no relationships
+        "vehicle": m.vehicle.name if getattr(m, "vehicle", None) else None,
+    }
+
+
+def publish_donation(d):
+    bus.publish("donation", donation_row(d), owner=d.donor_email)
+
+
+def publish_request(r):
+    bus.publish("request", request_row(r), owner=r.recipient_email)
+
+
+def publish_match(m):
+    bus.publish("match", match_row(m))
+
+
+def publish_deleted_match(match_id):
+    bus.publish("match", {"id": match_id, "deleted": True})
+
+
+def dashboard_counts(db):
+    """The dashboard's summary cards, in one round trip."""
+    counts = db.execute(select(
+        select(func.count()).select_from(FoodDonation)
+            .where(FoodDonation.status=="open").scalar_subquery(),
+        select(func.count()).select_from(FoodRequest)
+            .where(FoodRequest.status=="open").scalar_subquery(),
+        select(func.count()).select_from(Vehicle)
+            .where(Vehicle.is_available==True).scalar_subquery(),
+        select(func.count()).select_from(Match).scalar_subquery(),
+    )).one()
+    return dict(zip(("donations", "requests", "vehicles", "matches"), counts))
+
+
+def publish_counts(db):
+    # only admins see the counts; skip the query when none is listening
+    if bus.has_admins():
+        bus.publish("counts", dashboard_counts(db))
@@ -0,0 +1,28 @@
+"""Production server settings.
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+The app is imported once in the master (preload_app) and forked into
+WEB_WORKERS processes; each worker then runs app.warmup() to open its own
+database pool, load the matching index and start its background threads
+before it accepts requests.
+"""
+from config import Config
+
+bind = Config.WEB_BIND
+workers = Config.WEB_WORKERS
+# threaded workers: Server-Sent Events streams are long-lived and each holds a
+# thread while open. A worker serves at most SSE_MAX_STREAMS streams and
+# keeps the other WEB_THREADS - SSE_MAX_STREAMS threads for ordinary
+# requests, so size WEB_THREADS for the expected open pages per worker.
+worker_class = "gthread"
+threads = Config.WEB_THREADS
+preload_app = True
+timeout = 60
+graceful_timeout = 30
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    import app
+    app.warmup()
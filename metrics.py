@@ -0,0 +1,183 @@
+"""In-process request, SQL and agent timings exposed in Prometheus text format.
+
+`init_app` wires Flask before/after-request hooks and SQLAlchemy cursor
+events; `timed` wraps agent calls. Everything lands in the histograms below
+and is served by the app's /metrics route.
+"""
+import bisect
+import functools
+import logging
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from config import Config
+
+log = logging.getLogger(__name__)
+
+# seconds; covers sub-millisecond SQL up to multi-second page loads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+REGISTRY = []
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *labelvalues):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            series[i] += 1          # per-bucket; made cumulative on render
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for labelvalues, series in sorted(items):
+            labels = [f'{n}="{v}"' for n, v in zip(self.labelnames, labelvalues)]
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), series[:-2]):
+                running += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = ",".join(labels + ['le="%s"' % le])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {running}")
+            suffix = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-2]}")
+            lines.append(f"{self.name}_count{suffix} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Point-in-time values read from `collect()` whenever /metrics is scraped.
+
+    `collect` returns {label values tuple: value}.
+    """
+
+    def __init__(self, name, help, labelnames, collect):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labelvalues, value in sorted(self.collect().items()):
+            labels = ",".join(f'{n}="{v}"' for n, v in zip(self.labelnames, labelvalues))
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency.", ("method", "endpoint", "status"))
+REQUEST_SQL_QUERIES = Histogram(
+    "http_request_sql_queries", "SQL statements issued per request.", ("endpoint",), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram(
+    "http_request_sql_seconds", "Time spent in SQL per request.", ("endpoint",))
+SQL_QUERY_SECONDS = Histogram(
+    "sql_query_duration_seconds", "Latency of individual SQL statements.")
+AGENT_SECONDS = Histogram(
+    "agent_call_duration_seconds", "Latency of agent calls.", ("call",))
+
+
+def timed(call):
+    """Decorator recording the wrapped function's latency under AGENT_SECONDS{call}."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                AGENT_SECONDS.observe(time.perf_counter() - t, call)
+        return inner
+    return wrap
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- SQLAlchemy hooks ----------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    SQL_QUERY_SECONDS.observe(elapsed)
+    if has_request_context() and "sql_count" in g:
+        g.sql_count += 1
+        g.sql_seconds += elapsed
+        if len(g.sql_statements) < 200:
+            g.sql_statements.append((elapsed, statement))
+
+
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute; drop its start time
+    # so the per-connection list doesn't grow with every error
+    conn = context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# ---------- Flask hooks ----------
+def _before_request():
+    g.request_start = time.perf_counter()
+    g.sql_count = 0
+    g.sql_seconds = 0.0
+    g.sql_statements = []
+
+
+def _after_request(response):
+    g.response_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    # after_request is skipped when an exception propagates (PROPAGATE_EXCEPTIONS,
+    # or a failing after_request hook); teardown always runs, so record here
+    if "request_start" not in g:
+        return
+    elapsed = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or "unknown"
+    status = g.get("response_status", 500)
+    REQUEST_SECONDS.observe(elapsed, request.method, endpoint, str(status))
+    REQUEST_SQL_QUERIES.observe(g.sql_count, endpoint)
+    REQUEST_SQL_SECONDS.observe(g.sql_seconds, endpoint)
+    if Config.SLOW_REQUEST_MS and elapsed * 1000 >= Config.SLOW_REQUEST_MS:
+        log.warning(
+            "Slow request %s %s: %.0f ms, %d SQL statements in %.0f ms\n%s",
+            request.method, request.path, elapsed * 1000, g.sql_count, g.sql_seconds * 1000,
+            "\n".join(f"  [{t*1000:7.1f} ms] {s}" for t, s in g.sql_statements),
+        )
+
+
+def init_app(app, engine):
+    instrument_engine(engine)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,197 @@
+"""Versioned schema migrations.
+
+`Base.metadata.create_all` only creates missing tables; it never touches
+existing ones. Changes to tables that already hold data (new indexes,
+columns) go here as numbered steps, recorded in `schema_migrations`.
+
+    python migrations.py upgrade       # apply pending migrations
+    python migrations.py check-plans   # fail if a hot query does a full scan
+"""
+import re
+import sys
+from datetime import datetime
+from sqlalchemy import inspect, select, func, text
+from models import engine, FoodDonation, FoodRequest, Vehicle, Match
+
+
+# ---------- MIGRATIONS ----------
+def _create_indexes(conn, indexes):
+    insp = inspect(conn)
+    for table, name, cols in indexes:
+        if name not in {ix["name"] for ix in insp.get_indexes(table)}:
+            conn.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(cols)})"))
+
+
+def _add_columns(conn, columns):
+    insp = inspect(conn)
+    for table, name, ddl in columns:
+        if not insp.has_table(table):
+            continue    # created later with the column by create_all
+        if name not in {c["name"] for c in insp.get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+def _hot_filter_indexes(conn):
+    _create_indexes(conn, [
+        ("food_donations", "ix_food_donations_status_expire_by", ("status", "expire_by")),
+        ("food_donations", "ix_food_donations_status_pincode", ("status", "pincode")),
+        ("food_donations", "ix_food_donations_donor_created", ("donor_email", "created_at")),
+        ("food_requests", "ix_food_requests_status_latest", ("status", "latest")),
+        ("food_requests", "ix_food_requests_status_pincode", ("status", "pincode")),
+        ("food_requests", "ix_food_requests_recipient_created", ("recipient_email", "created_at")),
+        ("vehicles", "ix_vehicles_is_available", ("is_available",)),
+        ("matches", "ix_matches_status", ("status",)),
+        ("matches", "ix_matches_donation_id", ("donation_id",)),
+        ("matches", "ix_matches_request_id", ("request_id",)),
+    ])
+
+
+def _fleet_state(conn):
+    _add_columns(conn, [
+        ("vehicles", "load_meals", "INTEGER NOT NULL DEFAULT 0"),
+        ("vehicles", "pos_lat", "FLOAT"),
+        ("vehicles", "pos_lon", "FLOAT"),
+        ("vehicles", "busy_until", "DATETIME"),
+    ])
+    # backfill the load already committed to each vehicle
+    conn.execute(text(
+        "UPDATE vehicles SET load_meals = ("
+        " SELECT COALESCE(SUM(d.quantity_meals), 0) FROM matches m"
+        " JOIN food_donations d ON d.id = m.donation_id"
+        " WHERE m.vehicle_id = vehicles.id AND m.status IN ('assigned', 'enroute'))"
+    ))
+    conn.execute(text("UPDATE vehicles SET is_available = (load_meals < capacity_meals)"))
+
+
+def _owner_status_indexes(conn):
+    # per-status counts on the portal read only the index
+    _create_indexes(conn, [
+        ("food_donations", "ix_food_donations_donor_status", ("donor_email", "status")),
+        ("food_requests", "ix_food_requests_recipient_status", ("recipient_email", "status")),
+    ])
+
+
+def _delivered_at(conn):
+    _add_columns(conn, [
+        ("matches", "delivered_at", "DATETIME"),
+        ("matches_archive", "delivered_at", "DATETIME"),
+    ])
+
+
+def _match_lines(conn):
+    _add_columns(conn, [
+        (table, "allocated_meals", "INTEGER NOT NULL DEFAULT 0")
+        for table in ("food_donations", "food_requests", "food_donations_archive", "food_requests_archive")
+    ] + [
+        ("matches", "meals", "INTEGER"),
+        ("matches_archive", "meals", "INTEGER"),
+    ])
+
+
+# (version, description, step); append only, never renumber
+MIGRATIONS = [
+    (1, "indexes for hot status/owner filters", _hot_filter_indexes),
+    (2, "vehicle load/position/busy-until", _fleet_state),
+    (3, "owner/status indexes for portal counts", _owner_status_indexes),
+    (4, "match delivered-at time for rollups", _delivered_at),
+    (5, "allocated meals for split/merged match lines", _match_lines),
+]
+
+
+def upgrade(bind=engine):
+    """Apply every migration newer than the recorded schema version."""
+    with bind.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at DATETIME)"
+        ))
+        current = conn.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar() or 0
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        with bind.begin() as conn:
+            step(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) "
+                     "VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.utcnow()},
+            )
+
+
+# ---------- QUERY PLAN CHECKS ----------
+def hot_queries():
+    """The filters every page load or matching pass depends on."""
+    return {
+        "open donations": select(FoodDonation).where(FoodDonation.status=="open")
+            .order_by(FoodDonation.id).limit(51),
+        "open requests": select(FoodRequest).where(FoodRequest.status=="open")
+            .order_by(FoodRequest.id).limit(51),
+        "count open donations": select(func.count()).select_from(FoodDonation)
+            .where(FoodDonation.status=="open"),
+        "count open requests": select(func.count()).select_from(FoodRequest)
+            .where(FoodRequest.status=="open"),
+        "available vehicles": select(Vehicle).where(Vehicle.is_available==True),
+        "donations by donor": select(FoodDonation).where(FoodDonation.donor_email=="a@b.c"),
+        "requests by recipient": select(FoodRequest).where(FoodRequest.recipient_email=="a@b.c"),
+        "donor status counts": select(FoodDonation.status, func.count())
+            .where(FoodDonation.donor_email=="a@b.c").group_by(FoodDonation.status),
+        "recipient status counts": select(FoodRequest.status, func.count())
+            .where(FoodRequest.recipient_email=="a@b.c").group_by(FoodRequest.status),
+        "routable matches": select(Match).where(Match.status.in_(("planned", "assigned"))),
+        "expired donations": select(FoodDonation.id).where(
+            FoodDonation.status=="open", FoodDonation.expire_by < datetime(2000, 1, 1)),
+    }
+
+
+def _explain(conn, stmt):
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    if compiled.positiontup is not None:
+        params = tuple(compiled.params[k] for k in compiled.positiontup)
+    else:
+        params = compiled.params
+    if conn.dialect.name == "sqlite":
+        return conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).mappings().all()
+    return conn.exec_driver_sql("EXPLAIN " + str(compiled), params).mappings().all()
+
+
+def full_scans(conn, stmt):
+    """Plan lines that read a whole table (or a whole index)."""
+    bad = []
+    for row in _explain(conn, stmt):
+        if conn.dialect.name == "sqlite":
+            if re.match(r"SCAN (?!CONSTANT ROW)", row["detail"]):
+                bad.append(row["detail"])
+        elif row["type"] in ("ALL", "index"):
+            bad.append(f"{row['table']}: type={row['type']} key={row['key']}")
+    return bad
+
+
+def check_plans(bind=engine):
+    """Returns {query name: [full-scan plan lines]} for every failing hot query.
+
+    Run against a database holding realistic data; MySQL may legitimately
+    prefer a table scan on a near-empty table.
+    """
+    failures = {}
+    with bind.connect() as conn:
+        for name, stmt in hot_queries().items():
+            bad = full_scans(conn, stmt)
+            if bad:
+                failures[name] = bad
+    return failures
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if cmd == "upgrade":
+        upgrade()
+        print("Schema up to date.")
+    elif cmd == "check-plans":
+        failures = check_plans()
+        for name, lines in failures.items():
+            print(f"FULL SCAN  {name}: {'; '.join(lines)}")
+        if failures:
+            sys.exit(1)
+        print(f"All {len(hot_queries())} hot queries use an index.")
+    else:
+        sys.exit(f"unknown command: {cmd}")
@@ -1,11 +1,12 @@
 from datetime import datetime
 from sqlalchemy import (
-    create_engine, String, Integer, Boolean, DateTime, Float, ForeignKey, Text, Column
+    String, Integer, Boolean, Date, DateTime, Float, ForeignKey, Text, Column, Index, Table
 )
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
-from config import Config
+from database import make_engine, instrument_pool
 
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI, echo=False, future=True)
+engine = make_engine()
+instrument_pool(engine)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
@@ -50,9 +51,24 @@ class FoodDonation(Base):
 
     status = Column(String(30), default="open")  # open, matched, picked, delivered, cancelled
     created_at = Column(DateTime, default=datetime.utcnow)
+    # meals promised to match lines by consolidation while the row stays open
+    allocated_meals = Column(Integer, default=0, nullable=False)
 
     donor = relationship("User", back_populates="donations")
-    match = relationship("Match", back_populates="donation", uselist=False)
+    # one line per request served; several when the donation is split
+    matches = relationship("Match", back_populates="donation")
+
+    @property
+    def remaining_meals(self):
+        return (self.quantity_meals or 0) - (self.allocated_meals or 0)
+
+    # kept in sync with migrations.py for databases created before the index existed
+    __table_args__ = (
+        Index("ix_food_donations_status_expire_by", "status", "expire_by"),
+        Index("ix_food_donations_status_pincode", "status", "pincode"),
+        Index("ix_food_donations_donor_created", "donor_email", "created_at"),
+        Index("ix_food_donations_donor_status", "donor_email", "status"),
+    )
 
 class FoodRequest(Base):
     __tablename__ = "food_requests"
@@ -69,9 +85,22 @@ class FoodRequest(Base):
     lon = Column(Float, default=0.0)
     status = Column(String(30), default="open")  # open, matched, fulfilled, cancelled
     created_at = Column(DateTime, default=datetime.utcnow)
+    allocated_meals = Column(Integer, default=0, nullable=False)
 
     recipient = relationship("User", back_populates="requests")
-    match = relationship("Match", back_populates="request", uselist=False)
+    # one line per donation serving it; several when donations are merged
+    matches = relationship("Match", back_populates="request")
+
+    @property
+    def remaining_meals(self):
+        return (self.need_meals or 0) - (self.allocated_meals or 0)
+
+    __table_args__ = (
+        Index("ix_food_requests_status_latest", "status", "latest"),
+        Index("ix_food_requests_status_pincode", "status", "pincode"),
+        Index("ix_food_requests_recipient_created", "recipient_email", "created_at"),
+        Index("ix_food_requests_recipient_status", "recipient_email", "status"),
+    )
 
 class Vehicle(Base):
     __tablename__ = "vehicles"
@@ -81,25 +110,93 @@ class Vehicle(Base):
     capacity_meals = Column(Integer, default=50)
     base_lat = Column(Float, default=0.0)
     base_lon = Column(Float, default=0.0)
-    is_available = Column(Boolean, default=True)
+    is_available = Column(Boolean, default=True, index=True)  # has spare capacity
+
+    # fleet state, maintained by agents.fleet on assign/delivery
+    load_meals = Column(Integer, default=0, nullable=False)
+    pos_lat = Column(Float, nullable=True)      # last stop of the route; None = at base
+    pos_lon = Column(Float, nullable=True)
+    busy_until = Column(DateTime, nullable=True)
 
 class Match(Base):
     __tablename__ = "matches"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    donation_id = Column(Integer, ForeignKey("food_donations.id"), nullable=False)
-    request_id = Column(Integer, ForeignKey("food_requests.id"), nullable=False)
+    donation_id = Column(Integer, ForeignKey("food_donations.id"), nullable=False, index=True)
+    request_id = Column(Integer, ForeignKey("food_requests.id"), nullable=False, index=True)
     score = Column(Float, default=0.0)
 
     vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=True)
     route_json = Column(Text, nullable=True)
 
-    status = Column(String(30), default="planned")  # planned, assigned, enroute, delivered, cancelled
+    status = Column(String(30), default="planned", index=True)  # planned, assigned, enroute, delivered, cancelled
     created_at = Column(DateTime, default=datetime.utcnow)
+    delivered_at = Column(DateTime, nullable=True)
+    # meals this (donation, request) line moves; None on one-to-one matches
+    # made before allocations were recorded
+    meals = Column(Integer, nullable=True)
 
-    donation = relationship("FoodDonation", back_populates="match")
-    request = relationship("FoodRequest", back_populates="match")
+    donation = relationship("FoodDonation", back_populates="matches")
+    request = relationship("FoodRequest", back_populates="matches")
     vehicle = relationship("Vehicle")
 
+    @property
+    def load(self):
+        """Meals carried for this match: the line's allocation, else the whole donation."""
+        return self.meals if self.meals is not None else self.donation.quantity_meals
+
+# ---------- ROLLUPS ----------
+# Impact reporting totals, maintained by agents.rollups when a match is delivered.
+class DeliveryRollup(Base):
+    __tablename__ = "rollup_deliveries"
+
+    day = Column(Date, primary_key=True)
+    pincode = Column(String(10), primary_key=True)
+    is_veg = Column(Boolean, primary_key=True)
+    taluk = Column(String(40), nullable=False, index=True)
+    deliveries = Column(Integer, default=0, nullable=False)
+    meals = Column(Integer, default=0, nullable=False)
+    # sum over deliveries of (delivered_at - donation created_at); divide by deliveries
+    post_to_delivery_s = Column(Float, default=0.0, nullable=False)
+
+class VehicleRollup(Base):
+    __tablename__ = "rollup_vehicles"
+
+    day = Column(Date, primary_key=True)
+    vehicle_id = Column(Integer, primary_key=True)
+    deliveries = Column(Integer, default=0, nullable=False)
+    meals = Column(Integer, default=0, nullable=False)
+    # vehicle capacity summed per delivery; meals / capacity_meals = utilization
+    capacity_meals = Column(Integer, default=0, nullable=False)
+
+# ---------- ARCHIVE ----------
+# Closed rows older than ARCHIVE_AFTER_DAYS move here (agents.archive) so the
+# hot tables stay small. Same columns and ids, no foreign keys.
+def _archive_table(model, *indexes):
+    columns = [
+        Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False, nullable=c.nullable)
+        for c in model.__table__.columns
+    ]
+    name = f"{model.__tablename__}_archive"
+    return Table(
+        name, Base.metadata, *columns,
+        Column("archived_at", DateTime, nullable=False),
+        *(Index(f"ix_{name}_{'_'.join(cols)}", *cols) for cols in indexes),
+    )
+
+class ArchivedDonation(Base):
+    __table__ = _archive_table(FoodDonation, ("donor_email", "created_at"), ("donor_email", "status"))
+
+class ArchivedRequest(Base):
+    __table__ = _archive_table(FoodRequest, ("recipient_email", "created_at"), ("recipient_email", "status"))
+
+class ArchivedMatch(Base):
+    __table__ = _archive_table(Match, ("donation_id",), ("request_id",), ("created_at",))
+
+ARCHIVES = {FoodDonation: ArchivedDonation, FoodRequest: ArchivedRequest, Match: ArchivedMatch}
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # indexes/columns added after a table was first created
+    import migrations
+    migrations.upgrade(engine)
@@ -0,0 +1,193 @@
+// Live updates: listen on /events and patch table rows in place.
+//
+// Rows are <tr data-kind="donation|request|match" data-id="...">; cells with
+// data-field="<key>" are refreshed from the event payload, and elements with
+// data-when-status / data-unless-status="<statuses>" are shown only in (or
+// outside) the listed statuses. New rows are built from <template
+// id="<kind>-row">. A <tbody data-rows="<kinds>"> receives new rows; data-keep="open" drops rows whose status is no longer open, and
+// data-append="false" (a later page) only updates rows already shown.
+// Forms marked data-live are posted with fetch() instead of reloading the page.
+// A button with data-more="<url>" data-next="<cursor>" data-into="<tbody id>"
+// fetches <url>?before=<cursor> and appends the returned items.
+(function () {
+    if (!window.EventSource || !window.fetch) return;
+
+    var STATUS_LABELS = {assigned: "Assigned", enroute: "En Route", delivered: "Delivered", cancelled: "Cancelled"};
+
+    function format(el, value) {
+        switch (el.dataset.format) {
+        case "yesno":
+            el.textContent = value ? "Yes" : "No";
+            return;
+        case "datetime":
+            el.textContent = new Date(value).toLocaleString(undefined, {
+                day: "2-digit", month: "short", hour: "2-digit", minute: "2-digit"});
+            return;
+        case "status":
+            var span = document.createElement("span");
+            span.className = "status " + (STATUS_LABELS[value] ? value : "pending");
+            span.textContent = STATUS_LABELS[value] || "Pending";
+            el.replaceChildren(span);
+            return;
+        case "vehicle":
+            if (value) el.textContent = value;   // keep the assign form until there is one
+            return;
+        }
+        el.textContent = (el.dataset.prefix || "") + value + (el.dataset.suffix || "");
+    }
+
+    function fill(tr, data) {
+        tr.querySelectorAll("[data-field]").forEach(function (el) {
+            if (data[el.dataset.field] !== undefined) format(el, data[el.dataset.field]);
+        });
+        if (data.status === undefined) return;
+        // both take a space-separated list of statuses
+        tr.querySelectorAll("[data-when-status]").forEach(function (el) {
+            el.hidden = el.dataset.whenStatus.split(" ").indexOf(data.status) < 0;
+        });
+        tr.querySelectorAll("[data-unless-status]").forEach(function (el) {
+            el.hidden = el.dataset.unlessStatus.split(" ").indexOf(data.status) >= 0;
+        });
+    }
+
+    function build(kind, data) {
+        var tpl = document.getElementById(kind + "-row");
+        if (!tpl) return null;
+        var tr = tpl.content.firstElementChild.cloneNode(true);
+        tr.dataset.id = data.id;
+        tr.querySelectorAll("[data-action]").forEach(function (form) {
+            form.action = form.dataset.action.replace("{id}", data.id);
+        });
+        tr.querySelectorAll("[data-value]").forEach(function (input) {
+            input.value = input.dataset.value.replace("{id}", data.id);
+        });
+        fill(tr, data);
+        return tr;
+    }
+
+    function patch(kind, data) {
+        var tr = document.querySelector('tr[data-kind="' + kind + '"][data-id="' + data.id + '"]');
+        var body = document.querySelector('tbody[data-rows~="' + kind + '"]');
+        var keep = !data.deleted && !(body && body.dataset.keep && body.dataset.keep !== data.status);
+        if (!keep) {
+            if (tr) tr.remove();
+            return;
+        }
+        if (tr) {
+            fill(tr, data);
+        } else if (!body) {
+            // the table isn't rendered while it is empty
+            if (document.getElementById(kind + "-row")) location.reload();
+        } else if (body.dataset.append !== "false") {
+            tr = build(kind, data);
+            if (tr && body.dataset.order === "desc") body.prepend(tr);
+            else if (tr) body.append(tr);
+        }
+    }
+
+    function syncRequestChoices(data) {
+        var list = document.getElementById("open-requests");
+        if (!list) return;
+        var option = list.querySelector('option[value="' + data.id + '"]');
+        if (data.status !== "open") {
+            if (option) option.remove();
+        } else if (!option) {
+            option = document.createElement("option");
+            option.value = data.id;
+            option.textContent = "Req #" + data.id + " (" + data.need_meals + " meals)";
+            list.append(option);
+        }
+    }
+
+    function show(message) {
+        var box = document.getElementById("live-message");
+        if (!box || !message) return;
+        box.textContent = message;
+        box.hidden = false;
+    }
+
+    var source;
+    function connect() {
+        source = new EventSource("/events");
+        function on(name, handler) {
+            source.addEventListener(name, function (e) { handler(JSON.parse(e.data)); });
+        }
+        on("donation", function (d) { patch("donation", d); });
+        on("request", function (r) { patch("request", r); syncRequestChoices(r); });
+        on("match", function (m) { patch("match", m); });
+        on("counts", function (counts) {
+            Object.keys(counts).forEach(function (key) {
+                var el = document.querySelector('[data-count="' + key + '"]');
+                if (el) el.textContent = counts[key];
+            });
+        });
+        on("reload", function () { location.reload(); });
+        source.onerror = function () {
+            // refused (e.g. the worker is at SSE_MAX_STREAMS): EventSource gives
+            // up, so try again later; forms post normally meanwhile
+            if (source.readyState === EventSource.CLOSED) setTimeout(connect, 30000);
+        };
+    }
+    connect();
+
+    document.addEventListener("submit", function (e) {
+        var form = e.target;
+        // without a stream the page would not see the result: post normally
+        if (!("live" in form.dataset) || source.readyState !== EventSource.OPEN) return;
+        e.preventDefault();
+        // batch forms pick their endpoint with the clicked button's formaction
+        var action = e.submitter && e.submitter.hasAttribute("formaction") ? e.submitter.formAction : form.action;
+        fetch(action, {
+            method: "POST", body: new FormData(form),
+            headers: {"X-Live": "1"}, credentials: "same-origin",
+        }).then(function (resp) {
+            var json = (resp.headers.get("Content-Type") || "").indexOf("application/json") === 0;
+            if (!json) {
+                location.reload();      // e.g. session expired: fall back to the full page
+                return;
+            }
+            // refusals (unknown match, bad vehicle) carry a message too
+            return resp.json().then(function (body) { show(body.message || body.error); });
+        });
+        // batch selections are done with once submitted
+        if (form.id) {
+            document.querySelectorAll('input[type="checkbox"][form="' + form.id + '"]').forEach(function (box) {
+                box.checked = false;
+            });
+        }
+    });
+
+    document.addEventListener("click", function (e) {
+        var button = e.target.closest && e.target.closest("[data-more]");
+        if (!button) return;
+        button.disabled = true;
+        fetch(button.dataset.more + "?before=" + encodeURIComponent(button.dataset.next), {
+            credentials: "same-origin",
+        }).then(function (resp) {
+            if (!resp.ok) throw new Error(resp.status);
+            return resp.json();
+        }).then(function (page) {
+            var body = document.getElementById(button.dataset.into);
+            page.items.forEach(function (item) {
+                // a live event may already have added it
+                if (document.querySelector('tr[data-kind="' + item.kind + '"][data-id="' + item.id + '"]')) return;
+                var tr = build(item.kind, item);
+                if (tr) body.append(tr);
+            });
+            if (page.next) {
+                button.dataset.next = page.next;
+                button.disabled = false;
+            } else {
+                button.remove();
+            }
+        }).catch(function () { button.disabled = false; });
+    });
+
+    document.addEventListener("change", function (e) {
+        var name = e.target.dataset && e.target.dataset.selectAll;
+        if (!name) return;
+        document.querySelectorAll('input[type="checkbox"][name="' + name + '"]').forEach(function (box) {
+            box.checked = e.target.checked;
+        });
+    });
+})();
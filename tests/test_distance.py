@@ -0,0 +1,87 @@
+"""The vectorized distance paths must agree with the scalar haversine.
+
+    python -m pytest tests
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from agents.logistics import LogisticsAgent
+from agents.matching import MatchingAgent
+from agents.utils import haversine, haversine_many, distance_matrix
+
+SEEDS = [0, 1, 2, 3, 4]
+
+
+def random_points(rng, n):
+    # roughly the Belagavi district bounding box
+    return np.column_stack([rng.uniform(15.4, 16.9, n), rng.uniform(74.0, 75.4, n)])
+
+
+def scalar_matrix(a, b):
+    return np.array([[haversine(p[0], p[1], q[0], q[1]) for q in b] for p in a])
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_haversine_many_matches_scalar(seed):
+    rng = np.random.default_rng(seed)
+    a, b = random_points(rng, 200), random_points(rng, 200)
+    pairs = haversine_many(a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+    ref = [haversine(p[0], p[1], q[0], q[1]) for p, q in zip(a, b)]
+    assert np.allclose(pairs, ref, rtol=1e-12, atol=1e-9)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_distance_matrix_matches_scalar(seed):
+    rng = np.random.default_rng(seed)
+    a, b = random_points(rng, 40), random_points(rng, 60)
+    d = distance_matrix(a, b)
+    assert d.shape == (40, 60)
+    # distance_matrix works on coordinates rounded to ~1 m
+    assert np.allclose(d, scalar_matrix(a, b), atol=5e-3)
+
+
+def scalar_nearest_neighbor(start, stops):
+    """The original loop: the closest unvisited stop by scalar haversine."""
+    remaining, order, cur, total = list(stops), [], start, 0.0
+    while remaining:
+        nxt = min(remaining, key=lambda p: haversine(cur[0], cur[1], p[0], p[1]))
+        total += haversine(cur[0], cur[1], nxt[0], nxt[1])
+        order.append(nxt)
+        remaining.remove(nxt)
+        cur = nxt
+    return order, total
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_nearest_neighbor_matches_scalar(seed):
+    rng = np.random.default_rng(seed)
+    start, *stops = [tuple(p) for p in random_points(rng, 31)]
+    plan = LogisticsAgent().nearest_neighbor(start[0], start[1], stops)
+    order, total = scalar_nearest_neighbor(start, stops)
+    assert plan.order == order
+    assert plan.total_km == pytest.approx(total, abs=5e-3 * len(stops))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_score_matrix_matches_score(seed):
+    rng = np.random.default_rng(seed)
+    now = datetime(2026, 1, 1, 12, 0)
+    donations = [
+        SimpleNamespace(lat=lat, lon=lon, is_veg=bool(rng.integers(2)),
+                        quantity_meals=200, remaining_meals=int(rng.integers(1, 200)),
+                        expire_by=now + timedelta(minutes=int(rng.integers(10, 2000))))
+        for lat, lon in random_points(rng, 15)
+    ]
+    requests = [
+        SimpleNamespace(lat=lat, lon=lon, prefers_veg=bool(rng.integers(2)),
+                        need_meals=200, remaining_meals=int(rng.integers(0, 200)))
+        for lat, lon in random_points(rng, 12)
+    ]
+    agent = MatchingAgent()
+    scores, _, _, dist_km = agent.score_matrix(donations, requests, now)
+    for i, d in enumerate(donations):
+        for j, r in enumerate(requests):
+            assert dist_km[i, j] == pytest.approx(haversine(d.lat, d.lon, r.lat, r.lon), abs=5e-3)
+            # 0.2 weight on a distance score that moves 0.1 per km
+            assert scores[i, j] == pytest.approx(agent.score(d, r, now).score, abs=1e-3)
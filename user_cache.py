@@ -0,0 +1,101 @@
+"""Per-process cache of the logged-in user's slim record.
+
+Every portal, donate and request hit needs the session user's role and
+address. `UserCache` keeps a `SessionUser` per (email, session version) for a
+short TTL so those routes skip the database on a hit. Login stamps a new
+session version, so a fresh login never sees an older record; profile
+changes made through the ORM in this process invalidate at once, and other
+workers pick them up when the TTL runs out.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import event
+import metrics
+from config import Config
+from models import User
+
+
+@dataclass(frozen=True)
+class SessionUser:
+    email: str
+    name: str
+    role: str
+    pincode: str
+    address: str
+    lat: float
+    lon: float
+
+
+class UserCache:
+    """Bounded LRU of SessionUser records with a TTL."""
+
+    def __init__(self, locate, maxsize=None, ttl_s=None):
+        self.locate = locate    # pincode -> (lat, lon)
+        self.maxsize = maxsize or Config.USER_CACHE_SIZE
+        self.ttl_s = Config.USER_CACHE_TTL_S if ttl_s is None else ttl_s
+        self._entries = OrderedDict()   # (email, version) -> (expires, SessionUser)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, email, version) -> Optional[SessionUser]:
+        key = (email, version)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, user: User, version) -> SessionUser:
+        """Cache the slim record of an ORM `user` and return it."""
+        lat, lon = self.locate(user.pincode)
+        record = SessionUser(user.email, user.name, user.role, user.pincode or "",
+                             user.address or "", lat, lon)
+        with self._lock:
+            self._entries[(user.email, version)] = (time.monotonic() + self.ttl_s, record)
+            self._entries.move_to_end((user.email, version))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return record
+
+    def discard(self, email, version):
+        with self._lock:
+            self._entries.pop((email, version), None)
+
+    def invalidate(self, email):
+        """Drop every cached session of `email`; call after changing the profile."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == email]:
+                del self._entries[key]
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def invalidate_on_update(cache):
+    """Invalidate a user's entries whenever the ORM flushes a change to their row."""
+    event.listen(User, "after_update", lambda mapper, conn, target: cache.invalidate(target.email))
+    event.listen(User, "after_delete", lambda mapper, conn, target: cache.invalidate(target.email))
+
+
+def instrument_cache(cache):
+    """Publish the cache's lookups and size on /metrics."""
+    metrics.Gauge(
+        "user_cache_lookups", "Session user cache lookups since start.", ("result",),
+        lambda: {("hit",): cache.hits, ("miss",): cache.misses})
+    metrics.Gauge(
+        "user_cache_entries", "Session users currently cached.", (),
+        lambda: {(): len(cache)})